@@ -0,0 +1,90 @@
+import json
+import re
+
+from django.conf import settings
+from django.utils import timezone
+
+# Every pincode has a channel layer group that online users join from
+# UserConsumer, plus a capped Redis stream holding recent announcements.
+# Stream entry ids double as catch-up cursors: a reconnecting client asks
+# for everything after the last id it saw.
+STREAM_KEY = 'announcements:{pincode}'
+RATE_KEY = 'announcements:rate:{user_id}'
+
+KINDS = ('notice', 'listing', 'lost_item')
+
+# Rate check and append in one round-trip, so the limit holds across workers.
+# KEYS: rate counter, stream
+# ARGV: limit, window seconds, backlog length, payload, stream ttl
+PUBLISH = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+if count > tonumber(ARGV[1]) then
+    return false
+end
+local id = redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', 'data', ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return id
+"""
+
+ENTRY_ID = re.compile(r'^\d+-\d+$')
+
+def group_name(pincode):
+    return 'pincode_' + re.sub(r'[^0-9A-Za-z]', '', str(pincode))
+
+def build(user, kind, text, service_id=None):
+    name = f'{user.first_name} {user.last_name}'.strip()
+    return {
+        'sender_id': str(user.id),
+        'sender_name': name or user.username,
+        'kind': kind,
+        'text': text[:500],
+        'service_id': str(service_id) if service_id else None,
+        'created_at': timezone.now().isoformat(),
+    }
+
+def _publish_args(user, pincode, payload):
+    return (
+        PUBLISH, 2,
+        RATE_KEY.format(user_id=user.id), STREAM_KEY.format(pincode=pincode),
+        settings.CHAT_ANNOUNCEMENT_RATE_LIMIT, settings.CHAT_ANNOUNCEMENT_RATE_WINDOW,
+        settings.CHAT_ANNOUNCEMENT_BACKLOG, json.dumps(payload), settings.CHAT_ANNOUNCEMENT_TTL,
+    )
+
+def _stored(entry_id, payload):
+    if entry_id is None:
+        return None
+    return {'id': entry_id.decode() if isinstance(entry_id, bytes) else entry_id, **payload}
+
+def publish(redis, user, pincode, payload):
+    """Append to the pincode backlog; None when the sender is rate limited"""
+    return _stored(redis.eval(*_publish_args(user, pincode, payload)), payload)
+
+async def apublish(redis, user, pincode, payload):
+    return _stored(await redis.eval(*_publish_args(user, pincode, payload)), payload)
+
+def _backlog_call(redis, pincode, since, limit):
+    key = STREAM_KEY.format(pincode=pincode)
+    limit = min(limit or settings.CHAT_ANNOUNCEMENT_BACKLOG, settings.CHAT_ANNOUNCEMENT_BACKLOG)
+    if since and ENTRY_ID.match(str(since)):
+        return redis.xrange(key, min=f'({since}', max='+', count=limit), False
+    return redis.xrevrange(key, count=limit), True
+
+def _parse(entries, newest_first):
+    announcements = [
+        {'id': entry_id.decode(), **json.loads(fields[b'data'])}
+        for entry_id, fields in entries
+    ]
+    # Always oldest first, the order they are replayed in
+    return announcements[::-1] if newest_first else announcements
+
+def backlog(redis, pincode, since=None, limit=None):
+    """Announcements after the `since` entry id, or the latest ones"""
+    entries, newest_first = _backlog_call(redis, pincode, since, limit)
+    return _parse(entries, newest_first)
+
+async def abacklog(redis, pincode, since=None, limit=None):
+    entries, newest_first = _backlog_call(redis, pincode, since, limit)
+    return _parse(await entries, newest_first)
@@ -0,0 +1,108 @@
+import datetime
+import gzip
+import io
+import json
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from core.models import MessageArchive
+
+from .partitions import drop_partition, partition_name
+
+# Archived months live outside Postgres as one gzipped JSONL file per room
+# and month, rows in (created_at, id) order, listed in core_messagearchive
+# so history reads know which files exist without touching the filesystem.
+storage = FileSystemStorage(location=settings.CHAT_ARCHIVE_ROOT)
+
+def archive_path(room_id, month):
+    return f'messages/{month:%Y-%m}/{room_id}.jsonl.gz'
+
+def _save(room_id, month, lines):
+    path = archive_path(room_id, month)
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as f:
+        f.write(''.join(lines).encode())
+    # A rerun after a crash rewrites the same file instead of adding a suffix
+    if storage.exists(path):
+        storage.delete(path)
+    return storage.save(path, ContentFile(buffer.getvalue()))
+
+def archive_partition(month, chunk_size=5000):
+    """
+    Write every message of one month partition to archive files, record
+    them, then detach and drop the partition. Returns the message count.
+    """
+    entries = []
+    total = 0
+    room_id, lines = None, []
+    
+    # Server-side cursor: the partition is streamed, never held in memory
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f'SELECT id, room_id, sender_id, receiver_id, content, message_type, created_at '
+            f'FROM {partition_name(month)} ORDER BY room_id, created_at, id'
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for message_id, row_room_id, sender_id, receiver_id, content, message_type, created_at in rows:
+                if row_room_id != room_id:
+                    if lines:
+                        entries.append((room_id, _save(room_id, month, lines), len(lines)))
+                    room_id, lines = row_room_id, []
+                lines.append(json.dumps({
+                    'id': str(message_id),
+                    'sender_id': str(sender_id),
+                    'receiver_id': str(receiver_id),
+                    'content': content,
+                    'message_type': message_type,
+                    'created_at': created_at.isoformat(),
+                }, separators=(',', ':')) + '\n')
+                total += 1
+        if lines:
+            entries.append((room_id, _save(room_id, month, lines), len(lines)))
+    
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {partition_name(month)}')
+            if cursor.fetchone()[0] != total:
+                raise RuntimeError(f'{partition_name(month)} changed while being archived')
+            MessageArchive.objects.bulk_create([
+                MessageArchive(room_id=room, month=month, path=path, message_count=count)
+                for room, path, count in entries
+            ], ignore_conflicts=True)
+            drop_partition(cursor, month)
+    return total
+
+def _read(path):
+    with storage.open(path, 'rb') as f:
+        with gzip.GzipFile(fileobj=f) as data:
+            return [json.loads(line) for line in data]
+
+def read_before(room_id, limit, before=None):
+    """
+    Up to `limit` archived messages of a room older than the (created_at, id)
+    cursor, newest first, in chat.history's payload format.
+    """
+    archives = MessageArchive.objects.filter(room_id=room_id)
+    if before is not None:
+        # Partition months are UTC
+        archives = archives.filter(month__lte=before[0].astimezone(datetime.timezone.utc).date())
+    
+    messages = []
+    for archive in archives.order_by('-month').only('path'):
+        for payload in reversed(_read(archive.path)):
+            payload.pop('receiver_id', None)
+            if before is not None:
+                key = (parse_datetime(payload['created_at']), payload['id'])
+                if key >= (before[0], str(before[1])):
+                    continue
+            messages.append(payload)
+            if len(messages) == limit:
+                return messages
+    return messages
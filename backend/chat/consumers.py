@@ -1,113 +1,171 @@
-import json
+import asyncio
+from functools import partial
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from core.metrics import observe_chat_event
 from core.models import ChatRoom, Message
-from datetime import datetime
+from . import announcements
+from .history import afind_recent, message_payload, push_recent
+from .inbox import push_message, push_unread
+from .presence import MAX_LOOKUP, aget_presence, leave, touch
+from .protocol import FrameProtocolMixin
+from .redis_client import get_redis
+from .typing_indicator import TypingDebouncer
+from .write_behind import queue_message
 
 User = get_user_model()
 
-class ChatConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        self.room_id = self.scope['url_route']['kwargs']['room_id']
-        self.room_group_name = f'chat_{self.room_id}'
-        self.user = self.scope['user']
-        
-        # Check if user is authenticated
-        if not self.user.is_authenticated:
-            await self.close()
-            return
-        
-        # Check if user has access to this chat room
-        if not await self.has_access_to_room():
-            await self.close()
-            return
-        
-        # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
-        
-        await self.accept()
-        
-        # Send join message
-        await self.send(text_data=json.dumps({
-            'type': 'system',
-            'message': f'{self.user.username} joined the chat'
-        }))
+ROOM_FIELDS = ('id', 'user1_id', 'user2_id', 'last_read_at_user1', 'last_read_at_user2')
+
+# Inbound event types with their own metrics label; anything else is 'other'
+EVENT_TYPES = {
+    'message', 'typing', 'read_receipt', 'heartbeat', 'presence', 'subscribe',
+    'announce', 'announcements',
+}
+
+class RoomState:
+    """
+    What a connection knows about one room it has joined, loaded once by
+    the access check and kept for the lifetime of the socket
+    """
     
-    async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
+    def __init__(self, user_id, room_id, user1_id, user2_id, read_at_user1, read_at_user2):
+        self.room_id = str(room_id)
+        self.group_name = f'chat_{self.room_id}'
+        self.is_user1 = user_id == user1_id
+        self.receiver_id = user2_id if self.is_user1 else user1_id
+        self.read_watermark = read_at_user1 if self.is_user1 else read_at_user2
+        self.typing = None
+
+class RoomChatMixin:
+    """
+    Message, typing and read-receipt handling for joined rooms, shared by
+    the per-room ChatConsumer and the multiplexed UserConsumer
+    """
+    
+    def start_typing(self, room):
+        room.typing = TypingDebouncer(
+            partial(self.publish_typing, room),
+            min_interval=settings.CHAT_TYPING_MIN_INTERVAL,
+            idle_timeout=settings.CHAT_TYPING_IDLE_TIMEOUT,
         )
     
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        message_type = data.get('type', 'message')
-        
-        if message_type == 'message':
-            await self.handle_message(data)
-        elif message_type == 'typing':
-            await self.handle_typing(data)
-        elif message_type == 'read_receipt':
-            await self.handle_read_receipt(data)
+    async def join_room(self, room):
+        await self.channel_layer.group_add(room.group_name, self.channel_name)
+        self.start_typing(room)
+    
+    async def leave_room(self, room):
+        # Tell the room we stopped typing if we dropped mid-sentence
+        if room.typing:
+            await room.typing.close()
+        await self.channel_layer.group_discard(room.group_name, self.channel_name)
     
-    async def handle_message(self, data):
+    async def send_frame(self, event, payload):
+        await self.send_payload(payload)
+    
+    async def handle_message(self, room, data):
         content = data['content']
         message_type = data.get('message_type', 'text')
         
-        # Save message to database
-        message = await self.save_message(content, message_type)
+        # Receivers clear the indicator when the message arrives, so a
+        # following "stopped typing" need not be broadcast
+        room.typing.reset()
+        
+        if settings.CHAT_WRITE_BEHIND:
+            # Durable in the Redis stream now, in Postgres once flushed
+            message = await queue_message(
+                room.room_id, self.user.id, room.receiver_id,
+                'unread_count_user2' if room.is_user1 else 'unread_count_user1',
+                content, message_type
+            )
+            message_id, timestamp = message['id'], message['created_at']
+        else:
+            # Save message to database
+            message = await self.save_message(room, content, message_type)
+            message_id, timestamp = str(message.id), message.created_at.isoformat()
+        
+        # Keep the room's hot history window and both inboxes current
+        redis = get_redis()
+        await push_recent(redis, room.room_id, message_payload(
+            message_id, self.user.id, content, message_type, timestamp
+        ))
+        await push_message(redis, self.user.id, room.receiver_id, room.room_id, content, timestamp)
         
         # Send message to room group
         await self.channel_layer.group_send(
-            self.room_group_name,
+            room.group_name,
             {
                 'type': 'chat_message',
-                'message_id': str(message.id),
+                'room_id': room.room_id,
+                'message_id': message_id,
                 'sender_id': str(self.user.id),
                 'sender_username': self.user.username,
                 'content': content,
                 'message_type': message_type,
-                'timestamp': message.created_at.isoformat(),
+                'timestamp': timestamp,
             }
         )
     
-    async def handle_typing(self, data):
+    async def handle_typing(self, room, data):
+        # Debounced: only changes of typing state reach the room group
+        await room.typing.update(data.get('is_typing', False))
+    
+    async def publish_typing(self, room, is_typing):
         # Broadcast typing indicator
         await self.channel_layer.group_send(
-            self.room_group_name,
+            room.group_name,
             {
                 'type': 'typing_indicator',
+                'room_id': room.room_id,
                 'user_id': str(self.user.id),
                 'username': self.user.username,
-                'is_typing': data.get('is_typing', False),
+                'is_typing': is_typing,
             }
         )
     
-    async def handle_read_receipt(self, data):
-        # Mark messages as read
+    async def handle_read_receipt(self, room, data):
+        # "Read up to message_id": everything at or before it is marked read
         message_id = data.get('message_id')
-        if message_id:
-            await self.mark_as_read(message_id)
+        if not message_id:
+            return
+        
+        # With write-behind the newest messages may still be in the stream,
+        # not core_message; their timestamp is in the hot window
+        queued_at = None
+        if settings.CHAT_WRITE_BEHIND:
+            queued_at = await afind_recent(get_redis(), room.room_id, str(message_id))
+        
+        advanced = await self.mark_as_read(room, message_id, queued_at)
+        if advanced is None:
+            # Stale or unknown receipt, the watermark did not move
+            return
+        
+        read_up_to, unread_count = advanced
+        await push_unread(get_redis(), self.user.id, room.room_id, unread_count)
         
-        # Broadcast read receipt
+        # One broadcast per watermark advance
         await self.channel_layer.group_send(
-            self.room_group_name,
+            room.group_name,
             {
                 'type': 'read_receipt',
+                'room_id': room.room_id,
                 'user_id': str(self.user.id),
                 'username': self.user.username,
                 'message_id': message_id,
+                'read_up_to': read_up_to.isoformat(),
             }
         )
     
     async def chat_message(self, event):
         # Send message to WebSocket
-        await self.send(text_data=json.dumps({
+        await self.send_frame(event, {
             'type': 'message',
             'message_id': event['message_id'],
             'sender_id': event['sender_id'],
@@ -115,75 +173,308 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'content': event['content'],
             'message_type': event['message_type'],
             'timestamp': event['timestamp'],
-        }))
+        })
     
     async def typing_indicator(self, event):
         # Send typing indicator
-        await self.send(text_data=json.dumps({
+        await self.send_frame(event, {
             'type': 'typing',
             'user_id': event['user_id'],
             'username': event['username'],
             'is_typing': event['is_typing'],
-        }))
+        })
     
     async def read_receipt(self, event):
         # Send read receipt
-        await self.send(text_data=json.dumps({
+        await self.send_frame(event, {
             'type': 'read',
             'user_id': event['user_id'],
             'username': event['username'],
             'message_id': event.get('message_id'),
-        }))
+            'read_up_to': event.get('read_up_to'),
+        })
     
     @database_sync_to_async
-    def has_access_to_room(self):
+    def load_room(self, room_id):
+        # Load only the participant IDs and read watermarks
         try:
-            room = ChatRoom.objects.get(id=self.room_id)
-            return self.user == room.user1 or self.user == room.user2
-        except ChatRoom.DoesNotExist:
-            return False
-    
-    @database_sync_to_async
-    def save_message(self, content, message_type):
-        room = ChatRoom.objects.get(id=self.room_id)
-        receiver = room.user2 if self.user == room.user1 else room.user1
-        
-        message = Message.objects.create(
-            room=room,
-            sender=self.user,
-            receiver=receiver,
-            content=content,
-            message_type=message_type
-        )
+            row = ChatRoom.objects.filter(id=room_id).values_list(*ROOM_FIELDS).first()
+        except ValidationError:
+            return None
         
-        # Update room's last message
-        room.last_message = content[:100]  # Store first 100 chars
-        room.last_message_time = message.created_at
+        if row is None or self.user.id not in row[1:3]:
+            return None
         
-        # Update unread count
-        if self.user == room.user1:
-            room.unread_count_user2 += 1
-        else:
-            room.unread_count_user1 += 1
+        return RoomState(self.user.id, *row)
+    
+    @database_sync_to_async
+    def save_message(self, room, content, message_type):
+        # The receiver's unread counter is bumped in SQL so concurrent
+        # writers from both participants cannot lose increments
+        unread_field = 'unread_count_user2' if room.is_user1 else 'unread_count_user1'
         
-        room.save()
+        with transaction.atomic():
+            message = Message.objects.create(
+                room_id=room.room_id,
+                sender_id=self.user.id,
+                receiver_id=room.receiver_id,
+                content=content,
+                message_type=message_type
+            )
+            
+            ChatRoom.objects.filter(id=room.room_id).update(
+                last_message=content[:100],  # Store first 100 chars
+                last_message_time=message.created_at,
+                updated_at=message.created_at,
+                **{unread_field: F(unread_field) + 1}
+            )
         
         return message
     
     @database_sync_to_async
-    def mark_as_read(self, message_id):
+    def mark_as_read(self, room, message_id, queued_at=None):
+        """
+        Advance this user's read watermark to `message_id`. Returns the new
+        watermark and the remaining unread count, or None when nothing was
+        newly read. `queued_at` is the timestamp of a message not flushed to
+        Postgres yet (write-behind); the flusher inserts messages at or
+        before the watermark as read.
+        """
         try:
-            message = Message.objects.get(id=message_id, receiver=self.user)
-            message.is_read = True
-            message.read_at = datetime.now()
-            message.save()
+            read_up_to = Message.objects.filter(
+                id=message_id, room_id=room.room_id
+            ).values_list('created_at', flat=True).first()
+        except ValidationError:
+            return None
+        
+        pending = read_up_to is None and queued_at is not None
+        if pending:
+            read_up_to = queued_at
+        if read_up_to is None:
+            return None
+        if room.read_watermark and read_up_to <= room.read_watermark:
+            return None
+        
+        suffix = 'user1' if room.is_user1 else 'user2'
+        unread_field = f'unread_count_{suffix}'
+        watermark_field = f'last_read_at_{suffix}'
+        unread = Message.objects.filter(
+            room_id=room.room_id, receiver_id=self.user.id, is_read=False
+        )
+        
+        with transaction.atomic():
+            marked = unread.filter(created_at__lte=read_up_to).update(
+                is_read=True, read_at=timezone.now()
+            )
+            if not marked and not pending:
+                return None
+            
+            # Exact recount rather than decrementing, so the counter heals
+            # from any earlier drift
+            remaining = unread.filter(room_id=OuterRef('id')).values('room_id').annotate(
+                total=Count('id')
+            ).values('total')
+            ChatRoom.objects.filter(id=room.room_id).update(**{
+                unread_field: Coalesce(Subquery(remaining), 0),
+                watermark_field: Greatest(Coalesce(watermark_field, read_up_to), read_up_to),
+                'updated_at': timezone.now(),  # Unread counts are part of the rooms response
+            })
+            unread_count = ChatRoom.objects.filter(id=room.room_id).values_list(
+                unread_field, flat=True
+            ).first()
+        
+        room.read_watermark = read_up_to
+        return read_up_to, unread_count
+
+class ChatConsumer(RoomChatMixin, FrameProtocolMixin, AsyncWebsocketConsumer):
+    """One socket per room: ws/chat/<room_id>/"""
+    
+    room = None
+    
+    async def connect(self):
+        self.user = self.scope['user']
+        
+        # Check if user is authenticated
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        
+        # Check if user has access to this chat room
+        room = await self.load_room(self.scope['url_route']['kwargs']['room_id'])
+        if room is None:
+            await self.close()
+            return
+        
+        # Join room group
+        self.room = room
+        await self.join_room(room)
+        
+        await self.accept_negotiated()
+        
+        # Send join message
+        await self.send_payload({
+            'type': 'system',
+            'message': f'{self.user.username} joined the chat'
+        })
+    
+    async def disconnect(self, close_code):
+        await self.close_protocol()
+        
+        # Leave room group
+        if self.room:
+            await self.leave_room(self.room)
+    
+    async def receive(self, text_data=None, bytes_data=None):
+        for data in self.decode_frames(text_data, bytes_data):
+            message_type = data.get('type', 'message')
             
-            # Update unread count in room
-            room = message.room
-            if self.user == room.user1:
-                room.unread_count_user1 = max(0, room.unread_count_user1 - 1)
-            else:
-                room.unread_count_user2 = max(0, room.unread_count_user2 - 1)
-            room.save()
-        except Message.DoesNotExist:
-            pass
+            with observe_chat_event('room', message_type if message_type in EVENT_TYPES else 'other'):
+                if message_type == 'message':
+                    await self.handle_message(self.room, data)
+                elif message_type == 'typing':
+                    await self.handle_typing(self.room, data)
+                elif message_type == 'read_receipt':
+                    await self.handle_read_receipt(self.room, data)
+
+class UserConsumer(RoomChatMixin, FrameProtocolMixin, AsyncWebsocketConsumer):
+    """
+    One socket per user: ws/user/
+    
+    Subscribes to every room the user belongs to, so frames in both
+    directions carry a `room_id`. Also tracks presence from heartbeats and
+    carries announcements for the user's current pincode.
+    """
+    
+    async def connect(self):
+        self.user = self.scope['user']
+        self.rooms = {}
+        
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        
+        # All memberships in one query, then all group joins concurrently
+        self.rooms = {room.room_id: room for room in await self.load_rooms()}
+        self.user_group_name = f'user_{self.user.id}'
+        self.pincode = self.user.current_pincode
+        groups = [self.user_group_name]
+        if self.pincode:
+            groups.append(announcements.group_name(self.pincode))
+        await asyncio.gather(
+            *(self.channel_layer.group_add(group, self.channel_name) for group in groups),
+            *(self.join_room(room) for room in self.rooms.values())
+        )
+        
+        await self.accept_negotiated()
+        await touch(get_redis(), self.user.id, self.channel_name)
+    
+    async def disconnect(self, close_code):
+        if not self.user.is_authenticated:
+            return
+        
+        await self.close_protocol()
+        groups = [self.user_group_name]
+        if self.pincode:
+            groups.append(announcements.group_name(self.pincode))
+        await asyncio.gather(
+            *(self.channel_layer.group_discard(group, self.channel_name) for group in groups),
+            *(self.leave_room(room) for room in self.rooms.values())
+        )
+        await leave(get_redis(), self.user.id, self.channel_name)
+    
+    async def receive(self, text_data=None, bytes_data=None):
+        for data in self.decode_frames(text_data, bytes_data):
+            message_type = data.get('type', 'message')
+            with observe_chat_event('user', message_type if message_type in EVENT_TYPES else 'other'):
+                await self.handle_event(data)
+    
+    async def handle_event(self, data):
+        message_type = data.get('type', 'message')
+        
+        if message_type == 'heartbeat':
+            await touch(get_redis(), self.user.id, self.channel_name)
+            return
+        if message_type == 'presence':
+            user_ids = data.get('user_ids', [])
+            if not isinstance(user_ids, list) or not all(isinstance(u, str) for u in user_ids):
+                return
+            await self.send_payload({
+                'type': 'presence',
+                'users': await aget_presence(get_redis(), user_ids[:MAX_LOOKUP]),
+            })
+            return
+        if message_type == 'subscribe':
+            await self.subscribe(data.get('room_id'))
+            return
+        if message_type == 'announce':
+            await self.announce(data)
+            return
+        if message_type == 'announcements':
+            # Catch up from the Redis backlog after (re)connecting
+            await self.send_payload({
+                'type': 'announcements',
+                'items': await announcements.abacklog(
+                    get_redis(), self.pincode, data.get('since')
+                ) if self.pincode else [],
+            })
+            return
+        
+        room = self.rooms.get(data.get('room_id'))
+        if room is None:
+            return
+        
+        if message_type == 'message':
+            await self.handle_message(room, data)
+        elif message_type == 'typing':
+            await self.handle_typing(room, data)
+        elif message_type == 'read_receipt':
+            await self.handle_read_receipt(room, data)
+    
+    async def subscribe(self, room_id):
+        if not room_id or str(room_id) in self.rooms:
+            return
+        
+        room = await self.load_room(room_id)
+        if room is None:
+            return
+        
+        self.rooms[room.room_id] = room
+        await self.join_room(room)
+        await self.send_payload({'type': 'subscribed', 'room_id': room.room_id})
+    
+    async def announce(self, data):
+        kind, text = data.get('kind', 'notice'), (data.get('text') or '').strip()
+        if not self.pincode or kind not in announcements.KINDS or not text:
+            return
+        
+        announcement = await announcements.apublish(
+            get_redis(), self.user, self.pincode,
+            announcements.build(self.user, kind, text, data.get('service_id'))
+        )
+        if announcement is None:
+            await self.send_payload({'type': 'announcement_rejected', 'reason': 'rate_limited'})
+            return
+        
+        # One group_send; the channel layer fans out to everyone in the pincode
+        await self.channel_layer.group_send(
+            announcements.group_name(self.pincode),
+            {'type': 'pincode_announcement', 'announcement': announcement}
+        )
+    
+    async def pincode_announcement(self, event):
+        await self.send_payload({'type': 'announcement', **event['announcement']})
+    
+    async def room_added(self, event):
+        # A chat was started with this user while connected
+        await self.subscribe(event['room_id'])
+    
+    async def send_frame(self, event, payload):
+        payload['room_id'] = event['room_id']
+        await self.send_payload(payload)
+    
+    @database_sync_to_async
+    def load_rooms(self):
+        rows = ChatRoom.objects.filter(
+            Q(user1_id=self.user.id) | Q(user2_id=self.user.id)
+        ).values_list(*ROOM_FIELDS)
+        return [RoomState(self.user.id, *row) for row in rows]
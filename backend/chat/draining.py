@@ -0,0 +1,74 @@
+"""
+Graceful draining for the WebSocket tier. On restart a worker stops
+accepting and closes its sockets with 1012 (service restart) in small
+batches spread over CHAT_DRAIN_SECONDS, so clients reconnect to the other
+workers gradually instead of all at once. Consumers see an ordinary
+disconnect and clean up presence and group membership as usual.
+"""
+import asyncio
+import random
+
+from django.conf import settings
+
+SERVICE_RESTART = 1012
+BATCHES = 20
+
+_connections = set()
+_draining = False
+
+class _Connection:
+    def __init__(self, send):
+        self._send = send
+        self.closed = False
+    
+    async def send(self, message):
+        # Once drained, late frames from the consumer are dropped
+        if self.closed:
+            return
+        if message['type'] == 'websocket.close':
+            self.closed = True
+        await self._send(message)
+    
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            await self._send({'type': 'websocket.close', 'code': SERVICE_RESTART})
+
+class DrainingMiddleware:
+    """ASGI middleware tracking this process's sockets and refusing new ones while draining"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'websocket':
+            return await self.app(scope, receive, send)
+        
+        if _draining:
+            await receive()  # websocket.connect
+            await send({'type': 'websocket.close', 'code': SERVICE_RESTART})
+            return
+        
+        connection = _Connection(send)
+        _connections.add(connection)
+        try:
+            return await self.app(scope, receive, connection.send)
+        finally:
+            _connections.discard(connection)
+
+async def drain(seconds=None):
+    """Close every socket of this process over `seconds`; returns how many were closed"""
+    global _draining
+    _draining = True
+    seconds = settings.CHAT_DRAIN_SECONDS if seconds is None else seconds
+    
+    connections = list(_connections)
+    random.shuffle(connections)
+    size = max(1, -(-len(connections) // BATCHES))
+    for start in range(0, len(connections), size):
+        await asyncio.gather(
+            *(connection.close() for connection in connections[start:start + size]),
+            return_exceptions=True
+        )
+        await asyncio.sleep(seconds / BATCHES)
+    return len(connections)
@@ -0,0 +1,137 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from core.db_router import use_primary
+from core.metrics import record_cache
+from core.models import Message
+
+from . import archive
+
+# The newest CHAT_HISTORY_HOT_WINDOW messages of an active room are kept in
+# a sorted set scored by timestamp. The `ready` flag marks the set as a
+# complete copy of the room's newest messages: the consumer adds to the set
+# unconditionally, and the first cold read merges Postgres rows into it
+# before setting the flag, so concurrent writes are never lost.
+RECENT_KEY = 'chat:recent:{room_id}'
+READY_KEY = 'chat:recent:{room_id}:ready'
+
+def message_payload(message_id, sender_id, content, message_type, created_at):
+    """
+    Cached/serialized form of a message. Only immutable fields go in, so
+    the same message always encodes to the same set member; read state is
+    derived from the room's read watermarks.
+    """
+    return {
+        'id': str(message_id),
+        'sender_id': str(sender_id),
+        'content': content,
+        'message_type': message_type,
+        'created_at': created_at if isinstance(created_at, str) else created_at.isoformat(),
+    }
+
+def _encode(payload):
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'))
+
+def _score(payload):
+    return parse_datetime(payload['created_at']).timestamp()
+
+def _write(pipe, room_id, payloads):
+    key = RECENT_KEY.format(room_id=room_id)
+    ttl = settings.CHAT_HISTORY_HOT_TTL
+    pipe.zadd(key, {_encode(p): _score(p) for p in payloads})
+    pipe.zremrangebyrank(key, 0, -settings.CHAT_HISTORY_HOT_WINDOW - 1)
+    pipe.expire(key, ttl)
+    pipe.expire(READY_KEY.format(room_id=room_id), ttl)
+
+async def push_recent(redis, room_id, payload):
+    """Write-through from ChatConsumer for every new message"""
+    pipe = redis.pipeline(transaction=False)
+    _write(pipe, room_id, [payload])
+    await pipe.execute()
+
+async def afind_recent(redis, room_id, message_id):
+    """created_at of a message in the room's hot window, or None"""
+    for member in await redis.zrange(RECENT_KEY.format(room_id=room_id), 0, -1):
+        payload = json.loads(member)
+        if payload['id'] == message_id:
+            return parse_datetime(payload['created_at'])
+    return None
+
+def encode_cursor(payload):
+    raw = f"{payload['created_at']}|{payload['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+    created_at = parse_datetime(created_at)
+    if created_at is None:
+        raise ValueError('Invalid cursor')
+    return created_at, message_id
+
+def _from_db(room_id, limit, before=None):
+    queryset = Message.objects.filter(room_id=room_id)
+    if before is not None:
+        created_at, message_id = before
+        # Keyset condition on (created_at, id), served by the (room, created_at) index
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+        )
+    rows = queryset.order_by('-created_at', '-id').values_list(
+        'id', 'sender_id', 'content', 'message_type', 'created_at'
+    )[:limit]
+    messages = [message_payload(*row) for row in rows]
+    
+    # Archived months are all older than any live partition, so a short
+    # page simply continues into the archive
+    if len(messages) < limit:
+        if messages:
+            last = messages[-1]
+            before = (parse_datetime(last['created_at']), last['id'])
+        messages += archive.read_before(room_id, limit - len(messages), before)
+    return messages
+
+def _from_hot_window(room_id, limit):
+    redis = get_redis_connection('default')
+    if not redis.exists(READY_KEY.format(room_id=room_id)):
+        return None
+    members = redis.zrevrange(RECENT_KEY.format(room_id=room_id), 0, limit - 1)
+    return [json.loads(m) for m in members]
+
+def _fill_hot_window(room_id, payloads):
+    redis = get_redis_connection('default')
+    pipe = redis.pipeline()
+    if payloads:
+        _write(pipe, room_id, payloads)
+    pipe.set(READY_KEY.format(room_id=room_id), 1, ex=settings.CHAT_HISTORY_HOT_TTL)
+    pipe.execute()
+
+def get_page(room_id, cursor=None, limit=None):
+    """
+    One page of history, newest first. Returns (messages, next_cursor);
+    next_cursor is None when there is nothing older.
+    """
+    if limit is not None and limit < 1:
+        raise ValueError('limit must be positive')
+    window = settings.CHAT_HISTORY_HOT_WINDOW
+    limit = min(limit or settings.CHAT_HISTORY_PAGE_SIZE, window)
+    
+    if cursor is None:
+        messages = _from_hot_window(room_id, limit)
+        record_cache('chat_history', messages is not None)
+        if messages is None:
+            # Filled from the primary: the hot window is cached for hours
+            with use_primary():
+                newest = _from_db(room_id, window)
+            _fill_hot_window(room_id, newest)
+            messages = newest[:limit]
+    else:
+        messages = _from_db(room_id, limit, before=decode_cursor(cursor))
+    
+    # A short page means we reached the start of the room
+    next_cursor = encode_cursor(messages[-1]) if len(messages) == limit else None
+    return messages, next_cursor
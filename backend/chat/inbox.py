@@ -0,0 +1,210 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from redis.exceptions import WatchError
+
+from core.db_router import use_primary
+from core.metrics import record_cache
+from core.models import ChatRoom
+
+# Per user, the inbox cache is:
+#   inbox:<uid>        hash   room_id -> JSON snapshot
+#   inbox:<uid>:order  zset   room_id scored by last activity
+#   inbox:<uid>:ready  flag   set once the hash holds every room of the user
+#   inbox:<uid>:gen    int    bumped by every pushed update
+# Updates patch existing snapshots in place. A cold fill only publishes
+# its rows if no update raced it (the generation is unchanged).
+HASH_KEY = 'inbox:{user_id}'
+ORDER_KEY = 'inbox:{user_id}:order'
+READY_KEY = 'inbox:{user_id}:ready'
+GEN_KEY = 'inbox:{user_id}:gen'
+
+# Scores are integer milliseconds so they survive cjson's 14 significant digits
+# KEYS: hash, order, ready, gen for the sender, then the same for the receiver
+# ARGV: room_id, preview, score, iso timestamp
+APPLY_MESSAGE = """
+for i = 0, 1 do
+    local hash, order, ready, gen = KEYS[i*4+1], KEYS[i*4+2], KEYS[i*4+3], KEYS[i*4+4]
+    redis.call('INCR', gen)
+    if redis.call('EXISTS', ready) == 1 then
+        local raw = redis.call('HGET', hash, ARGV[1])
+        if raw then
+            local snapshot = cjson.decode(raw)
+            local score = tonumber(ARGV[3])
+            if score >= snapshot['score'] then
+                snapshot['last_message'] = ARGV[2]
+                snapshot['last_message_time'] = ARGV[4]
+                snapshot['score'] = score
+            end
+            if i == 1 then
+                snapshot['unread_count'] = snapshot['unread_count'] + 1
+            end
+            redis.call('HSET', hash, ARGV[1], cjson.encode(snapshot))
+            redis.call('ZADD', order, 'GT', score, ARGV[1])
+        else
+            -- A room we have never cached: the cache is no longer complete
+            redis.call('DEL', ready)
+        end
+    end
+end
+"""
+
+# KEYS: hash, gen   ARGV: room_id, unread count
+SET_UNREAD = """
+redis.call('INCR', KEYS[2])
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if raw then
+    local snapshot = cjson.decode(raw)
+    snapshot['unread_count'] = tonumber(ARGV[2])
+    redis.call('HSET', KEYS[1], ARGV[1], cjson.encode(snapshot))
+end
+"""
+
+def _score(moment):
+    return int(moment.timestamp() * 1000)
+
+def _keys(user_id):
+    return [key.format(user_id=user_id) for key in (HASH_KEY, ORDER_KEY, READY_KEY, GEN_KEY)]
+
+async def push_message(redis, sender_id, receiver_id, room_id, content, timestamp):
+    """Apply a new message to both participants' cached inboxes"""
+    created_at = parse_datetime(timestamp) if isinstance(timestamp, str) else timestamp
+    await redis.eval(
+        APPLY_MESSAGE, 8, *_keys(sender_id), *_keys(receiver_id),
+        str(room_id), content[:100], _score(created_at), created_at.isoformat()
+    )
+
+async def push_unread(redis, user_id, room_id, unread_count):
+    await redis.eval(
+        SET_UNREAD, 2, HASH_KEY.format(user_id=user_id), GEN_KEY.format(user_id=user_id),
+        str(room_id), unread_count
+    )
+
+def invalidate(redis, *user_ids):
+    """Drop the cached inboxes of `user_ids`, e.g. for a room they have never cached"""
+    pipe = redis.pipeline(transaction=False)
+    for user_id in user_ids:
+        # Bumping the generation also discards any fill already in flight
+        pipe.incr(GEN_KEY.format(user_id=user_id))
+        pipe.delete(READY_KEY.format(user_id=user_id))
+    pipe.execute()
+
+def build_snapshots(user):
+    """Every room of the user as compact inbox entries, in a single query"""
+    rows = ChatRoom.objects.filter(
+        Q(user1_id=user.id) | Q(user2_id=user.id)
+    ).annotate(
+        activity=Coalesce('last_message_time', 'created_at')
+    ).values(
+        'id', 'user1_id', 'last_message', 'last_message_time', 'activity',
+        'unread_count_user1', 'unread_count_user2',
+        'user1__first_name', 'user1__last_name', 'user1__username', 'user1__profile_image',
+        'user2__first_name', 'user2__last_name', 'user2__username', 'user2__profile_image',
+    )
+    
+    snapshots = []
+    for row in rows:
+        is_user1 = row['user1_id'] == user.id
+        other = 'user2' if is_user1 else 'user1'
+        name = f"{row[f'{other}__first_name']} {row[f'{other}__last_name']}".strip()
+        avatar = row[f'{other}__profile_image']
+        snapshots.append({
+            'room_id': str(row['id']),
+            'other_user': {
+                'name': name or row[f'{other}__username'],
+                'avatar': default_storage.url(avatar) if avatar else None,
+            },
+            'last_message': row['last_message'],
+            'last_message_time': row['last_message_time'].isoformat() if row['last_message_time'] else None,
+            'unread_count': row['unread_count_user1' if is_user1 else 'unread_count_user2'],
+            'score': _score(row['activity']),
+        })
+    return snapshots
+
+def _fill(redis, user, generation):
+    """Build from Postgres and cache, unless an update arrived meanwhile"""
+    # A lagging replica would leave the cache stale for its whole TTL
+    with use_primary():
+        snapshots = build_snapshots(user)
+    hash_key, order_key, ready_key, gen_key = _keys(user.id)
+    ttl = settings.CHAT_INBOX_TTL
+    
+    with redis.pipeline() as pipe:
+        try:
+            pipe.watch(gen_key)
+            if pipe.get(gen_key) != generation:
+                return snapshots
+            pipe.multi()
+            pipe.delete(hash_key, order_key)
+            if snapshots:
+                pipe.hset(hash_key, mapping={s['room_id']: json.dumps(s) for s in snapshots})
+                pipe.zadd(order_key, {s['room_id']: s['score'] for s in snapshots})
+            pipe.set(ready_key, 1)
+            for key in (hash_key, order_key, ready_key, gen_key):
+                pipe.expire(key, ttl)
+            pipe.execute()
+        except WatchError:
+            pass
+    return snapshots
+
+def encode_cursor(snapshot):
+    raw = f"{snapshot['score']}|{snapshot['room_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    score, room_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+    return int(score), room_id
+
+def _after(snapshots, cursor):
+    """Entries strictly after the (score, room_id) cursor, newest first"""
+    if cursor is None:
+        return snapshots
+    score, room_id = cursor
+    return [
+        s for s in snapshots
+        if s['score'] < score or (s['score'] == score and s['room_id'] < room_id)
+    ]
+
+def get_page(redis, user, cursor=None, limit=None):
+    """
+    One inbox page ordered by last activity, newest first.
+    Returns (entries, next_cursor).
+    """
+    if limit is not None and limit < 1:
+        raise ValueError('limit must be positive')
+    limit = min(limit or settings.CHAT_INBOX_PAGE_SIZE, 100)
+    cursor = decode_cursor(cursor) if cursor else None
+    hash_key, order_key, ready_key, gen_key = _keys(user.id)
+    
+    pipe = redis.pipeline(transaction=False)
+    pipe.exists(ready_key)
+    pipe.get(gen_key)
+    ready, generation = pipe.execute()
+    record_cache('chat_inbox', bool(ready))
+    
+    if ready:
+        if cursor is None:
+            room_ids = redis.zrevrangebyscore(order_key, '+inf', '-inf', start=0, num=limit)
+        else:
+            # Rooms tied on the cursor's score (rare, so fetched whole) and
+            # then up to a page strictly below it
+            score, room_id = cursor
+            pipe = redis.pipeline(transaction=False)
+            pipe.zrevrangebyscore(order_key, score, score)
+            pipe.zrevrangebyscore(order_key, f'({score}', '-inf', start=0, num=limit)
+            ties, lower = pipe.execute()
+            room_ids = ([r for r in ties if r.decode() < room_id] + lower)[:limit]
+        raw = redis.hmget(hash_key, room_ids) if room_ids else []
+        snapshots = [json.loads(r) for r in raw if r]
+    else:
+        snapshots = _fill(redis, user, generation)
+    
+    snapshots.sort(key=lambda s: (s['score'], s['room_id']), reverse=True)
+    page = _after(snapshots, cursor)[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(page) == limit else None
+    return [{k: v for k, v in s.items() if k != 'score'} for s in page], next_cursor
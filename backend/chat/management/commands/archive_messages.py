@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat import partitions
+from chat.archive import archive_partition
+
+class Command(BaseCommand):
+    help = (
+        'Move message partitions older than the cutoff into compressed JSONL '
+        'archive files and drop them from Postgres'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.CHAT_ARCHIVE_AFTER_MONTHS,
+                            help='Keep this many months (including the current one) in Postgres')
+        parser.add_argument('--dry-run', action='store_true')
+    
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError('core_message is not partitioned; run partition_messages --convert first')
+        if options['months'] < 1:
+            raise CommandError('--months must be at least 1')
+        
+        current = partitions.month_start(partitions.utc_today())
+        cutoff = partitions.add_months(current, -(options['months'] - 1))
+        old = [month for month in partitions.list_partitions() if month < cutoff]
+        if not old:
+            self.stdout.write(f'No partitions before {cutoff:%Y-%m}')
+            return
+        
+        for month in old:
+            name = partitions.partition_name(month)
+            if options['dry_run']:
+                self.stdout.write(f'Would archive {name}')
+                continue
+            count = archive_partition(month)
+            self.stdout.write(f'Archived {name}: {count} messages')
@@ -0,0 +1,101 @@
+import asyncio
+import random
+import uuid
+
+from channels_redis.core import RedisChannelLayer
+from django.core.management.base import BaseCommand
+
+from chat.layers import ConsistentHashChannelLayer
+
+class Command(BaseCommand):
+    help = (
+        'Measure group_send throughput of the consistent-hash channel layer on '
+        '1, 2 and 4 Redis nodes, and how many groups move when nodes are added'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--hosts', nargs='+', required=True,
+                            help='redis:// URLs of local instances, e.g. ports 6379-6382')
+        parser.add_argument('--groups', type=int, default=2000, help='Rooms, two members each')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Layer instances standing in for ASGI worker processes')
+        parser.add_argument('--senders', type=int, default=50)
+        parser.add_argument('--duration', type=float, default=10.0)
+        parser.add_argument('--seed', type=int, default=1)
+    
+    def handle(self, *args, **options):
+        hosts = options['hosts']
+        self.report_movement(hosts, options['groups'])
+        
+        for count in (1, 2, 4):
+            if count > len(hosts):
+                self.stdout.write(f'Skipping {count} nodes: only {len(hosts)} hosts given')
+                break
+            random.seed(options['seed'])
+            sent, delivered, elapsed = asyncio.run(self.run(hosts[:count], options))
+            self.stdout.write(
+                f'{count} node(s): {sent / elapsed:>9.0f} group_send/s  '
+                f'{delivered / elapsed:>9.0f} deliveries/s'
+            )
+    
+    def report_movement(self, hosts, groups):
+        names = [f'chat_{uuid.UUID(int=random.getrandbits(128))}' for _ in range(groups)]
+        for before, after in ((1, 2), (2, 3), (2, 4), (3, 4)):
+            if after > len(hosts):
+                break
+            moved = {}
+            for label, cls in (('modulo', RedisChannelLayer), ('ring', ConsistentHashChannelLayer)):
+                old, new = cls(hosts=hosts[:before]), cls(hosts=hosts[:after])
+                moved[label] = sum(old.consistent_hash(n) != new.consistent_hash(n) for n in names)
+            self.stdout.write(
+                f'{before} -> {after} nodes: groups moved  '
+                f"modulo {moved['modulo'] / groups:.0%}  ring {moved['ring'] / groups:.0%}"
+            )
+    
+    async def run(self, hosts, options):
+        prefix = f'bench{uuid.uuid4().hex[:8]}'
+        workers = [
+            ConsistentHashChannelLayer(hosts=hosts, prefix=prefix, capacity=10000)
+            for _ in range(options['workers'])
+        ]
+        sender = ConsistentHashChannelLayer(hosts=hosts, prefix=prefix, capacity=10000)
+        groups = [f'chat_{uuid.uuid4()}' for _ in range(options['groups'])]
+        
+        members = []
+        for index, group in enumerate(groups):
+            for side in range(2):
+                layer = workers[(index * 2 + side) % len(workers)]
+                channel = await layer.new_channel()
+                await layer.group_add(group, channel)
+                members.append((layer, channel))
+        
+        delivered = 0
+        sent = 0
+        
+        async def consume(layer, channel):
+            nonlocal delivered
+            while True:
+                await layer.receive(channel)
+                delivered += 1
+        
+        async def send(until):
+            nonlocal sent
+            loop = asyncio.get_running_loop()
+            while loop.time() < until:
+                await sender.group_send(random.choice(groups), {'type': 'chat.message', 'content': 'x'})
+                sent += 1
+        
+        consumers = [asyncio.ensure_future(consume(layer, channel)) for layer, channel in members]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        until = started + options['duration']
+        await asyncio.gather(*(send(until) for _ in range(options['senders'])))
+        elapsed = loop.time() - started
+        
+        for task in consumers:
+            task.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+        await sender.flush()
+        for layer in workers + [sender]:
+            await layer.close_pools()
+        return sent, delivered, elapsed
@@ -0,0 +1,75 @@
+import asyncio
+import time
+import uuid
+
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from chat.consumers import ChatConsumer
+from core.models import ChatRoom, Message
+
+User = get_user_model()
+
+@database_sync_to_async
+def legacy_save_message(user, room_id, content, message_type):
+    # The pre-optimization path: re-fetch the room, lazy-load participants,
+    # insert, then save every column of the room
+    room = ChatRoom.objects.get(id=room_id)
+    receiver = room.user2 if user == room.user1 else room.user1
+    message = Message.objects.create(
+        room=room, sender=user, receiver=receiver,
+        content=content, message_type=message_type
+    )
+    room.last_message = content[:100]
+    room.last_message_time = message.created_at
+    if user == room.user1:
+        room.unread_count_user2 += 1
+    else:
+        room.unread_count_user1 += 1
+    room.save()
+    return message
+
+class Command(BaseCommand):
+    help = 'Measure chat messages persisted per second by one worker'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000)
+    
+    def handle(self, *args, **options):
+        count = options['messages']
+        suffix = uuid.uuid4().hex[:8]
+        sender = User.objects.create_user(
+            username=f'bench_a_{suffix}', email=f'a_{suffix}@bench.local',
+            phone_number=f'+91a{suffix}', password=uuid.uuid4().hex
+        )
+        receiver = User.objects.create_user(
+            username=f'bench_b_{suffix}', email=f'b_{suffix}@bench.local',
+            phone_number=f'+91b{suffix}', password=uuid.uuid4().hex
+        )
+        room = ChatRoom.objects.create(user1=sender, user2=receiver)
+        
+        try:
+            legacy = asyncio.run(self.run_legacy(sender, room.id, count))
+            current = asyncio.run(self.run_current(sender, room.id, count))
+        finally:
+            User.objects.filter(id__in=[sender.id, receiver.id]).delete()
+        
+        self.stdout.write(f'legacy:  {legacy:8.1f} msg/s')
+        self.stdout.write(f'current: {current:8.1f} msg/s ({current / legacy:.2f}x)')
+    
+    async def run_legacy(self, user, room_id, count):
+        started = time.perf_counter()
+        for i in range(count):
+            await legacy_save_message(user, room_id, f'message {i}', 'text')
+        return count / (time.perf_counter() - started)
+    
+    async def run_current(self, user, room_id, count):
+        consumer = ChatConsumer()
+        consumer.user = user
+        room = await consumer.load_room(room_id)
+        
+        started = time.perf_counter()
+        for i in range(count):
+            await consumer.save_message(room, f'message {i}', 'text')
+        return count / (time.perf_counter() - started)
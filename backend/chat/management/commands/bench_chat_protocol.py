@@ -0,0 +1,86 @@
+import json
+import random
+import time
+import uuid
+
+import msgpack
+from django.core.management.base import BaseCommand
+
+def frame_overhead(length):
+    # Server-to-client WebSocket frames are unmasked: 2 byte header, plus
+    # 2 or 8 bytes of extended length for larger payloads
+    if length < 126:
+        return 2
+    if length < 65536:
+        return 4
+    return 10
+
+def sample_events(count):
+    sender_id = str(uuid.uuid4())
+    events = []
+    for i in range(count):
+        kind = random.random()
+        if kind < 0.6:
+            events.append({
+                'type': 'message',
+                'room_id': str(uuid.uuid4()),
+                'message_id': str(uuid.uuid4()),
+                'sender_id': sender_id,
+                'sender_username': 'neighbour_42',
+                'content': 'Is the drill still available this weekend?' * random.randint(1, 3),
+                'message_type': 'text',
+                'timestamp': '2024-01-01T10:00:00.123456+00:00',
+            })
+        elif kind < 0.85:
+            events.append({
+                'type': 'typing',
+                'room_id': str(uuid.uuid4()),
+                'user_id': sender_id,
+                'username': 'neighbour_42',
+                'is_typing': bool(i % 2),
+            })
+        else:
+            events.append({
+                'type': 'read',
+                'room_id': str(uuid.uuid4()),
+                'user_id': sender_id,
+                'username': 'neighbour_42',
+                'message_id': str(uuid.uuid4()),
+                'read_up_to': '2024-01-01T10:00:00.123456+00:00',
+            })
+    return events
+
+class Command(BaseCommand):
+    help = 'Compare encode throughput and bytes on the wire for JSON and batched MessagePack frames'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100000)
+        parser.add_argument('--batch', type=int, default=8,
+                            help='Events per frame when a busy socket batches')
+        parser.add_argument('--seed', type=int, default=1)
+    
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        events = sample_events(options['events'])
+        batch = options['batch']
+        
+        variants = {
+            'json': lambda: [json.dumps(e).encode() for e in events],
+            'msgpack': lambda: [msgpack.packb(e) for e in events],
+            f'msgpack x{batch}': lambda: [
+                msgpack.packb(events[i:i + batch]) for i in range(0, len(events), batch)
+            ],
+        }
+        
+        baseline = None
+        for name, encode in variants.items():
+            started = time.perf_counter()
+            frames = encode()
+            elapsed = time.perf_counter() - started
+            
+            wire = sum(len(f) + frame_overhead(len(f)) for f in frames)
+            baseline = baseline or wire
+            self.stdout.write(
+                f'{name:<12} {len(events) / elapsed:>12,.0f} events/s  '
+                f'{len(frames):>8} frames  {wire:>12,} bytes  ({wire / baseline:.0%} of JSON)'
+            )
@@ -0,0 +1,110 @@
+import asyncio
+import random
+import time
+import uuid
+
+from channels.layers import channel_layers
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import CommandError
+
+from chat.management.commands.loadtest_chat import (
+    Command as LoadtestCommand, InProcessSocket, NetworkSocket,
+)
+from core.models import User
+
+class Command(LoadtestCommand):
+    help = (
+        'Connect typing clients to ChatConsumer, paired two per room, and report '
+        'how many typing events reach the channel layer and the sockets compared '
+        'with broadcasting every keystroke'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500,
+                            help='Number of sockets; paired two per room')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds of typing')
+        parser.add_argument('--layer', choices=['memory', 'redis'], default='memory',
+                            help='Channel layer for in-process runs')
+        parser.add_argument('--url', help='ws://host:port of a running server instead of in-process')
+        parser.add_argument('--seed', type=int, default=1)
+    
+    def handle(self, *args, **options):
+        if options['clients'] < 2 or options['clients'] % 2:
+            raise CommandError('--clients must be an even number of at least 2')
+        if options['layer'] == 'memory':
+            if options['url']:
+                raise CommandError('The in-memory channel layer only works in-process')
+            settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+            channel_layers.backends = {}
+        
+        users, rooms, sessions = self.setup(uuid.uuid4().hex[:8], options['clients'])
+        try:
+            sent, delivered, elapsed = asyncio.run(self.run(rooms, sessions, options))
+        finally:
+            User.objects.filter(id__in=[u.id for u in users]).delete()
+            SessionStore.get_model_class().objects.filter(session_key__in=sessions).delete()
+        
+        # Every room member, the sender included, gets each broadcast
+        group_sends = delivered // 2
+        self.stdout.write(f'typing events sent:         {sent}')
+        self.stdout.write(f'group_send (undebounced):   {sent}')
+        self.stdout.write(f'group_send (debounced):     {group_sends}')
+        self.stdout.write(f'typing frames delivered:    {delivered} ({delivered / elapsed:.1f}/s)')
+        if sent:
+            self.stdout.write(f'fan-out reduction:          {1 - group_sends / sent:.1%}')
+    
+    async def run(self, rooms, sessions, options):
+        rng = random.Random(options['seed'])
+        sockets = []
+        for index, session in enumerate(sessions):
+            path = f'ws/chat/{rooms[index // 2].id}/'
+            if options['url']:
+                sockets.append(NetworkSocket(f"{options['url'].rstrip('/')}/{path}", session))
+            else:
+                sockets.append(InProcessSocket(f'/{path}', session))
+        
+        connected = await asyncio.gather(*(s.connect() for s in sockets))
+        if not all(connected):
+            raise CommandError(f'{connected.count(False)} clients failed to connect')
+        
+        delivered = 0
+        
+        async def read(socket):
+            nonlocal delivered
+            while True:
+                if (await socket.receive()).get('type') == 'typing':
+                    delivered += 1
+        
+        readers = [asyncio.ensure_future(read(s)) for s in sockets]
+        started = time.perf_counter()
+        try:
+            sent = await asyncio.gather(*(
+                self.type(s, random.Random(rng.random()), options['duration']) for s in sockets
+            ))
+            # Idle timeouts publish "stopped typing" after the last keystroke
+            await asyncio.sleep(settings.CHAT_TYPING_IDLE_TIMEOUT + 1)
+        finally:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+            await asyncio.gather(*(s.close() for s in sockets), return_exceptions=True)
+        return sum(sent), delivered, time.perf_counter() - started
+    
+    async def type(self, socket, rng, duration):
+        # Bursts of keystrokes, each emitting a typing event like the mobile
+        # client does, separated by pauses to read or think
+        loop = asyncio.get_running_loop()
+        end = loop.time() + duration
+        sent = 0
+        while loop.time() < end:
+            burst_end = loop.time() + rng.uniform(1, 8)
+            while loop.time() < min(burst_end, end):
+                await socket.send({'type': 'typing', 'is_typing': True})
+                sent += 1
+                await asyncio.sleep(rng.uniform(0.1, 0.35))
+            if rng.random() < 0.5:
+                await socket.send({'type': 'typing', 'is_typing': False})
+                sent += 1
+            await asyncio.sleep(rng.uniform(0.5, 6))
+        return sent
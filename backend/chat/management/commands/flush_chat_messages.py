@@ -0,0 +1,31 @@
+import os
+import socket
+
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from chat.write_behind import MessageFlusher
+
+class Command(BaseCommand):
+    help = 'Persist write-behind chat messages from the Redis stream in batches'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--name', default=f'{socket.gethostname()}-{os.getpid()}',
+                            help='Consumer name; reuse it across restarts to resume pending work')
+    
+    def handle(self, *args, **options):
+        flusher = MessageFlusher(
+            get_redis_connection('default'),
+            consumer_name=options['name'],
+            batch_size=options['batch_size'],
+        )
+        flusher.ensure_group()
+        
+        recovered = flusher.recover()
+        self.stdout.write(f'Recovered {recovered} pending messages')
+        
+        while True:
+            flushed = flusher.poll()
+            if flushed:
+                self.stdout.write(f'Flushed {flushed} messages')
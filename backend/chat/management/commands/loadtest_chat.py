@@ -0,0 +1,350 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+
+from channels.layers import channel_layers
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from core.models import ChatRoom, User
+from core.token_blacklist import RefreshToken
+
+class QueryCounter:
+    """execute_wrapper counting queries on every connection, in any thread"""
+    
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+    
+    def install(self):
+        def on_connect(sender, connection, **kwargs):
+            connection.execute_wrappers.append(self)
+        
+        self._receiver = on_connect
+        connection_created.connect(on_connect)
+        for conn in connections.all():
+            conn.execute_wrappers.append(self)
+
+class InProcessSocket:
+    """Client talking to config.asgi.application through the ASGI interface"""
+    
+    def __init__(self, path, cookie):
+        from channels.testing import WebsocketCommunicator
+        from config.asgi import application
+        
+        self.communicator = WebsocketCommunicator(
+            application, path, headers=[(b'cookie', f'sessionid={cookie}'.encode())]
+        )
+    
+    async def connect(self):
+        connected, _ = await self.communicator.connect(timeout=30)
+        return connected
+    
+    async def send(self, payload):
+        await self.communicator.send_to(text_data=json.dumps(payload))
+    
+    async def receive(self):
+        return json.loads(await self.communicator.receive_from(timeout=3600))
+    
+    async def close(self):
+        await self.communicator.disconnect()
+
+class NetworkSocket:
+    """Client for a server started separately, e.g. `daphne config.asgi:application`"""
+    
+    def __init__(self, url, cookie):
+        self.url = url
+        self.cookie = cookie
+    
+    async def connect(self):
+        import websockets
+        
+        self.ws = await websockets.connect(
+            self.url, extra_headers={'Cookie': f'sessionid={self.cookie}'}, max_queue=None
+        )
+        return True
+    
+    async def send(self, payload):
+        await self.ws.send(json.dumps(payload))
+    
+    async def receive(self):
+        return json.loads(await self.ws.recv())
+    
+    async def close(self):
+        await self.ws.close()
+
+class Client:
+    def __init__(self, user_id, socket, rng, stats, message_rate):
+        self.user_id = user_id
+        self.socket = socket
+        self.rng = rng
+        self.stats = stats
+        self.message_rate = message_rate
+        self.last_received = None
+    
+    async def run(self, until):
+        """Send until `until`; frames are read by read(), run alongside by the caller"""
+        loop = asyncio.get_running_loop()
+        while loop.time() < until:
+            # Exponential gaps give Poisson arrivals at message_rate
+            await asyncio.sleep(self.rng.expovariate(self.message_rate))
+            for _ in range(self.rng.randint(1, 4)):
+                await self.socket.send({'type': 'typing', 'is_typing': True})
+            
+            nonce = uuid.uuid4().hex
+            self.stats.sent[nonce] = time.perf_counter()
+            await self.socket.send({'type': 'message', 'content': f'load {nonce}'})
+            
+            if self.last_received and self.rng.random() < 0.5:
+                await self.socket.send({'type': 'read_receipt', 'message_id': self.last_received})
+    
+    async def read(self):
+        while True:
+            frame = await self.socket.receive()
+            self.stats.frames += 1
+            if frame.get('type') != 'message':
+                continue
+            
+            sent = self.stats.sent.get(frame['content'][5:])
+            # Latency is measured at the other participant, not the sender's echo
+            if sent is not None and frame['sender_id'] != self.user_id:
+                self.stats.latencies.append(time.perf_counter() - sent)
+                self.last_received = frame['message_id']
+
+class Stats:
+    def __init__(self):
+        self.sent = {}
+        self.latencies = []
+        self.frames = 0
+
+class HttpLoad:
+    """Closed-loop REST load: `concurrency` clients each repeating one GET"""
+    
+    def __init__(self, url, token, concurrency):
+        self.url = url
+        self.token = token
+        self.concurrency = concurrency
+        self.latencies = []
+        self.errors = 0
+    
+    async def run(self):
+        import httpx
+        
+        limits = httpx.Limits(max_connections=self.concurrency)
+        headers = {'Authorization': f'Bearer {self.token}'}
+        async with httpx.AsyncClient(limits=limits, headers=headers, timeout=30) as client:
+            await asyncio.gather(*(self.worker(client) for _ in range(self.concurrency)))
+    
+    async def worker(self, client):
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await client.get(self.url)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                self.latencies.append(time.perf_counter() - started)
+            else:
+                self.errors += 1
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class Command(BaseCommand):
+    help = (
+        'Simulate chat clients sending messages, typing and read receipts through '
+        'ChatConsumer and report end-to-end latency percentiles, throughput and '
+        'DB queries per message'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000,
+                            help='Number of sockets; paired two per room')
+        parser.add_argument('--duration', type=float, default=30.0)
+        parser.add_argument('--rate', type=float, default=0.2,
+                            help='Messages per second per client')
+        parser.add_argument('--layer', choices=['memory', 'redis'], default='memory',
+                            help='Channel layer for in-process runs')
+        parser.add_argument('--url', help='ws://host:port of a running server instead of in-process')
+        parser.add_argument('--http-url',
+                            help='http://host:port of the API; repeats the run under REST load to '
+                                 'show whether chat latency is affected')
+        parser.add_argument('--http-path', default='/api/services/?search=a',
+                            help='GET endpoint used as REST load')
+        parser.add_argument('--http-concurrency', type=int, default=32)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--keep', action='store_true', help='Keep generated users and rooms')
+    
+    def handle(self, *args, **options):
+        if options['clients'] < 2 or options['clients'] % 2:
+            raise CommandError('--clients must be an even number of at least 2')
+        
+        if options['http_url'] and not options['url']:
+            raise CommandError('--http-url needs --url, the REST load must hit the same deployment')
+        
+        if options['layer'] == 'memory':
+            if options['url']:
+                raise CommandError('The in-memory channel layer only works in-process')
+            settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+            channel_layers.backends = {}
+        
+        run_id = uuid.uuid4().hex[:8]
+        users, rooms, sessions = self.setup(run_id, options['clients'])
+        
+        counter = QueryCounter()
+        counter.install()
+        
+        try:
+            results = asyncio.run(self.run(users, rooms, sessions, counter, options))
+        finally:
+            if not options['keep']:
+                User.objects.filter(id__in=[u.id for u in users]).delete()
+                SessionStore.get_model_class().objects.filter(session_key__in=sessions).delete()
+        
+        for key, value in results.items():
+            if isinstance(value, dict):
+                self.stdout.write(f'{key}:')
+                for name, number in value.items():
+                    self.stdout.write(f'  {name:<20} {number}')
+            else:
+                self.stdout.write(f'{key:<22} {value}')
+        
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'options': {k: options[k] for k in (
+                    'clients', 'duration', 'rate', 'layer', 'url', 'seed',
+                    'http_url', 'http_path', 'http_concurrency',
+                )}, 'results': results}, f, indent=2)
+    
+    def setup(self, run_id, count):
+        self.stdout.write(f'Creating {count} users and {count // 2} rooms')
+        users = User.objects.bulk_create([
+            User(
+                username=f'load_{run_id}_{i}',
+                email=f'load_{run_id}_{i}@load.local',
+                phone_number=f'9{run_id[:4]}{i:06d}'[:15],
+                password='!',
+                is_verified=True,
+            )
+            for i in range(count)
+        ])
+        rooms = ChatRoom.objects.bulk_create([
+            ChatRoom(user1=users[i], user2=users[i + 1]) for i in range(0, count, 2)
+        ])
+        
+        sessions = []
+        for user in users:
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            sessions.append(session.session_key)
+        return users, rooms, sessions
+    
+    async def run(self, users, rooms, sessions, counter, options):
+        rng = random.Random(options['seed'])
+        
+        clients = []
+        for index, (user, session) in enumerate(zip(users, sessions)):
+            path = f'ws/chat/{rooms[index // 2].id}/'
+            if options['url']:
+                socket = NetworkSocket(f"{options['url'].rstrip('/')}/{path}", session)
+            else:
+                socket = InProcessSocket(f'/{path}', session)
+            clients.append(Client(
+                str(user.id), socket, random.Random(rng.random()), None, options['rate']
+            ))
+        
+        connect_started = time.perf_counter()
+        connected = await asyncio.gather(*(c.socket.connect() for c in clients))
+        connect_time = time.perf_counter() - connect_started
+        if not all(connected):
+            raise CommandError(f'{connected.count(False)} clients failed to connect')
+        
+        results = {'clients': len(clients), 'connect_seconds': round(connect_time, 2)}
+        try:
+            if not options['http_url']:
+                results.update(await self.measure(clients, counter, options))
+                return results
+            
+            results['idle'] = await self.measure(clients, counter, options)
+            load = HttpLoad(
+                options['http_url'].rstrip('/') + options['http_path'],
+                str(RefreshToken.for_user(users[0]).access_token),
+                options['http_concurrency'],
+            )
+            load_task = asyncio.ensure_future(load.run())
+            started = time.perf_counter()
+            try:
+                results['under_http_load'] = await self.measure(clients, counter, options)
+            finally:
+                load_task.cancel()
+                await asyncio.gather(load_task, return_exceptions=True)
+            elapsed = time.perf_counter() - started
+            
+            http_ms = [value * 1000 for value in load.latencies]
+            results['http_load'] = {
+                'requests_per_second': round(len(http_ms) / elapsed, 1),
+                'errors': load.errors,
+                'p50_ms': round(percentile(http_ms, 0.50), 2),
+                'p99_ms': round(percentile(http_ms, 0.99), 2),
+            }
+            idle, loaded = results['idle']['p99_ms'], results['under_http_load']['p99_ms']
+            results['chat_p99_change'] = f'{loaded / idle - 1:+.1%}' if idle else None
+            return results
+        finally:
+            await asyncio.gather(*(c.socket.close() for c in clients), return_exceptions=True)
+    
+    async def measure(self, clients, counter, options):
+        """One timed run of every client; returns latency and throughput figures"""
+        stats = Stats()
+        for client in clients:
+            client.stats = stats
+        
+        queries_before = counter.count
+        readers = [asyncio.ensure_future(c.read()) for c in clients]
+        started = time.perf_counter()
+        until = asyncio.get_running_loop().time() + options['duration']
+        try:
+            await asyncio.gather(*(c.run(until) for c in clients))
+            # Let in-flight broadcasts land before measuring; readers stay up for it
+            await asyncio.sleep(1)
+        finally:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        queries = counter.count - queries_before
+        
+        sent = len(stats.sent)
+        latencies_ms = [value * 1000 for value in stats.latencies]
+        return {
+            'messages_sent': sent,
+            'messages_delivered': len(latencies_ms),
+            'messages_per_second': round(sent / elapsed, 1),
+            'frames_received': stats.frames,
+            'p50_ms': round(percentile(latencies_ms, 0.50), 2),
+            'p95_ms': round(percentile(latencies_ms, 0.95), 2),
+            'p99_ms': round(percentile(latencies_ms, 0.99), 2),
+            'max_ms': round(max(latencies_ms), 2) if latencies_ms else None,
+            # Only meaningful in-process, where the server shares our connections
+            'db_queries_per_message': round(queries / sent, 2) if sent and not options['url'] else None,
+        }
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from chat import partitions
+
+class Command(BaseCommand):
+    help = (
+        'Create upcoming monthly partitions of core_message; with --convert, '
+        'first rebuild a plain core_message table as a partitioned one. Run monthly.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3)
+        parser.add_argument('--convert', action='store_true',
+                            help='Partition an existing unpartitioned table (takes an exclusive lock)')
+    
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            if not options['convert']:
+                self.stderr.write('core_message is not partitioned; rerun with --convert')
+                return
+            self.stdout.write('Converting core_message to a partitioned table...')
+            partitions.convert_table(options['months_ahead'])
+        
+        created = partitions.ensure_partitions(options['months_ahead'])
+        for month in created:
+            self.stdout.write(f'Created {partitions.partition_name(month)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(partitions.list_partitions())} monthly partitions, {len(created)} new'
+        ))
@@ -0,0 +1,78 @@
+import redis
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.layers import ConsistentHashChannelLayer, node_id
+
+def connect(host):
+    if isinstance(host, dict):
+        if 'address' in host:
+            return redis.Redis.from_url(host['address'])
+        return redis.Redis(**{k: v for k, v in host.items() if k != 'address'})
+    if isinstance(host, (tuple, list)):
+        return redis.Redis(host=host[0], port=host[1])
+    return redis.Redis.from_url(host)
+
+class Command(BaseCommand):
+    help = (
+        'Move channel layer keys (group memberships and pending channel messages) '
+        'to the node that owns them on the current hash ring'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--drain', nargs='*', default=[],
+                            help='redis:// URLs of nodes being removed from the ring')
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--batch', type=int, default=500)
+    
+    def handle(self, *args, **options):
+        layer = get_channel_layer()
+        if not isinstance(layer, ConsistentHashChannelLayer):
+            raise CommandError('CHANNEL_LAYERS does not use chat.layers.ConsistentHashChannelLayer')
+        
+        targets = [connect(host) for host in layer.hosts]
+        sources = [(node_id(host), client) for host, client in zip(layer.hosts, targets)]
+        sources += [(url, redis.Redis.from_url(url)) for url in options['drain']]
+        
+        prefix = layer.prefix.encode()
+        group_prefix = prefix + b':group:'
+        moved = scanned = 0
+        
+        for name, client in sources:
+            node_moved = 0
+            for key in client.scan_iter(match=prefix + b'*', count=options['batch']):
+                scanned += 1
+                # Groups hash on the group name, channels on the channel name
+                if key.startswith(group_prefix):
+                    owner = targets[layer.consistent_hash(key[len(group_prefix):].decode())]
+                else:
+                    owner = targets[layer.consistent_hash(key[len(prefix):].decode())]
+                if owner is client:
+                    continue
+                
+                node_moved += 1
+                if not options['dry_run']:
+                    self.move(client, owner, key)
+            moved += node_moved
+            self.stdout.write(f'{name}: {node_moved} keys to move')
+        
+        verb = 'would move' if options['dry_run'] else 'moved'
+        self.stdout.write(self.style.SUCCESS(f'Scanned {scanned} keys, {verb} {moved}'))
+    
+    def move(self, source, target, key):
+        ttl = source.pttl(key)
+        if source.type(key) == b'zset':
+            # Merge rather than overwrite: consumers on the new ring may have
+            # already re-added themselves to the group on the target node
+            members = source.zrange(key, 0, -1, withscores=True)
+            if members:
+                pipe = target.pipeline()
+                pipe.zadd(key, dict(members), gt=True)
+                if ttl > 0:
+                    pipe.pexpire(key, max(ttl, target.pttl(key)))
+                pipe.execute()
+        else:
+            dump = source.dump(key)
+            if dump is not None:
+                target.restore(key, max(ttl, 0), dump, replace=True)
+        source.delete(key)
@@ -0,0 +1,144 @@
+import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+# core_message is range-partitioned by created_at into one table per
+# calendar month (UTC), named core_message_pYYYYMM, plus a default partition
+# that catches rows outside every defined month. Keeping a few months
+# created ahead leaves the default partition empty, which is what allows
+# new month partitions to be attached cheaply.
+TABLE = 'core_message'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+def utc_today():
+    # Partition bounds are UTC months; the server's local date can be a day off
+    return timezone.now().astimezone(datetime.timezone.utc).date()
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+def _bound(month):
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = %s::regclass', [TABLE])
+        return cursor.fetchone()[0] == 'p'
+
+def list_partitions():
+    """Month of every month partition, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{TABLE}_p'
+    return sorted(
+        datetime.datetime.strptime(name[len(prefix):], '%Y%m').date()
+        for name in names if name.startswith(prefix)
+    )
+
+def create_partition(cursor, month):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} '
+        f'FOR VALUES FROM ({_bound(month)}) TO ({_bound(add_months(month, 1))})'
+    )
+
+def ensure_partitions(months_ahead=3, today=None, since=None):
+    """
+    Create partitions from the current month, or from the month of `since`
+    when given, through `months_ahead` months out
+    """
+    current = month_start(today or utc_today())
+    month = min(month_start(since), current) if since else current
+    last = add_months(current, months_ahead)
+    existing = set(list_partitions())
+    created = []
+    with connection.cursor() as cursor:
+        while month <= last:
+            if month not in existing:
+                create_partition(cursor, month)
+                created.append(month)
+            month = add_months(month, 1)
+    return created
+
+def default_partition_rows():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {DEFAULT_PARTITION}')
+        return cursor.fetchone()[0]
+
+@transaction.atomic
+def convert_table(months_ahead=3):
+    """
+    Rebuild a plain core_message table (as created by Django migrations) as a
+    partitioned one holding the same rows, indexes and foreign keys.
+    
+    Postgres requires the partition key in the primary key, so the new key
+    is (id, created_at); ids stay unique as they are random UUIDs. This
+    rewrites the whole table under an exclusive lock and is meant for a
+    maintenance window.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT indexdef FROM pg_indexes
+            WHERE tablename = %s AND indexname NOT IN (
+                SELECT conname FROM pg_constraint
+                WHERE conrelid = %s::regclass AND contype = 'p'
+            )
+            """,
+            [TABLE, TABLE]
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+            """,
+            [TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT min(created_at), max(created_at) FROM {TABLE}')
+        oldest, newest = cursor.fetchone()
+        
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_legacy')
+        cursor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {TABLE}_legacy INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)')
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+        
+        today = month_start(utc_today())
+        month = month_start(oldest) if oldest else today
+        last = max(month_start(newest) if newest else today, add_months(today, months_ahead))
+        while month <= last:
+            create_partition(cursor, month)
+            month = add_months(month, 1)
+        
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_legacy')
+        cursor.execute(f'DROP TABLE {TABLE}_legacy')
+        
+        # Index and constraint names are free again once the old table is gone
+        for definition in index_definitions:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+def drop_partition(cursor, month):
+    name = partition_name(month)
+    cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+    cursor.execute(f'DROP TABLE {name}')
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+
+# One sorted set per user: member = channel name of an open socket, score =
+# when that socket's presence lapses unless it heartbeats again. A user is
+# online while any member's score is in the future, so several devices and
+# crashed workers (whose entries simply lapse) are handled without counters.
+KEY = 'presence:{user_id}'
+MAX_LOOKUP = 200  # Users per presence request
+
+async def touch(redis, user_id, channel_name):
+    """Mark one connection as alive for another CHAT_PRESENCE_TTL seconds"""
+    now = time.time()
+    key = KEY.format(user_id=user_id)
+    pipe = redis.pipeline(transaction=False)
+    pipe.zadd(key, {channel_name: now + settings.CHAT_PRESENCE_TTL})
+    pipe.zremrangebyscore(key, '-inf', now)
+    pipe.expire(key, settings.CHAT_PRESENCE_TTL)
+    await pipe.execute()
+
+async def leave(redis, user_id, channel_name):
+    await redis.zrem(KEY.format(user_id=user_id), channel_name)
+
+def _queue_lookups(pipe, user_ids):
+    for user_id in user_ids:
+        # Latest expiry across the user's connections
+        pipe.zrevrange(KEY.format(user_id=user_id), 0, 0, withscores=True)
+
+def _parse(user_ids, results):
+    now = time.time()
+    presence = {}
+    for user_id, entries in zip(user_ids, results):
+        expires = entries[0][1] if entries else None
+        presence[str(user_id)] = {
+            'online': expires is not None and expires > now,
+            # Last heartbeat; the key expires CHAT_PRESENCE_TTL after it
+            'last_seen': expires - settings.CHAT_PRESENCE_TTL if expires else None,
+        }
+    return presence
+
+def get_presence(redis, user_ids):
+    """Online status for many users in a single round-trip"""
+    pipe = redis.pipeline(transaction=False)
+    _queue_lookups(pipe, user_ids)
+    return _parse(user_ids, pipe.execute())
+
+async def aget_presence(redis, user_ids):
+    pipe = redis.pipeline(transaction=False)
+    _queue_lookups(pipe, user_ids)
+    return _parse(user_ids, await pipe.execute())
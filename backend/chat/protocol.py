@@ -0,0 +1,95 @@
+import asyncio
+import json
+import logging
+
+import msgpack
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MSGPACK_SUBPROTOCOL = 'aangan.msgpack'
+
+class FrameProtocolMixin:
+    """
+    Wire format for chat sockets.
+    
+    JSON text frames, one event per frame, stay the default. Clients that
+    offer the `aangan.msgpack` subprotocol get MessagePack binary frames
+    instead. Once a socket is busy (a frame went out less than
+    CHAT_BATCH_WINDOW_MS ago), its outgoing events are held for up to that
+    window and sent together as one array frame. A frame holding a map is
+    a single event.
+    """
+    
+    use_msgpack = False
+    
+    async def accept_negotiated(self):
+        self._outbox = []
+        self._flush_handle = None
+        self._flush_task = None
+        self._last_sent = float('-inf')
+        
+        if MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', []):
+            self.use_msgpack = True
+            await self.accept(MSGPACK_SUBPROTOCOL)
+        else:
+            await self.accept()
+    
+    def decode_frames(self, text_data=None, bytes_data=None):
+        """Incoming frame as a list of events; clients may batch too. Non-map items are dropped."""
+        if bytes_data is not None:
+            data = msgpack.unpackb(bytes_data, raw=False)
+        else:
+            data = json.loads(text_data)
+        events = data if isinstance(data, list) else [data]
+        return [event for event in events if isinstance(event, dict)]
+    
+    async def send_payload(self, payload):
+        if not self.use_msgpack:
+            await self.send(text_data=json.dumps(payload))
+            return
+        
+        loop = asyncio.get_running_loop()
+        window = settings.CHAT_BATCH_WINDOW_MS / 1000
+        if self._outbox or loop.time() - self._last_sent < window:
+            self._outbox.append(payload)
+            if self._flush_handle is None:
+                self._flush_handle = loop.call_later(window, self._schedule_flush)
+            return
+        
+        self._last_sent = loop.time()
+        await self.send(bytes_data=msgpack.packb(payload))
+    
+    def _schedule_flush(self):
+        # Held so the task isn't collected mid-send
+        self._flush_task = asyncio.ensure_future(self._timed_flush())
+    
+    async def _timed_flush(self):
+        try:
+            await self.flush_outbox()
+        except Exception:
+            # Nobody awaits this task; the socket can't be trusted after a failed send
+            logger.exception('Could not flush chat socket outbox')
+            try:
+                await self.close()
+            except Exception:
+                pass  # Already gone
+        finally:
+            self._flush_task = None
+    
+    async def flush_outbox(self):
+        self._flush_handle = None
+        if not self._outbox:
+            return
+        
+        batch, self._outbox = self._outbox, []
+        self._last_sent = asyncio.get_running_loop().time()
+        await self.send(bytes_data=msgpack.packb(batch if len(batch) > 1 else batch[0]))
+    
+    async def close_protocol(self):
+        if getattr(self, '_flush_handle', None):
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        task = getattr(self, '_flush_task', None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
@@ -0,0 +1,22 @@
+import asyncio
+
+from django.conf import settings
+from redis import asyncio as aioredis
+
+from core.metrics import InstrumentedAsyncConnection
+
+_clients = {}
+
+def get_redis():
+    """
+    Async Redis client for the running event loop.
+    
+    redis.asyncio connections are bound to the loop that created them, so
+    one client is kept per loop rather than one per process.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = aioredis.from_url(settings.REDIS_URL, connection_class=InstrumentedAsyncConnection)
+        _clients[loop] = client
+    return client
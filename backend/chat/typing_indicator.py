@@ -0,0 +1,81 @@
+import asyncio
+
+class TypingDebouncer:
+    """
+    Per-connection typing state that only publishes changes.
+    
+    Repeated "typing" events while already typing are dropped, changes are
+    published at most once every `min_interval` seconds (the latest state
+    wins), and a "stopped" is published automatically after `idle_timeout`
+    seconds without a typing event.
+    """
+    
+    def __init__(self, publish, min_interval, idle_timeout):
+        self.publish = publish
+        self.min_interval = min_interval
+        self.idle_timeout = idle_timeout
+        self.state = False
+        self.sent_state = False
+        self.last_sent = float('-inf')
+        self.received = 0
+        self.published = 0
+        self._flush_task = None
+        self._idle_task = None
+    
+    async def update(self, is_typing):
+        self.received += 1
+        self.state = bool(is_typing)
+        
+        self._cancel_idle()
+        if self.state:
+            self._idle_task = asyncio.ensure_future(self._stop_when_idle())
+        
+        await self._maybe_publish()
+    
+    def reset(self):
+        """Forget typing state without publishing, e.g. once a message was sent"""
+        self._cancel_idle()
+        self.state = self.sent_state = False
+    
+    async def close(self):
+        self._cancel_idle()
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self.sent_state:
+            self.state = False
+            await self._publish()
+    
+    async def _maybe_publish(self):
+        if self.state == self.sent_state:
+            return
+        
+        wait = self.min_interval - (asyncio.get_running_loop().time() - self.last_sent)
+        if wait > 0:
+            if self._flush_task is None:
+                self._flush_task = asyncio.ensure_future(self._publish_later(wait))
+            return
+        
+        await self._publish()
+    
+    async def _publish(self):
+        self.sent_state = self.state
+        self.last_sent = asyncio.get_running_loop().time()
+        self.published += 1
+        await self.publish(self.state)
+    
+    async def _publish_later(self, wait):
+        await asyncio.sleep(wait)
+        self._flush_task = None
+        await self._maybe_publish()
+    
+    async def _stop_when_idle(self):
+        await asyncio.sleep(self.idle_timeout)
+        self._idle_task = None
+        self.state = False
+        await self._maybe_publish()
+    
+    def _cancel_idle(self):
+        if self._idle_task:
+            self._idle_task.cancel()
+            self._idle_task = None
@@ -0,0 +1,7 @@
+from rest_framework.routers import SimpleRouter
+from core.views import ChatViewSet
+
+router = SimpleRouter()
+router.register('', ChatViewSet, basename='chat')
+
+urlpatterns = router.urls
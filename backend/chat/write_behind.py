@@ -0,0 +1,179 @@
+import logging
+import uuid
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import ChatRoom, Message
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'chat:messages'
+GROUP = 'message-flushers'
+
+async def queue_message(room_id, sender_id, receiver_id, unread_field, content, message_type):
+    """
+    Assign the message its ID and timestamp and append it to the durable
+    stream. Returns the fields the consumer broadcasts.
+    """
+    message = {
+        'id': str(uuid.uuid4()),
+        'room_id': str(room_id),
+        'sender_id': str(sender_id),
+        'receiver_id': str(receiver_id),
+        'unread_field': unread_field,
+        'content': content,
+        'message_type': message_type,
+        'created_at': timezone.now().isoformat(),
+    }
+    await get_redis().xadd(STREAM_KEY, message)
+    return message
+
+class MessageFlusher:
+    """
+    Drains the message stream into core_message with bulk_create.
+    
+    Entries are acknowledged only after their batch commits. Anything a
+    crashed flusher read but never acknowledged stays pending in the
+    consumer group and is claimed again on the next start, and rows that
+    already made it to Postgres are skipped so replays never double count
+    unread messages.
+    """
+    
+    def __init__(self, redis, consumer_name, batch_size=500, block_ms=1000):
+        self.redis = redis
+        self.consumer_name = consumer_name
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+    
+    def ensure_group(self):
+        try:
+            self.redis.xgroup_create(STREAM_KEY, GROUP, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+    
+    def recover(self, min_idle_ms=30000):
+        """Flush entries left pending by this or any dead consumer"""
+        flushed = 0
+        # Our own pending entries first, from a previous run under this name
+        while True:
+            entries = self._read('0')
+            if not entries:
+                break
+            flushed += self.flush(entries)
+        
+        start = '0-0'
+        while True:
+            start, entries, *_ = self.redis.xautoclaim(
+                STREAM_KEY, GROUP, self.consumer_name,
+                min_idle_time=min_idle_ms, start_id=start, count=self.batch_size
+            )
+            if entries:
+                flushed += self.flush(entries)
+            if start in (b'0-0', '0-0'):
+                break
+        return flushed
+    
+    def poll(self):
+        entries = self._read('>', block=self.block_ms)
+        return self.flush(entries) if entries else 0
+    
+    def _read(self, entry_id, block=None):
+        response = self.redis.xreadgroup(
+            GROUP, self.consumer_name, {STREAM_KEY: entry_id},
+            count=self.batch_size, block=block
+        )
+        return response[0][1] if response else []
+    
+    def flush(self, entries):
+        messages = []
+        for entry_id, fields in entries:
+            if not fields:
+                # Already trimmed from the stream; nothing left to write
+                continue
+            data = {k.decode(): v.decode() for k, v in fields.items()}
+            messages.append(data)
+        
+        with transaction.atomic():
+            existing = Message.objects.filter(id__in=[m['id'] for m in messages])
+            if messages:
+                # The created_at bound lets Postgres skip older month partitions
+                existing = existing.filter(
+                    created_at__gte=min(parse_datetime(m['created_at']) for m in messages)
+                )
+            existing = set(existing.values_list('id', flat=True))
+            # Rooms deleted since the message was queued would fail the whole
+            # batch. Locked so read watermarks cannot move while rows go in.
+            watermarks = {
+                room['id']: room
+                for room in ChatRoom.objects.select_for_update().filter(
+                    id__in={m['room_id'] for m in messages}
+                ).order_by('id').values('id', 'last_read_at_user1', 'last_read_at_user2')
+            }
+            new = [
+                m for m in messages
+                if uuid.UUID(m['id']) not in existing and uuid.UUID(m['room_id']) in watermarks
+            ]
+            
+            # A read receipt may already have covered a message still in the stream
+            now = timezone.now()
+            for m in new:
+                watermark = watermarks[uuid.UUID(m['room_id'])][
+                    m['unread_field'].replace('unread_count', 'last_read_at')
+                ]
+                m['is_read'] = watermark is not None and parse_datetime(m['created_at']) <= watermark
+            
+            # Stream order is arrival order, so rows go in per-room order
+            Message.objects.bulk_create([
+                Message(
+                    id=m['id'],
+                    room_id=m['room_id'],
+                    sender_id=m['sender_id'],
+                    receiver_id=m['receiver_id'],
+                    content=m['content'],
+                    message_type=m['message_type'],
+                    created_at=parse_datetime(m['created_at']),
+                    is_read=m['is_read'],
+                    read_at=now if m['is_read'] else None,
+                )
+                for m in new
+            ])
+            self._update_rooms(new)
+        
+        entry_ids = [entry_id for entry_id, _ in entries]
+        if entry_ids:
+            self.redis.xack(STREAM_KEY, GROUP, *entry_ids)
+            self.redis.xdel(STREAM_KEY, *entry_ids)
+        return len(new)
+    
+    def _update_rooms(self, messages):
+        rooms = {}
+        for m in messages:
+            room = rooms.setdefault(m['room_id'], {'latest': m, 'unread': {}})
+            if m['created_at'] >= room['latest']['created_at']:
+                room['latest'] = m
+            if not m['is_read']:
+                unread = room['unread']
+                unread[m['unread_field']] = unread.get(m['unread_field'], 0) + 1
+        
+        for room_id, room in rooms.items():
+            latest = room['latest']
+            latest_time = parse_datetime(latest['created_at'])
+            # Another flusher may already have written a newer message
+            is_newer = Q(last_message_time__isnull=True) | Q(last_message_time__lte=latest_time)
+            ChatRoom.objects.filter(id=room_id).update(
+                last_message=Case(
+                    When(is_newer, then=Value(latest['content'][:100])),
+                    default=F('last_message'),
+                ),
+                last_message_time=Case(
+                    When(is_newer, then=Value(latest_time)),
+                    default=F('last_message_time'),
+                ),
+                updated_at=timezone.now(),
+                **{field: F(field) + count for field, count in room['unread'].items()}
+            )
@@ -1,16 +1,33 @@
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+# Set up Django before the chat routing imports models
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
+from chat.draining import DrainingMiddleware
 from chat.routing import websocket_urlpatterns
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
-
-application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+websocket_app = DrainingMiddleware(
+    AuthMiddlewareStack(
         URLRouter(
             websocket_urlpatterns
         )
-    ),
+    )
+)
+
+# Split deployment (docker-compose.split.yml): the HTTP and WebSocket tiers
+# run these in separate gunicorn pools, sharing the channel layer
+http_application = django_asgi_app
+websocket_application = ProtocolTypeRouter({
+    "websocket": websocket_app,
+})
+
+# Single process serving both
+application = ProtocolTypeRouter({
+    "http": django_asgi_app,
+    "websocket": websocket_app,
 })
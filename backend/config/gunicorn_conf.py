@@ -0,0 +1,40 @@
+"""
+gunicorn settings shared by both tiers of the split deployment:
+  
+  HTTP:       gunicorn -c config/gunicorn_conf.py -k config.workers.HttpWorker config.asgi:http_application
+  WebSocket:  gunicorn -c config/gunicorn_conf.py -k config.workers.WebSocketWorker config.asgi:websocket_application
+
+`kill -HUP <master>` restarts workers without dropping traffic: new workers
+start, old HTTP workers finish in-flight requests and old WebSocket
+workers close their sockets over CHAT_DRAIN_SECONDS before exiting.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+# One event loop per core by default
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+# Must exceed CHAT_DRAIN_SECONDS on the WebSocket tier
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+timeout = 60
+keepalive = 5
+# Recycling bounds memory growth on the HTTP tier; leave 0 for WebSockets,
+# where every connection counts as a request
+max_requests = int(os.environ.get('MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+forwarded_allow_ips = '*'
+accesslog = os.environ.get('ACCESS_LOG') or None
+
+def on_starting(server):
+    # Stale per-process files would be aggregated into /metrics (core/metrics.py)
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        
+        multiprocess.mark_process_dead(worker.pid)
@@ -42,12 +42,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    # Compresses for clients sending Accept-Encoding: gzip; outside everything
+    # else that reads or writes the body
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,6 +79,12 @@ WSGI_APPLICATION = 'config.wsgi.application'
 ASGI_APPLICATION = 'config.asgi.application'
 
 # Database
+# Pooling is done by PgBouncer in transaction mode (database/pgbouncer.ini):
+# point DB_HOST/DB_PORT at it and set DB_PGBOUNCER=True, which turns off
+# server-side cursors as transaction pooling requires. DB_CONN_MAX_AGE keeps
+# connections open between requests; use it for WSGI workers and leave it 0
+# under Daphne, where each request runs in its own thread and a persistent
+# connection would outlive it.
 DATABASES = {
     'default': {
         'ENGINE': 'django.contrib.gis.db.backends.postgis',
@@ -82,9 +93,29 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': config('DB_PGBOUNCER', default=False, cast=bool),
     }
 }
 
+# Read replicas, as host[:port] in DB_REPLICA_HOSTS (same name and credentials).
+# Safe HTTP requests read from one of them (core/db_router.py); a user's reads
+# go to the primary for REPLICA_STICKY_SECONDS after each of their writes.
+for index, replica in enumerate(
+    host.strip() for host in config('DB_REPLICA_HOSTS', default='').split(',') if host.strip()
+):
+    replica_host, _, replica_port = replica.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -142,8 +173,23 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'core.token_blacklist.TokenRefreshSerializer',
 }
 
+# Revoked refresh tokens live in Redis (see core/token_blacklist.py) instead of
+# the simplejwt token_blacklist tables. Existing rows can be moved over with
+# `python manage.py migrate_token_blacklist --purge`.
+JWT_BLACKLIST = {
+    'BLOOM_CAPACITY': config('JWT_BLACKLIST_BLOOM_CAPACITY', default=100000, cast=int),
+    'BLOOM_ERROR_RATE': 0.001,
+    'SYNC_INTERVAL': config('JWT_BLACKLIST_SYNC_INTERVAL', default=1.0, cast=float),
+    'REBUILD_INTERVAL': 3600,
+}
+
+# Serve GET /api/services/, /api/services/nearby/ and /api/services/<id>/
+# from the native async views in core/async_views.py under ASGI.
+ASYNC_SERVICE_VIEWS = config('ASYNC_SERVICE_VIEWS', default=True, cast=bool)
+
 # Redis & Channels configuration
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 
@@ -153,27 +199,125 @@ CACHES = {
         'LOCATION': REDIS_URL,
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # Counts Redis round-trips for core.metrics
+            'CONNECTION_POOL_CLASS': 'core.metrics.InstrumentedConnectionPool',
         }
     }
 }
 
+# Metrics (core/metrics.py): /metrics needs `Authorization: Bearer <token>`
+# with METRICS_TOKEN, and is refused while it is unset unless DEBUG is on.
+# Requests slower than SLOW_REQUEST_SECONDS (0 disables) are logged with
+# their slowest SQL.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+SLOW_REQUEST_SECONDS = config('SLOW_REQUEST_SECONDS', default=1.0, cast=float)
+SLOW_REQUEST_MAX_STATEMENTS = 200  # SQL kept per request for the slow log
+
 # Channels configuration
+# Groups and channels are spread over every URL in REDIS_CHANNEL_HOSTS by a
+# consistent hash ring; after adding hosts run `manage.py rebalance_channel_layer`
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': 'chat.layers.ConsistentHashChannelLayer',
         'CONFIG': {
-            'hosts': [(config('REDIS_HOST', default='localhost'), 
-                      config('REDIS_PORT', default=6379, cast=int))],
+            'hosts': config(
+                'REDIS_CHANNEL_HOSTS',
+                default=f"redis://{config('REDIS_HOST', default='localhost')}:{config('REDIS_PORT', default=6379, cast=int)}",
+                cast=lambda v: [host.strip() for host in v.split(',') if host.strip()]
+            ),
         },
     },
 }
 
+# WebSocket workers being restarted close their sockets gradually over this
+# many seconds (chat/draining.py); keep it below gunicorn's GRACEFUL_TIMEOUT
+CHAT_DRAIN_SECONDS = config('CHAT_DRAIN_SECONDS', default=20, cast=float)
+
+# Write-behind chat persistence: messages are broadcast once they are in a
+# Redis stream and `manage.py flush_chat_messages` batches them into Postgres
+CHAT_WRITE_BEHIND = config('CHAT_WRITE_BEHIND', default=False, cast=bool)
+
+# Typing indicators: minimum seconds between broadcasts per connection, and
+# seconds without a typing event after which "stopped typing" is sent
+CHAT_TYPING_MIN_INTERVAL = config('CHAT_TYPING_MIN_INTERVAL', default=1.0, cast=float)
+CHAT_TYPING_IDLE_TIMEOUT = config('CHAT_TYPING_IDLE_TIMEOUT', default=5.0, cast=float)
+
+# Chat history: page size, and how many of a room's newest messages are kept
+# in Redis (until CHAT_HISTORY_HOT_TTL seconds after the room's last message)
+CHAT_HISTORY_PAGE_SIZE = 30
+CHAT_HISTORY_HOT_WINDOW = config('CHAT_HISTORY_HOT_WINDOW', default=50, cast=int)
+CHAT_HISTORY_HOT_TTL = 60 * 60 * 24
+
+# Sockets on the aangan.msgpack subprotocol coalesce outgoing events sent
+# within this many milliseconds of each other into one frame
+CHAT_BATCH_WINDOW_MS = config('CHAT_BATCH_WINDOW_MS', default=5, cast=int)
+
+# Chat inbox snapshots cached per user (chat/inbox.py)
+CHAT_INBOX_PAGE_SIZE = 20
+CHAT_INBOX_TTL = 60 * 60 * 24
+
+# Presence: a ws/user/ socket counts as online for this many seconds after
+# its last heartbeat (clients heartbeat roughly every 25 seconds)
+CHAT_PRESENCE_TTL = config('CHAT_PRESENCE_TTL', default=60, cast=int)
+
+# Pincode announcements: each sender may post CHAT_ANNOUNCEMENT_RATE_LIMIT per
+# CHAT_ANNOUNCEMENT_RATE_WINDOW seconds; the newest CHAT_ANNOUNCEMENT_BACKLOG
+# per pincode stay in Redis for clients catching up
+CHAT_ANNOUNCEMENT_RATE_LIMIT = config('CHAT_ANNOUNCEMENT_RATE_LIMIT', default=5, cast=int)
+CHAT_ANNOUNCEMENT_RATE_WINDOW = config('CHAT_ANNOUNCEMENT_RATE_WINDOW', default=3600, cast=int)
+CHAT_ANNOUNCEMENT_BACKLOG = config('CHAT_ANNOUNCEMENT_BACKLOG', default=100, cast=int)
+CHAT_ANNOUNCEMENT_TTL = config('CHAT_ANNOUNCEMENT_TTL', default=7 * 24 * 3600, cast=int)
+
+# core_message is partitioned by month; `manage.py archive_messages` moves
+# partitions older than this many months into gzipped JSONL files under
+# CHAT_ARCHIVE_ROOT, and history reads fall back to them
+CHAT_ARCHIVE_AFTER_MONTHS = config('CHAT_ARCHIVE_AFTER_MONTHS', default=12, cast=int)
+CHAT_ARCHIVE_ROOT = config('CHAT_ARCHIVE_ROOT', default=str(BASE_DIR / 'archive'))
+
 # Custom user model
 AUTH_USER_MODEL = 'core.User'
 
 # Razorpay settings
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='')
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='')
+RAZORPAY_API_URL = config('RAZORPAY_API_URL', default='https://api.razorpay.com/v1')
+RAZORPAY_WEBHOOK_SECRET = config('RAZORPAY_WEBHOOK_SECRET', default='')
+# Webhook event ids applied within this window are ignored when redelivered
+RAZORPAY_WEBHOOK_DEDUPE_TTL = config('RAZORPAY_WEBHOOK_DEDUPE_TTL', default=7 * 24 * 3600, cast=int)
+
+# Gateway client (payments.gateway): pooled keep-alive connections, explicit
+# timeouts in seconds, jittered retries and a circuit breaker that fails fast
+# after RAZORPAY_BREAKER_THRESHOLD consecutive failures for RAZORPAY_BREAKER_RESET seconds
+RAZORPAY_CONNECT_TIMEOUT = config('RAZORPAY_CONNECT_TIMEOUT', default=3.0, cast=float)
+RAZORPAY_READ_TIMEOUT = config('RAZORPAY_READ_TIMEOUT', default=10.0, cast=float)
+RAZORPAY_POOL_SIZE = config('RAZORPAY_POOL_SIZE', default=20, cast=int)
+RAZORPAY_MAX_RETRIES = config('RAZORPAY_MAX_RETRIES', default=2, cast=int)
+RAZORPAY_BACKOFF_BASE = config('RAZORPAY_BACKOFF_BASE', default=0.2, cast=float)
+RAZORPAY_BACKOFF_MAX = config('RAZORPAY_BACKOFF_MAX', default=2.0, cast=float)
+RAZORPAY_BREAKER_THRESHOLD = config('RAZORPAY_BREAKER_THRESHOLD', default=5, cast=int)
+RAZORPAY_BREAKER_RESET = config('RAZORPAY_BREAKER_RESET', default=30.0, cast=float)
+
+# Idempotency-Key responses for create-order/refund are kept this long; a
+# booking's payment requests are serialized by a lock held up to
+# PAYMENT_LOCK_TIMEOUT seconds, and waiters give up after PAYMENT_LOCK_WAIT
+PAYMENT_IDEMPOTENCY_TTL = config('PAYMENT_IDEMPOTENCY_TTL', default=24 * 3600, cast=int)
+PAYMENT_LOCK_TIMEOUT = config('PAYMENT_LOCK_TIMEOUT', default=60, cast=int)
+PAYMENT_LOCK_WAIT = config('PAYMENT_LOCK_WAIT', default=10, cast=int)
+
+# Identity verification pipeline (core/verification.py)
+VERIFICATION_WORKER_PROCESSES = config('VERIFICATION_WORKER_PROCESSES', default=2, cast=int)
+VERIFICATION_MAX_SIDE = 1600  # Longest side of the normalized derivative
+VERIFICATION_MIN_SIDE = 600  # Smallest acceptable side of the original upload
+VERIFICATION_MIN_SHARPNESS = 100.0  # Edge variance below this is treated as blurry
+VERIFICATION_CHECKS = [
+    'core.verification.image_quality',
+    'core.verification.duplicate_hash',
+]
+
+# Listing image derivatives (core/images.py). Images failing IMAGE_WORKER_MAX_ATTEMPTS
+# times are moved to the images:dead list
+IMAGE_WORKER_PROCESSES = config('IMAGE_WORKER_PROCESSES', default=2, cast=int)
+IMAGE_WORKER_MAX_ATTEMPTS = config('IMAGE_WORKER_MAX_ATTEMPTS', default=3, cast=int)
 
 # Geo settings
 MAX_DISTANCE_KM = 1.5  # Hyper-local radius
@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenRefreshView
+from core.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,7 +13,13 @@ urlpatterns = [
     path('api/chat/', include('chat.urls')),
     path('api/payments/', include('payments.urls')),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
+# Async list/nearby/retrieve (core/async_views.py); other methods still
+# reach ServiceViewSet through them
+if settings.ASYNC_SERVICE_VIEWS:
+    urlpatterns.insert(1, path('api/services/', include('core.urls.async_services')))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,56 @@
+"""
+gunicorn worker classes for the split deployment (config/gunicorn_conf.py).
+"""
+import asyncio
+import signal
+import sys
+
+from gunicorn.arbiter import Arbiter
+from uvicorn import Server
+from uvicorn.workers import UvicornWorker
+
+class HttpWorker(UvicornWorker):
+    """REST API worker; on SIGTERM it stops accepting and finishes in-flight requests"""
+    
+    CONFIG_KWARGS = {'loop': 'uvloop', 'http': 'httptools', 'lifespan': 'off'}
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = self.cfg.graceful_timeout
+
+class DrainingServer(Server):
+    """
+    uvicorn server that answers the first SIGTERM by closing its listening
+    sockets and draining WebSockets (chat/draining.py), then exits. A
+    second signal, or SIGINT, exits at once.
+    """
+    
+    drain_task = None
+    
+    def handle_exit(self, sig, frame):
+        if sig == signal.SIGTERM and self.started and self.drain_task is None:
+            self.drain_task = asyncio.get_event_loop().create_task(self.drain())
+            return
+        super().handle_exit(sig, frame)
+    
+    async def drain(self):
+        from chat.draining import drain
+        
+        for server in self.servers:
+            server.close()
+        await drain()
+        self.should_exit = True
+
+class WebSocketWorker(UvicornWorker):
+    """Chat socket worker; drains its connections gradually on SIGTERM"""
+    
+    CONFIG_KWARGS = {'loop': 'uvloop', 'http': 'httptools', 'ws': 'websockets', 'lifespan': 'off'}
+    
+    async def _serve(self):
+        # UvicornWorker._serve with DrainingServer in place of Server
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
@@ -0,0 +1,178 @@
+"""
+Native async versions of the ServiceViewSet read paths: list, retrieve
+and nearby.
+
+DRF 3.14 views are sync only, so under ASGI each request holds a thread
+of the sync_to_async pool for its whole duration. These are plain Django
+async views: the JWT is checked in the event loop, rows and image assets
+are loaded with the async ORM, and ServiceSerializer runs only once
+everything is in memory, so it makes no queries. Responses match the
+viewset's (same serializer, renderer and page format). Other methods on
+the same URLs are handed to the sync viewset.
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .conditional import avalidators, not_modified, set_validators
+from .images import is_image_hash
+from .models import ImageAsset, User
+from .serializers import ServiceSerializer
+from .views import ServiceViewSet, nearby_queryset, service_queryset
+
+_renderer = JSONRenderer()
+_jwt = JWTAuthentication()
+_sync_list = ServiceViewSet.as_view({'get': 'list', 'post': 'create'})
+_sync_detail = ServiceViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+})
+
+def _json(data, status=200, headers=None):
+    return HttpResponse(
+        _renderer.render(data), status=status, headers=headers, content_type='application/json'
+    )
+
+def _error(detail, status):
+    # Same body and challenge header as DRF's exception handler
+    data = detail if isinstance(detail, dict) else {'detail': detail}
+    headers = {'WWW-Authenticate': 'Bearer realm="api"'} if status == 401 else None
+    return _json(data, status, headers)
+
+async def authenticate(request):
+    """The JWT user, or None without credentials; raises AuthenticationFailed like DRF"""
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    
+    token = _jwt.get_validated_token(raw_token)  # Signature and expiry only, no I/O
+    try:
+        user_id = token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken('Token contained no recognizable user identification')
+    
+    user = await User.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).afirst()
+    if user is None:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    if not user.is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    return user
+
+async def load(queryset):
+    """Rows with provider, category and image assets, ready for the serializer"""
+    services = [s async for s in queryset.select_related('provider', 'category')]
+    hashes = {h for service in services for h in service.images if is_image_hash(h)}
+    # Hashes without an asset map to None so the serializer doesn't look them up again
+    assets = dict.fromkeys(hashes)
+    if hashes:
+        assets.update(await ImageAsset.objects.ain_bulk(list(hashes)))
+    return services, assets
+
+def serialize(request, services, assets, variant, many=True):
+    context = {'request': request, 'image_variant': variant, 'image_assets': assets}
+    return ServiceSerializer(services if many else services[0], many=many, context=context).data
+
+async def paginate(request, queryset):
+    """PageNumberPagination's page and envelope, with async count and fetch"""
+    page_size = drf_settings.PAGE_SIZE
+    count = await queryset.acount()
+    page_number = request.GET.get('page', 1)
+    if page_number in PageNumberPagination.last_page_strings:
+        page = max(1, math.ceil(count / page_size))
+    else:
+        try:
+            page = int(page_number)
+        except ValueError:
+            page = 0
+    offset = (page - 1) * page_size
+    if page < 1 or (offset >= count and page != 1):
+        return None
+    
+    services, assets = await load(queryset[offset:offset + page_size])
+    url = request.build_absolute_uri()
+    if page == 2:
+        previous = remove_query_param(url, 'page')
+    else:
+        previous = replace_query_param(url, 'page', page - 1) if page > 1 else None
+    return {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if offset + page_size < count else None,
+        'previous': previous,
+        'results': serialize(request, services, assets, 'card'),
+    }
+
+async def conditional(request, user, queryset, render):
+    """Answer a conditional GET from `queryset`'s validators, else await render() and tag it"""
+    etag, last_modified = await avalidators(request, user, queryset, related=['provider'])
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = await render()
+    return set_validators(response, etag, last_modified)
+
+def async_api_view(sync_view=None):
+    """
+    Runs the async view for GET and HEAD with an authenticated user, hands
+    any other method to `sync_view`, and turns auth failures into DRF-style
+    401 responses.
+    """
+    def decorator(view):
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                if sync_view is None:
+                    return _error(f'Method "{request.method}" not allowed.', 405)
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            
+            try:
+                user = await authenticate(request)
+            except AuthenticationFailed as e:  # InvalidToken included
+                return _error(e.detail, 401)
+            if user is None:
+                return _error('Authentication credentials were not provided.', 401)
+            return await view(request, user, *args, **kwargs)
+        
+        # CsrfViewMiddleware looks for this; DRF views set it too
+        wrapper.csrf_exempt = True
+        wrapper.__name__ = view.__name__
+        return wrapper
+    return decorator
+
+@async_api_view(_sync_list)
+async def service_list(request, user):
+    queryset = service_queryset(user, request.GET)
+    
+    async def render():
+        data = await paginate(request, queryset)
+        return _json(data) if data is not None else _error('Invalid page.', 404)
+    return await conditional(request, user, queryset, render)
+
+@async_api_view(_sync_detail)
+async def service_detail(request, user, pk):
+    queryset = service_queryset(user, request.GET).filter(pk=pk)
+    
+    async def render():
+        services, assets = await load(queryset[:1])
+        if not services:
+            return _error('Not found.', 404)
+        return _json(serialize(request, services, assets, 'full', many=False))
+    return await conditional(request, user, queryset, render)
+
+@async_api_view()
+async def service_nearby(request, user):
+    if not user.location:
+        return _json({'error': 'User location not set'}, 400)
+    
+    queryset = nearby_queryset(user.location)
+    
+    async def render():
+        data = await paginate(request, queryset)
+        return _json(data) if data is not None else _error('Invalid page.', 404)
+    return await conditional(request, user, queryset, render)
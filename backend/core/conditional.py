@@ -0,0 +1,86 @@
+"""
+Conditional GET (ETag / Last-Modified) for read endpoints.
+
+Validators describe the rows a response is built from rather than its
+body: the row count and newest updated_at of the query scope, plus the
+newest updated_at of related rows the serializer nests and of the
+requesting user (whose location drives distances). One aggregate query
+answers If-None-Match / If-Modified-Since with a 304 before anything is
+serialized. Hard deletes only change the count, so they show in the ETag
+but not in Last-Modified; clients sending both are answered by the ETag.
+"""
+import hashlib
+from functools import wraps
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+def _aggregates(related):
+    aggregates = {'count': Count('pk'), 'updated_at': Max('updated_at')}
+    for name in related:
+        aggregates[f'{name}_updated_at'] = Max(f'{name}__updated_at')
+    return aggregates
+
+def _validators(request, user, state):
+    timestamps = [value for key, value in state.items() if key != 'count' and value is not None]
+    timestamps.append(user.updated_at)
+    parts = [request.get_host(), request.get_full_path(), user.pk]
+    parts.extend(state[key] for key in sorted(state))
+    parts.append(user.updated_at)
+    etag = quote_etag(hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest())
+    return etag, int(max(timestamps).timestamp())
+
+def validators(request, user, queryset, related=()):
+    """(ETag, Last-Modified timestamp) for a response built from `queryset` for `user`"""
+    return _validators(request, user, queryset.order_by().aggregate(**_aggregates(related)))
+
+async def avalidators(request, user, queryset, related=()):
+    return _validators(request, user, await queryset.order_by().aaggregate(**_aggregates(related)))
+
+def not_modified(request, etag, last_modified):
+    """A 304 (or 412) response if the request's preconditions settle it, else None"""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+def set_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+        # Responses are per user; browsers may keep them but must revalidate
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def detail_scope(view):
+    """The queryset of the object a detail action would look up, or None for a malformed key"""
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    try:
+        return view.filter_queryset(view.get_queryset()).filter(
+            **{view.lookup_field: view.kwargs[lookup_url_kwarg]}
+        )
+    except (TypeError, ValueError, ValidationError):
+        return None
+
+def conditional(scope=None, related=()):
+    """
+    Viewset action decorator adding ETag and Last-Modified and answering
+    conditional GETs from `scope(view)`, the queryset the action reads
+    (default: the filtered queryset). A None scope skips the check.
+    """
+    def decorator(action):
+        @wraps(action)
+        def wrapper(self, request, *args, **kwargs):
+            queryset = scope(self) if scope else self.filter_queryset(self.get_queryset())
+            if queryset is None or request.method not in ('GET', 'HEAD'):
+                return action(self, request, *args, **kwargs)
+            
+            etag, last_modified = validators(request, request.user, queryset, related)
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+            return set_validators(action(self, request, *args, **kwargs), etag, last_modified)
+        return wrapper
+    return decorator
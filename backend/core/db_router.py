@@ -0,0 +1,172 @@
+"""
+Read-replica routing. HTTP requests with a safe method (the read-only
+viewset actions) read from one replica_* database for the whole request;
+writes, transactions, socket consumers and management commands always
+use the primary. After a user's own write, their reads stay on the
+primary for REPLICA_STICKY_SECONDS so they never see replication lag.
+"""
+import base64
+import binascii
+import contextvars
+import json
+import logging
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework_simplejwt.settings import api_settings
+
+from chat.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+STICKY_KEY = 'db:sticky:{user_id}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Replica alias reads may use in the current context, None for the primary
+_read_alias = contextvars.ContextVar('db_read_alias', default=None)
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, e.g. right before a dependent write"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+# Without Redis a user can't be known not to be sticky, so reads go to the
+# primary; a failed mark only loses stickiness, the write already happened
+
+def mark_sticky(redis, user_id):
+    try:
+        redis.set(STICKY_KEY.format(user_id=user_id), 1, ex=settings.REPLICA_STICKY_SECONDS)
+    except RedisError:
+        logger.warning('Could not mark user %s sticky', user_id, exc_info=True)
+
+def is_sticky(redis, user_id):
+    try:
+        return bool(redis.exists(STICKY_KEY.format(user_id=user_id)))
+    except RedisError:
+        return True
+
+async def amark_sticky(user_id):
+    try:
+        await get_redis().set(STICKY_KEY.format(user_id=user_id), 1, ex=settings.REPLICA_STICKY_SECONDS)
+    except RedisError:
+        logger.warning('Could not mark user %s sticky', user_id, exc_info=True)
+
+async def ais_sticky(user_id):
+    try:
+        return bool(await get_redis().exists(STICKY_KEY.format(user_id=user_id)))
+    except RedisError:
+        return True
+
+def token_user_id(request):
+    """
+    The user named by the request's JWT, read without verifying it: it
+    only picks a database, authentication still checks the token.
+    """
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        payload = header[7:].split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return claims.get(api_settings.USER_ID_CLAIM)
+    except (IndexError, ValueError, binascii.Error, AttributeError):
+        return None
+
+def request_user_id(request):
+    """The user a request acts for: the JWT's, else the session's"""
+    if request.headers.get('Authorization', '').startswith('Bearer '):
+        return token_user_id(request)
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # Reads inside a transaction must see its writes
+        if alias is None or connections['default'].in_atomic_block:
+            return 'default'
+        return alias
+    
+    def db_for_write(self, model, **hints):
+        return 'default'
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so every object is related-compatible
+        return True
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+class ReplicaRoutingMiddleware:
+    """
+    Sends reads of safe requests to a replica unless the user is sticky,
+    and makes the user sticky after any unsafe request. Must come after
+    AuthenticationMiddleware so session users are seen too. On the async
+    path (core/async_views.py) only JWT users are seen, since loading the
+    session user would block the event loop.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.replicas = replica_aliases()
+        if not self.replicas:
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        redis = get_redis_connection('default')
+        user_id = request_user_id(request)
+        
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            if user_id is not None:
+                mark_sticky(redis, user_id)
+            return response
+        
+        if user_id is not None and is_sticky(redis, user_id):
+            return self.get_response(request)
+        
+        # One replica per request, so its reads see a single point in time
+        token = _read_alias.set(random.choice(self.replicas))
+        try:
+            return self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+    
+    async def __acall__(self, request):
+        user_id = token_user_id(request)
+        
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            if user_id is not None:
+                await amark_sticky(user_id)
+            return response
+        
+        if user_id is not None and await ais_sticky(user_id):
+            return await self.get_response(request)
+        
+        # The async ORM copies this context into the thread running each query
+        token = _read_alias.set(random.choice(self.replicas))
+        try:
+            return await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
@@ -0,0 +1,98 @@
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django_redis import get_redis_connection
+from PIL import Image, ImageOps
+
+from .models import ImageAsset
+from .uploads import content_name, file_sha256
+
+QUEUE_KEY = 'images:queue'
+
+# Longest side in pixels for each pre-generated size
+DERIVATIVE_SIZES = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+def store_image(uploaded_file):
+    """
+    Save an upload under its content hash and return its ImageAsset.
+    
+    Repeat uploads of the same bytes reuse the stored original and its
+    derivatives instead of writing or processing anything again.
+    """
+    digest = file_sha256(uploaded_file)
+    asset = ImageAsset.objects.filter(sha256=digest).first()
+    if asset is not None:
+        return asset
+    
+    name = content_name(uploaded_file, 'images/original')
+    if not default_storage.exists(name):
+        name = default_storage.save(name, uploaded_file)
+    
+    asset, created = ImageAsset.objects.get_or_create(
+        sha256=digest,
+        defaults={'original': name},
+    )
+    if created:
+        get_redis_connection('default').lpush(QUEUE_KEY, asset.sha256)
+    return asset
+
+def generate_derivatives(sha256, original):
+    """
+    Render every size/format pair for one image and write it to storage.
+    
+    Runs in a worker process, so it only takes and returns plain values.
+    """
+    with default_storage.open(original, 'rb') as f:
+        image = Image.open(f)
+        size = image.size
+        image.draft('RGB', (max(DERIVATIVE_SIZES.values()),) * 2)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    
+    derivatives = {}
+    # Largest first so each step downsamples the previous, smaller image
+    for variant, side in sorted(DERIVATIVE_SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((side, side), Image.LANCZOS)
+        derivatives[variant] = {}
+        for extension, options in FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, **options)
+            name = f'images/{variant}/{sha256[:2]}/{sha256}.{extension}'
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            derivatives[variant][extension] = default_storage.save(name, ContentFile(buffer.getvalue()))
+    
+    return {'sha256': sha256, 'width': size[0], 'height': size[1], 'derivatives': derivatives}
+
+def image_urls(asset, variant):
+    """
+    URLs for one variant. Until the asset is processed this is the original,
+    under the key of its own format (if webp or jpeg) and always as `original`.
+    """
+    files = asset.derivatives.get(variant) if asset.is_processed else None
+    if not files:
+        url = default_storage.url(asset.original)
+        extension = asset.original.rsplit('.', 1)[-1].lower()
+        return {
+            'id': asset.sha256,
+            'webp': url if extension == 'webp' else None,
+            'jpeg': url if extension in ('jpg', 'jpeg') else None,
+            'original': url,
+        }
+    
+    return {
+        'id': asset.sha256,
+        'webp': default_storage.url(files['webp']),
+        'jpeg': default_storage.url(files['jpeg']),
+    }
+
+def is_image_hash(value):
+    return isinstance(value, str) and len(value) == 64 and '/' not in value
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import User
+from core.synthetic import USERNAME_PREFIX
+from core.token_blacklist import RefreshToken
+from core.views import nearby_queryset
+
+ENDPOINTS = ['list', 'nearby', 'retrieve']
+
+class Command(BaseCommand):
+    help = (
+        'Load a running server\'s service list, nearby and detail endpoints at '
+        'increasing concurrency and report throughput and tail latency. Run it once '
+        'per server setup, e.g. daphne and uvicorn each with ASYNC_SERVICE_VIEWS on '
+        'and off, with a --label for each, then --compare the saved results.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the server')
+        parser.add_argument('--label', required=True, help='Name of this setup, e.g. uvicorn-async')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per level')
+        parser.add_argument('--warmup', type=float, default=2.0, help='Unmeasured seconds per level')
+        parser.add_argument('--users', type=int, default=200,
+                            help='Synthetic users to spread requests over')
+        parser.add_argument('--only', nargs='+', choices=ENDPOINTS)
+        parser.add_argument('--output', help='Results file (default: benchmarks/views-<label>.json)')
+        parser.add_argument('--compare', nargs='+', default=[],
+                            help='Results of other setups to show side by side')
+    
+    def handle(self, *args, **options):
+        self.base_url = options['url'].rstrip('/')
+        self.clients = self.make_clients(options['users'])
+        
+        results = {}
+        for endpoint in options['only'] or ENDPOINTS:
+            results[endpoint] = {}
+            for concurrency in options['concurrency']:
+                result = asyncio.run(self.load(endpoint, concurrency, options['warmup'], options['duration']))
+                results[endpoint][str(concurrency)] = result
+                self.stdout.write(
+                    f"{endpoint:<9} c={concurrency:<4} {result['requests_per_second']:8.1f} req/s  "
+                    f"p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  "
+                    f"{result['errors']} errors"
+                )
+        
+        report = {
+            'label': options['label'],
+            'url': self.base_url,
+            'created_at': timezone.now().isoformat(),
+            'options': {key: options[key] for key in ('concurrency', 'duration', 'warmup', 'users')},
+            'results': results,
+        }
+        output = Path(options['output'] or settings.BASE_DIR / 'benchmarks' / f"views-{options['label']}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(f'Saved {output}')
+        
+        if options['compare']:
+            self.compare([report] + [json.loads(Path(path).read_text()) for path in options['compare']])
+    
+    def make_clients(self, count):
+        """(access token, id of a service the user can see) for synthetic users with a location"""
+        users = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX, location__isnull=False)
+            .order_by('?')[:count]
+        )
+        clients = []
+        for user in users:
+            service_id = nearby_queryset(user.location).values_list('id', flat=True).first()
+            if service_id:
+                clients.append((str(RefreshToken.for_user(user).access_token), service_id))
+        if not clients:
+            raise CommandError(
+                'No synthetic user has a service within 1.5 km; run `manage.py generate_dataset` first'
+            )
+        return clients
+    
+    def path(self, endpoint, service_id):
+        if endpoint == 'list':
+            return '/api/services/'
+        if endpoint == 'nearby':
+            return '/api/services/nearby/'
+        return f'/api/services/{service_id}/'
+    
+    async def load(self, endpoint, concurrency, warmup, duration):
+        """Closed loop: `concurrency` clients each sending their next request as soon as one returns"""
+        import httpx
+        
+        latencies = []
+        errors = 0
+        measuring = False
+        
+        async def worker(client, index):
+            nonlocal errors
+            while True:
+                token, service_id = self.clients[index % len(self.clients)]
+                index += concurrency
+                started = time.perf_counter()
+                try:
+                    response = await client.get(
+                        self.path(endpoint, service_id), headers={'Authorization': f'Bearer {token}'}
+                    )
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if not measuring:
+                    continue
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+        
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=30) as client:
+            workers = [asyncio.create_task(worker(client, i)) for i in range(concurrency)]
+            await asyncio.sleep(warmup)
+            measuring = True
+            await asyncio.sleep(duration)
+            measuring = False
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        if len(latencies) < 2:
+            raise CommandError(f'{endpoint} at concurrency {concurrency}: {errors} errors, no successful requests')
+        quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'requests_per_second': len(latencies) / duration,
+            'p50_ms': quantiles[49] * 1000,
+            'p95_ms': quantiles[94] * 1000,
+            'p99_ms': quantiles[98] * 1000,
+            'max_ms': max(latencies) * 1000,
+        }
+    
+    def compare(self, reports):
+        self.stdout.write('\n' + f"{'':<16}" + ''.join(f"{report['label']:>28}" for report in reports))
+        for endpoint, levels in reports[0]['results'].items():
+            for concurrency in levels:
+                cells = []
+                for report in reports:
+                    result = report['results'].get(endpoint, {}).get(concurrency)
+                    cells.append(
+                        f"{result['requests_per_second']:8.0f}/s p99 {result['p99_ms']:8.1f} ms"
+                        if result else f"{'-':>28}"
+                    )
+                self.stdout.write(f'{endpoint:<9} c={concurrency:<4}' + ''.join(f'{cell:>28}' for cell in cells))
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.gis.measure import D
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from chat.consumers import ChatConsumer
+from core.metrics import track
+from core.models import Booking, ChatRoom, Service
+from core.synthetic import CATALOG, PASSWORD, USERNAME_PREFIX
+from core.views import AuthViewSet, BookingViewSet, ServiceViewSet
+
+User = get_user_model()
+
+BENCHMARKS = ['login', 'nearby', 'search', 'book', 'booking_inbox', 'chat_persist']
+TABLES = ['core_user', 'core_service', 'core_booking', 'core_chatroom', 'core_message']
+
+def git_revision():
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{revision}-dirty' if dirty else revision
+
+def summarize(samples, queries, round_trips):
+    quantiles = statistics.quantiles(samples, n=100, method='inclusive')
+    return {
+        'iterations': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p50_ms': quantiles[49] * 1000,
+        'p95_ms': quantiles[94] * 1000,
+        'p99_ms': quantiles[98] * 1000,
+        'ops_per_second': len(samples) / sum(samples),
+        'queries_per_op': queries / len(samples),
+        'redis_round_trips_per_op': round_trips / len(samples),
+    }
+
+class Command(BaseCommand):
+    help = (
+        'Time login, nearby, search, booking creation, the booking inbox and chat '
+        'message persistence against the synthetic dataset (`manage.py generate_dataset`), '
+        'save the results as JSON and optionally compare them with an earlier run'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200,
+                            help='Per benchmark; login runs a tenth as many (password hashing)')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--only', nargs='+', choices=BENCHMARKS)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Results file (default: benchmarks/<git revision>.json)')
+        parser.add_argument('--compare', help='Earlier results file to compare against')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Relative p50/p95 slowdown reported as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+    
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('--iterations must be at least 2')
+        self.rng = random.Random(options['seed'])
+        self.factory = APIRequestFactory()
+        self.users = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX, location__isnull=False)
+            .order_by('?')[:200]
+        )
+        if not self.users:
+            raise CommandError('No synthetic users found; run `manage.py generate_dataset` first')
+        
+        results = {}
+        for name in options['only'] or BENCHMARKS:
+            iterations = options['iterations'] if name != 'login' else max(2, options['iterations'] // 10)
+            samples, queries, round_trips = getattr(self, f'bench_{name}')(iterations, options['warmup'])
+            results[name] = summarize(samples, queries, round_trips)
+            self.stdout.write(
+                f"{name:<14} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+                f"{results[name]['queries_per_op']:5.1f} queries/op"
+            )
+        
+        revision = git_revision()
+        report = {
+            'revision': revision,
+            'created_at': timezone.now().isoformat(),
+            'rows': self.table_sizes(),
+            'options': {key: options[key] for key in ('iterations', 'warmup', 'seed')},
+            'results': results,
+        }
+        output = Path(options['output'] or settings.BASE_DIR / 'benchmarks' / f'{revision}.json')
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(f'Saved {output}')
+        
+        if options['compare']:
+            regressions = self.compare(json.loads(Path(options['compare']).read_text()), report, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"Regressions: {', '.join(regressions)}")
+    
+    def table_sizes(self):
+        # Planner estimates; exact counts take too long at 10M rows
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT relname, reltuples::bigint FROM pg_class WHERE relname = ANY(%s)', [TABLES]
+            )
+            return dict(cursor.fetchall())
+    
+    def compare(self, baseline, current, threshold):
+        self.stdout.write(f"\nAgainst {baseline['revision']} ({baseline['created_at']}):")
+        if baseline.get('rows') != current['rows']:
+            self.stdout.write('  Note: dataset sizes differ, results may not be comparable')
+        
+        regressions = []
+        for name, result in current['results'].items():
+            before = baseline['results'].get(name)
+            if before is None:
+                continue
+            changes = {
+                key: result[key] / before[key] - 1
+                for key in ('p50_ms', 'p95_ms') if before[key]
+            }
+            regressed = any(change > threshold for change in changes.values())
+            if regressed:
+                regressions.append(name)
+            self.stdout.write(
+                f"  {name:<14} p50 {changes.get('p50_ms', 0):+7.1%}  p95 {changes.get('p95_ms', 0):+7.1%}  "
+                f"queries {before['queries_per_op']:.1f} -> {result['queries_per_op']:.1f}"
+                + ('  REGRESSION' if regressed else '')
+            )
+        return regressions
+    
+    def measure(self, iterations, warmup, operation):
+        """Run operation(i) warmup + iterations times, timing and counting queries after warmup"""
+        for i in range(warmup):
+            operation(i)
+        samples = []
+        queries = round_trips = 0
+        for i in range(iterations):
+            with track() as stats:
+                started = time.perf_counter()
+                operation(warmup + i)
+                samples.append(time.perf_counter() - started)
+            queries += stats.db_queries
+            round_trips += stats.redis_round_trips
+        return samples, queries, round_trips
+    
+    def call(self, view, method, user=None, data=None, **kwargs):
+        if method == 'post':
+            request = self.factory.post('/', data, format='json')
+        else:
+            request = self.factory.get('/', data)
+        if user is not None:
+            force_authenticate(request, user=user)
+        response = view(request, **kwargs)
+        response.render()
+        if response.status_code >= 400:
+            raise CommandError(f'{view.__name__} returned {response.status_code}: {response.content[:200]}')
+        return response
+    
+    def bench_login(self, iterations, warmup):
+        view = AuthViewSet.as_view({'post': 'login'})
+        return self.measure(iterations, warmup, lambda i: self.call(view, 'post', data={
+            'phone_number': self.users[i % len(self.users)].phone_number, 'password': PASSWORD,
+        }))
+    
+    def bench_nearby(self, iterations, warmup):
+        view = ServiceViewSet.as_view({'get': 'nearby'})
+        return self.measure(iterations, warmup, lambda i: self.call(
+            view, 'get', self.users[i % len(self.users)]
+        ))
+    
+    def bench_search(self, iterations, warmup):
+        view = ServiceViewSet.as_view({'get': 'list'})
+        words = [item.split()[0] for _, items in CATALOG.values() for item in items]
+        return self.measure(iterations, warmup, lambda i: self.call(
+            view, 'get', self.users[i % len(self.users)], {'search': self.rng.choice(words)}
+        ))
+    
+    def bench_book(self, iterations, warmup):
+        view = ServiceViewSet.as_view({'post': 'book'})
+        targets = []
+        for user in self.users:
+            service_id = Service.objects.filter(
+                location__distance_lte=(user.location, D(km=1.5)), is_available=True
+            ).exclude(provider=user).values_list('id', flat=True).first()
+            if service_id:
+                targets.append((user, service_id))
+        if not targets:
+            raise CommandError('No synthetic user has an available service within 1.5 km')
+        
+        created = []
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=400)
+        
+        def book(i):
+            user, service_id = targets[i % len(targets)]
+            # Distinct slots, so no booking conflicts with an earlier one
+            slot = start + timedelta(hours=2 * i)
+            response = self.call(view, 'post', user, {
+                'service_id': str(service_id),
+                'start_time': slot.isoformat(),
+                'end_time': (slot + timedelta(hours=1)).isoformat(),
+                'total_amount': '0',
+            }, pk=service_id)
+            created.append(response.data['id'])
+        
+        try:
+            return self.measure(iterations, warmup, book)
+        finally:
+            Booking.objects.filter(id__in=created).delete()
+    
+    def bench_booking_inbox(self, iterations, warmup):
+        view = BookingViewSet.as_view({'get': 'list'})
+        return self.measure(iterations, warmup, lambda i: self.call(
+            view, 'get', self.users[i % len(self.users)]
+        ))
+    
+    def bench_chat_persist(self, iterations, warmup):
+        room = ChatRoom.objects.filter(
+            user1__username__startswith=USERNAME_PREFIX
+        ).select_related('user1').first()
+        if room is None:
+            raise CommandError('No synthetic chat rooms found')
+        consumer = ChatConsumer()
+        consumer.user = room.user1
+        state = asyncio.run(consumer.load_room(room.id))
+        # save_message bumps these; they are put back afterwards
+        room_fields = ChatRoom.objects.filter(id=room.id).values(
+            'unread_count_user1', 'unread_count_user2', 'last_message', 'last_message_time', 'updated_at'
+        ).get()
+        saved = []
+        
+        async def persist(count):
+            samples = []
+            for i in range(count):
+                started = time.perf_counter()
+                message = await consumer.save_message(state, f'benchmark message {i}', 'text')
+                samples.append(time.perf_counter() - started)
+                saved.append(message.id)
+            return samples
+        
+        try:
+            asyncio.run(persist(warmup))
+            with track() as stats:
+                samples = asyncio.run(persist(iterations))
+        finally:
+            room.messages.filter(id__in=saved).delete()
+            ChatRoom.objects.filter(id=room.id).update(**room_fields)
+        return samples, stats.db_queries, stats.redis_round_trips
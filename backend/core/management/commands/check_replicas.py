@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import OperationalError
+
+from core.db_router import replica_aliases
+
+class Command(BaseCommand):
+    help = 'Show whether each read replica is reachable, in recovery, and how far it lags the primary'
+    
+    def handle(self, *args, **options):
+        aliases = replica_aliases()
+        if not aliases:
+            raise CommandError('No replicas configured; set DB_REPLICA_HOSTS')
+        
+        sticky = settings.REPLICA_STICKY_SECONDS
+        for alias in aliases:
+            database = settings.DATABASES[alias]
+            try:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute(
+                        """
+                        SELECT pg_is_in_recovery(),
+                               CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                                    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                               END
+                        """
+                    )
+                    in_recovery, lag = cursor.fetchone()
+            except OperationalError as e:
+                self.stderr.write(f"{alias} ({database['HOST']}:{database['PORT']}): unreachable: {e}")
+                continue
+            
+            if not in_recovery:
+                self.stderr.write(f'{alias}: not a standby; writes to the primary will not reach it')
+                continue
+            line = f"{alias} ({database['HOST']}:{database['PORT']}): lag {lag or 0:.2f}s"
+            if lag and lag > sticky:
+                # Users may read older data than they just wrote once stickiness lapses
+                self.stderr.write(self.style.WARNING(f'{line}, above REPLICA_STICKY_SECONDS={sticky}'))
+            else:
+                self.stdout.write(line)
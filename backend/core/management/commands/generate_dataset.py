@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.synthetic import PASSWORD, SHARES, SyntheticDataset, clear
+
+class Command(BaseCommand):
+    help = (
+        'Bulk load a synthetic dataset (pincodes, users, services, bookings, chat) '
+        f"of about --rows rows, split {', '.join(f'{k} {v:.0%}' for k, v in SHARES.items())}"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='10k to 10M')
+        parser.add_argument('--seed', type=int, help='Reproducible data; rerunning a seed needs --clear')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Rows per COPY')
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete previously generated synthetic data first')
+    
+    def handle(self, *args, **options):
+        if not 10_000 <= options['rows'] <= 10_000_000:
+            raise CommandError('--rows must be between 10000 and 10000000')
+        
+        if options['clear']:
+            with connection.cursor() as cursor:
+                clear(cursor)
+            self.stdout.write('Cleared previous synthetic data')
+        
+        dataset = SyntheticDataset(options['rows'], options['seed'])
+        loaded = dataset.load(options['batch_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {sum(loaded.values())} rows; synthetic users log in with password {PASSWORD!r}'
+        ))
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.token_blacklist import revoked_tokens
+
+OUTSTANDING_TABLE = 'token_blacklist_outstandingtoken'
+BLACKLISTED_TABLE = 'token_blacklist_blacklistedtoken'
+
+class Command(BaseCommand):
+    help = (
+        'Copy still-valid blacklisted JTIs from the simplejwt token_blacklist '
+        'tables into the Redis revocation store, optionally emptying the tables'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--purge',
+            action='store_true',
+            help='Truncate the token_blacklist tables after copying',
+        )
+    
+    def handle(self, *args, **options):
+        tables = connection.introspection.table_names()
+        if OUTSTANDING_TABLE not in tables or BLACKLISTED_TABLE not in tables:
+            self.stdout.write('No token_blacklist tables found, nothing to migrate')
+            return
+        
+        if 'rest_framework_simplejwt.token_blacklist' in settings.INSTALLED_APPS and options['purge']:
+            raise CommandError(
+                'Remove rest_framework_simplejwt.token_blacklist from INSTALLED_APPS '
+                'before purging, otherwise new rows keep being written'
+            )
+        
+        copied = 0
+        # A named (server-side) cursor only lives inside a transaction; each
+        # fetchmany then pulls one batch from the server. Behind PgBouncer
+        # (DB_PGBOUNCER) Django falls back to a client-side cursor.
+        with transaction.atomic(), connection.chunked_cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT o.jti, o.expires_at
+                FROM {OUTSTANDING_TABLE} o
+                JOIN {BLACKLISTED_TABLE} b ON b.token_id = o.id
+                WHERE o.expires_at > %s
+                """,
+                [timezone.now()],
+            )
+            while True:
+                rows = cursor.fetchmany(options['batch_size'])
+                if not rows:
+                    break
+                for jti, expires_at in rows:
+                    revoked_tokens.revoke(str(jti), expires_at.timestamp())
+                copied += len(rows)
+        
+        if options['purge']:
+            with connection.cursor() as cursor:
+                cursor.execute(f'TRUNCATE {BLACKLISTED_TABLE}, {OUTSTANDING_TABLE}')
+        
+        self.stdout.write(self.style.SUCCESS(f'Copied {copied} revoked tokens to Redis'))
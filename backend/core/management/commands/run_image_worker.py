@@ -0,0 +1,85 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from core.images import QUEUE_KEY, generate_derivatives
+from core.models import ImageAsset, Service
+from core.work_queue import WorkQueue
+
+class Command(BaseCommand):
+    help = 'Pre-generate thumbnail, card and full derivatives for uploaded images'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=16)
+        parser.add_argument('--timeout', type=int, default=5,
+                            help='Seconds to block waiting for work')
+    
+    def handle(self, *args, **options):
+        queue = WorkQueue(get_redis_connection('default'), QUEUE_KEY, 'images')
+        executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKER_PROCESSES)
+        
+        reclaimed = queue.start()
+        self.stdout.write(f'Image worker {queue.worker_id} started, requeued {reclaimed} images')
+        try:
+            while True:
+                first = queue.pop(options['timeout'])
+                if first is None:
+                    queue.reclaim()
+                    continue
+                
+                # Fill the batch without blocking so the pool stays busy under load
+                batch = [first]
+                while len(batch) < options['batch_size']:
+                    item = queue.pop_nowait()
+                    if item is None:
+                        break
+                    batch.append(item)
+                self.process(queue, executor, batch)
+        finally:
+            queue.stop()
+    
+    def process(self, queue, executor, batch):
+        hashes = [item.decode() for item in batch]
+        assets = ImageAsset.objects.filter(sha256__in=hashes, is_processed=False)
+        futures = {
+            asset.sha256: executor.submit(generate_derivatives, asset.sha256, asset.original)
+            for asset in assets
+        }
+        
+        processed = Q()
+        done = []
+        failed = 0
+        for item in batch:
+            future = futures.get(item.decode())
+            if future is None:
+                # Already processed, or the asset is gone
+                done.append(item)
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                dead = queue.retry(item, settings.IMAGE_WORKER_MAX_ATTEMPTS)
+                self.stderr.write(
+                    f"Derivative generation failed for {item.decode()}{' (dead-lettered)' if dead else ''}: {e}"
+                )
+                continue
+            ImageAsset.objects.filter(sha256=result['sha256']).update(
+                width=result['width'],
+                height=result['height'],
+                derivatives=result['derivatives'],
+                is_processed=True,
+            )
+            processed |= Q(images__contains=[result['sha256']])
+            done.append(item)
+        
+        # Image URLs of these services changed, so their ETags must too
+        if processed:
+            Service.objects.filter(processed).update(updated_at=timezone.now())
+        for item in done:
+            queue.ack(item)
+        self.stdout.write(f'Processed {len(futures) - failed} images, {failed} failed')
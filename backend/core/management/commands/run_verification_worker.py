@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from core.verification import QUEUE_KEY, VerificationPipeline
+from core.work_queue import WorkQueue
+
+class Command(BaseCommand):
+    help = 'Process queued identity verification jobs'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=int, default=5,
+                            help='Seconds to block waiting for a job')
+    
+    def handle(self, *args, **options):
+        queue = WorkQueue(get_redis_connection('default'), QUEUE_KEY, 'verification')
+        pipeline = VerificationPipeline()
+        
+        reclaimed = queue.start()
+        self.stdout.write(f'Verification worker {queue.worker_id} started, requeued {reclaimed} jobs')
+        try:
+            while True:
+                job_id = queue.pop(options['timeout'])
+                if job_id is None:
+                    queue.reclaim()
+                    continue
+                job = pipeline.run(job_id.decode())
+                queue.ack(job_id)
+                if job is not None:
+                    self.stdout.write(f'{job.id} {job.status} {job.timings}')
+        finally:
+            queue.stop()
@@ -0,0 +1,203 @@
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client import REGISTRY
+from redis import Connection, ConnectionPool
+from redis.asyncio import Connection as AsyncConnection
+
+slow_request_logger = logging.getLogger('aangan.slow_requests')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS,
+)
+HTTP_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries per HTTP request', ['route'], buckets=COUNT_BUCKETS,
+)
+HTTP_DB_TIME = Histogram(
+    'http_request_db_seconds', 'Time spent in SQL per HTTP request', ['route'], buckets=LATENCY_BUCKETS,
+)
+HTTP_REDIS_ROUND_TRIPS = Histogram(
+    'http_request_redis_round_trips', 'Redis round-trips per HTTP request', ['route'],
+    buckets=COUNT_BUCKETS,
+)
+DB_QUERIES = Counter('db_queries_total', 'SQL queries executed by any code path')
+DB_QUERY_TIME = Histogram('db_query_duration_seconds', 'SQL query latency', buckets=LATENCY_BUCKETS)
+REDIS_ROUND_TRIPS = Counter('redis_round_trips_total', 'Commands or pipelines sent to Redis', ['client'])
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups', ['cache', 'result'])
+CHAT_EVENTS = Counter('chat_events_total', 'Inbound chat socket events', ['consumer', 'event'])
+CHAT_EVENT_LATENCY = Histogram(
+    'chat_event_duration_seconds', 'Time to handle one inbound chat socket event',
+    ['consumer', 'event'], buckets=LATENCY_BUCKETS,
+)
+CHAT_EVENT_DB_QUERIES = Histogram(
+    'chat_event_db_queries', 'SQL queries per inbound chat socket event',
+    ['consumer', 'event'], buckets=COUNT_BUCKETS,
+)
+CHAT_EVENT_REDIS_ROUND_TRIPS = Histogram(
+    'chat_event_redis_round_trips', 'Redis round-trips per inbound chat socket event',
+    ['consumer', 'event'], buckets=COUNT_BUCKETS,
+)
+
+class RequestStats:
+    """Per-request (or per-event) tallies, found through a context variable"""
+    
+    def __init__(self, capture_sql=False):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.redis_round_trips = 0
+        self.statements = [] if capture_sql else None
+
+_current = contextvars.ContextVar('metrics_request_stats', default=None)
+
+def record_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        DB_QUERIES.inc()
+        DB_QUERY_TIME.observe(elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_time += elapsed
+            if stats.statements is not None and len(stats.statements) < settings.SLOW_REQUEST_MAX_STATEMENTS:
+                stats.statements.append((elapsed, sql))
+
+def _instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+connection_created.connect(_instrument_connection)
+
+def _count_round_trip(client):
+    REDIS_ROUND_TRIPS.labels(client).inc()
+    stats = _current.get()
+    if stats is not None:
+        stats.redis_round_trips += 1
+
+class InstrumentedConnection(Connection):
+    """redis-py connection counting round-trips; a pipeline is sent as one packet"""
+    
+    def send_packed_command(self, command, check_health=True):
+        _count_round_trip('sync')
+        return super().send_packed_command(command, check_health)
+
+class InstrumentedConnectionPool(ConnectionPool):
+    """CONNECTION_POOL_CLASS for django-redis, handing out InstrumentedConnections"""
+    
+    def __init__(self, connection_class=InstrumentedConnection, **kwargs):
+        super().__init__(connection_class=connection_class, **kwargs)
+
+class InstrumentedAsyncConnection(AsyncConnection):
+    async def send_packed_command(self, command, check_health=True):
+        _count_round_trip('async')
+        return await super().send_packed_command(command, check_health)
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+@contextmanager
+def track(capture_sql=False):
+    stats = RequestStats(capture_sql)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def observe_chat_event(consumer, event):
+    """
+    Time one inbound socket event. database_sync_to_async copies the
+    context into its thread, so queries made for the event are counted too.
+    """
+    started = time.perf_counter()
+    with track() as stats:
+        try:
+            yield
+        finally:
+            CHAT_EVENTS.labels(consumer, event).inc()
+            CHAT_EVENT_LATENCY.labels(consumer, event).observe(time.perf_counter() - started)
+            CHAT_EVENT_DB_QUERIES.labels(consumer, event).observe(stats.db_queries)
+            CHAT_EVENT_REDIS_ROUND_TRIPS.labels(consumer, event).observe(stats.redis_round_trips)
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL query count/time and Redis round-trips per route,
+    and logs the SQL of requests slower than SLOW_REQUEST_SECONDS.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with track(capture_sql=settings.SLOW_REQUEST_SECONDS > 0) as stats:
+            response = self.get_response(request)
+        self.observe(request, response, stats, time.perf_counter() - started)
+        return response
+    
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        # Async ORM calls copy this context into their thread, so they are counted too
+        with track(capture_sql=settings.SLOW_REQUEST_SECONDS > 0) as stats:
+            response = await self.get_response(request)
+        self.observe(request, response, stats, time.perf_counter() - started)
+        return response
+    
+    def observe(self, request, response, stats, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        # The URL pattern, not the path, keeps label cardinality bounded
+        route = match.route if match and match.route else 'unmatched'
+        HTTP_LATENCY.labels(request.method, route, response.status_code).observe(elapsed)
+        HTTP_DB_QUERIES.labels(route).observe(stats.db_queries)
+        HTTP_DB_TIME.labels(route).observe(stats.db_time)
+        HTTP_REDIS_ROUND_TRIPS.labels(route).observe(stats.redis_round_trips)
+        
+        if 0 < settings.SLOW_REQUEST_SECONDS <= elapsed:
+            slowest = sorted(stats.statements, reverse=True)[:10]
+            slow_request_logger.warning(
+                'Slow request %s %s: %.0f ms, %d queries (%.0f ms), %d Redis round-trips\n%s',
+                request.method, request.path, elapsed * 1000, stats.db_queries, stats.db_time * 1000,
+                stats.redis_round_trips,
+                '\n'.join(f'  {duration * 1000:7.1f} ms  {sql}' for duration, sql in slowest),
+            )
+
+def metrics_view(request):
+    """Prometheus exposition; aggregates all worker processes in multiprocess mode"""
+    token = settings.METRICS_TOKEN
+    if not token:
+        # Route names and query counts are not for the public
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -111,7 +111,7 @@ class Service(models.Model):
     total_bookings = models.IntegerField(default=0)
     
     # Images
-    images = models.JSONField(default=list)  # Store list of image URLs
+    images = models.JSONField(default=list)  # ImageAsset hashes (legacy entries may be URLs)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -166,7 +166,8 @@ class Booking(models.Model):
         ],
         default='pending'
     )
-    razorpay_order_id = models.CharField(max_length=100, null=True, blank=True)
+    # Indexed for webhook and reconciliation lookups by gateway order
+    razorpay_order_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     razorpay_payment_id = models.CharField(max_length=100, null=True, blank=True)
     
     # Ratings
@@ -216,6 +217,9 @@ class ChatRoom(models.Model):
     last_message_time = models.DateTimeField(null=True, blank=True)
     unread_count_user1 = models.IntegerField(default=0)
     unread_count_user2 = models.IntegerField(default=0)
+    # Read watermarks: each user has read every message up to this time
+    last_read_at_user1 = models.DateTimeField(null=True, blank=True)
+    last_read_at_user2 = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -252,7 +256,10 @@ class Message(models.Model):
     is_read = models.BooleanField(default=False)
     read_at = models.DateTimeField(null=True, blank=True)
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: write-behind persistence assigns the timestamp when
+    # the message is broadcast and bulk_create must keep it. The table is
+    # range-partitioned by month on this column (`manage.py partition_messages`)
+    created_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         indexes = [
@@ -263,3 +270,87 @@ class Message(models.Model):
     
     def __str__(self):
         return f"Message from {self.sender.username}: {self.content[:50]}"
+
+class MessageArchive(models.Model):
+    """
+    Compressed cold-storage file with one room's messages for an archived month
+    """
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='archives')
+    month = models.DateField()  # First day of the archived partition's month
+    path = models.CharField(max_length=255)  # Name within CHAT_ARCHIVE_ROOT
+    message_count = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['room', 'month']
+    
+    def __str__(self):
+        return f"Archive {self.month:%Y-%m} - {self.room_id}"
+
+class IdentityDocument(models.Model):
+    """
+    Uploaded identity/address proof with its content hash and normalized derivative
+    """
+    KIND_CHOICES = [
+        ('id_proof_front', 'ID Proof (Front)'),
+        ('id_proof_back', 'ID Proof (Back)'),
+        ('address_proof', 'Address Proof'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='identity_documents')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    sha256 = models.CharField(max_length=64)
+    normalized = models.ImageField(upload_to='verification/normalized/', null=True, blank=True)
+    width = models.IntegerField(null=True, blank=True)
+    height = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['user', 'kind']
+        indexes = [
+            models.Index(fields=['sha256']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} - {self.user.username}"
+
+class VerificationJob(models.Model):
+    """
+    One background run of the identity verification pipeline
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='verification_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    results = models.JSONField(default=dict)  # check name -> {passed, reason}
+    timings = models.JSONField(default=dict)  # stage name -> milliseconds
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Verification {self.id.hex[:8]} - {self.status}"
+
+class ImageAsset(models.Model):
+    """
+    Content-addressed listing image; `Service.images` stores these hashes
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    original = models.CharField(max_length=255)  # Storage name of the upload
+    width = models.IntegerField(null=True, blank=True)
+    height = models.IntegerField(null=True, blank=True)
+    # {"thumbnail": {"webp": "<name>", "jpeg": "<name>"}, "card": {...}, "full": {...}}
+    derivatives = models.JSONField(default=dict)
+    is_processed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.sha256[:12]
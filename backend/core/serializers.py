@@ -3,8 +3,9 @@ from django.contrib.auth import authenticate
 from django.contrib.gis.geos import Point
 from .models import (
     User, PincodeBoundary, ServiceCategory, Service, 
-    Booking, Review, ChatRoom, Message
+    Booking, Review, ChatRoom, Message, ImageAsset
 )
+from .images import image_urls, is_image_hash
 import phonenumbers
 
 class UserSerializer(serializers.ModelSerializer):
@@ -117,6 +118,48 @@ class ServiceCategorySerializer(serializers.ModelSerializer):
         model = ServiceCategory
         fields = ['id', 'name', 'description', 'icon']
 
+def prefetch_image_assets(context, services):
+    """
+    Load the ImageAssets of `services` into context['image_assets'] with one
+    query. Hashes without an asset map to None so they aren't looked up again.
+    """
+    assets = context.setdefault('image_assets', {})
+    hashes = {h for service in services for h in service.images if is_image_hash(h)} - assets.keys()
+    if hashes:
+        assets.update(dict.fromkeys(hashes))
+        assets.update(ImageAsset.objects.in_bulk(list(hashes)))
+
+class ServiceImagesField(serializers.JSONField):
+    """
+    Renders `Service.images` hashes as URLs of one pre-generated derivative.
+    
+    The variant comes from the serializer context ('thumbnail', 'card' or
+    'full'). Legacy entries that are plain URLs are passed through.
+    """
+    
+    def to_representation(self, value):
+        variant = self.context.get('image_variant', 'card')
+        assets = self.context.setdefault('image_assets', {})
+        
+        missing = [h for h in value if is_image_hash(h) and h not in assets]
+        if missing:
+            assets.update(dict.fromkeys(missing))
+            assets.update(ImageAsset.objects.in_bulk(missing))
+        
+        images = []
+        for entry in value:
+            if not is_image_hash(entry):
+                images.append({'id': None, 'webp': None, 'jpeg': entry})
+            elif assets.get(entry) is not None:
+                images.append(image_urls(assets[entry], variant))
+        return images
+
+class ServiceListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # One query for the images of the whole page instead of one per service
+        prefetch_image_assets(self.context, data)
+        return super().to_representation(data)
+
 class ServiceSerializer(serializers.ModelSerializer):
     provider = UserSerializer(read_only=True)
     category = ServiceCategorySerializer(read_only=True)
@@ -126,9 +169,11 @@ class ServiceSerializer(serializers.ModelSerializer):
         write_only=True
     )
     distance = serializers.FloatField(read_only=True)
+    images = ServiceImagesField(required=False)
     
     class Meta:
         model = Service
+        list_serializer_class = ServiceListSerializer
         fields = [
             'id', 'provider', 'title', 'description', 'category', 'category_id',
             'service_type', 'price_per_hour', 'price_per_day', 'price_per_unit',
@@ -142,6 +187,12 @@ class ServiceSerializer(serializers.ModelSerializer):
         validated_data['provider'] = self.context['request'].user
         return super().create(validated_data)
 
+class BookingListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # The nested ServiceSerializer is not a list, so prefetch its images here
+        prefetch_image_assets(self.context, [booking.service for booking in data])
+        return super().to_representation(data)
+
 class BookingSerializer(serializers.ModelSerializer):
     service = ServiceSerializer(read_only=True)
     service_id = serializers.PrimaryKeyRelatedField(
@@ -153,6 +204,7 @@ class BookingSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Booking
+        list_serializer_class = BookingListSerializer
         fields = [
             'id', 'service', 'service_id', 'user', 'start_time', 'end_time',
             'total_hours', 'total_days', 'total_amount', 'platform_fee',
@@ -201,7 +253,7 @@ class MessageSerializer(serializers.ModelSerializer):
 class ChatRoomSerializer(serializers.ModelSerializer):
     user1 = UserSerializer(read_only=True)
     user2 = UserSerializer(read_only=True)
-    last_message = MessageSerializer(read_only=True)
+    last_message = serializers.CharField(read_only=True)  # Preview text, not a Message
     other_user = serializers.SerializerMethodField()
     
     class Meta:
@@ -0,0 +1,442 @@
+"""
+Synthetic dataset for benchmarks: pincode polygons, users, services,
+bookings and chat traffic at a configurable number of rows, bulk loaded
+with COPY. Every synthetic user shares PASSWORD and a USERNAME_PREFIX
+username, and synthetic pincodes use CITY, so the data can be found and
+removed again.
+"""
+import bisect
+import io
+import math
+import random
+import time
+import uuid
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.utils import timezone
+
+from chat import partitions
+from core.models import PincodeBoundary, ServiceCategory
+
+PASSWORD = 'aangan-synthetic'
+USERNAME_PREFIX = 'syn_'
+CITY = 'Synthetic'
+
+# Share of the requested rows given to each table
+SHARES = {
+    'users': 0.10,
+    'services': 0.15,
+    'bookings': 0.30,
+    'rooms': 0.05,
+    'messages': 0.40,
+}
+USERS_PER_PINCODE = 200
+PROVIDER_SHARE = 0.3  # Users who list at least one service
+
+# Pincodes form a grid of ~2 km cells north-east of ORIGIN (south Delhi),
+# so a 1.5 km nearby search reaches into neighbouring pincodes
+ORIGIN = (28.45, 77.05)  # lat, lon
+CELL_DEGREES = 0.02
+GRID_COLUMNS = 100  # Fixed, so a pincode's cell is the same at every scale
+
+ID_KINDS = {'user': 1, 'service': 2, 'booking': 3, 'room': 4, 'message': 5}
+
+CATALOG = {
+    'Tools': ('asset', ['Drill machine', 'Ladder', 'Toolbox', 'Pressure washer', 'Lawn mower']),
+    'Books': ('asset', ['NCERT set', 'JEE guide', 'Novel collection', 'Cookbook', 'Atlas']),
+    'Electronics': ('asset', ['Projector', 'DSLR camera', 'Speaker', 'Inverter battery', 'Printer']),
+    'Home': ('asset', ['Folding chairs', 'Pressure cooker', 'Air cooler', 'Sewing machine', 'Tent']),
+    'Tutoring': ('skill', ['Maths tuition', 'Spoken English', 'Guitar lessons', 'Yoga class', 'Coding help']),
+    'Repairs': ('skill', ['Plumbing', 'Electrician', 'Carpentry', 'Mobile repair', 'AC servicing']),
+}
+ADJECTIVES = ['Reliable', 'Affordable', 'Quick', 'Well kept', 'Experienced', 'Weekend', 'Nearby']
+MESSAGES = [
+    'Hi, is this still available?', 'Can I pick it up this evening?', 'What time works for you?',
+    'Sure, see you at 6', 'Thanks!', 'Running 10 minutes late', 'Is the price negotiable?',
+    'I will return it tomorrow morning', 'Please share your exact address', 'Done, payment sent',
+]
+AREAS = ['Nagar', 'Vihar', 'Enclave', 'Colony', 'Extension', 'Bagh', 'Kunj']
+
+def _text(value):
+    """A value in COPY text format"""
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+def _point(lat, lon):
+    return f'SRID=4326;POINT({lon:.6f} {lat:.6f})'
+
+def copy_rows(cursor, table, columns, rows, batch_size=50000):
+    """COPY `rows` (tuples in `columns` order) into `table`, batch_size rows per statement"""
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write('\t'.join(map(_text, row)))
+        buffer.write('\n')
+        count += 1
+        if count % batch_size == 0:
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            buffer = io.StringIO()
+    if buffer.tell():
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+    return count
+
+def clear(cursor):
+    """Delete every synthetic row; FKs may lack ON DELETE CASCADE, so children go first"""
+    users = 'SELECT id FROM core_user WHERE username LIKE %s'
+    pattern = USERNAME_PREFIX.replace('_', '\\_') + '%'
+    for statement in (
+        f'DELETE FROM core_message WHERE sender_id IN ({users})',
+        f'DELETE FROM core_chatroom WHERE user1_id IN ({users})',
+        f'DELETE FROM core_booking WHERE user_id IN ({users})',
+        f'DELETE FROM core_booking WHERE service_id IN (SELECT id FROM core_service WHERE provider_id IN ({users}))',
+        f'DELETE FROM core_service WHERE provider_id IN ({users})',
+        'DELETE FROM core_user WHERE username LIKE %s',
+    ):
+        cursor.execute(statement, [pattern])
+    cursor.execute('DELETE FROM core_pincodeboundary WHERE city = %s', [CITY])
+
+class SyntheticDataset:
+    """
+    Generates rows table by table. Only compact per-row arrays (pincode,
+    coordinates, prices) are kept between tables; IDs are derived from a
+    per-run prefix and the row index, so FKs need no lookups.
+    
+    Users cluster in pincodes with Zipf-like popularity, providers list
+    services close to where they live, bookings are made by neighbours
+    and chat rooms pair users of the same pincode.
+    """
+    
+    def __init__(self, rows, seed=None):
+        self.rng = random.Random(seed)
+        self.run = self.rng.getrandbits(80)
+        self.tag = self.rng.randrange(100000)
+        self.now = timezone.now()
+        self.counts = {name: max(1, int(rows * share)) for name, share in SHARES.items()}
+        self.counts['pincodes'] = max(5, self.counts['users'] // USERS_PER_PINCODE)
+        
+        # Filled as tables are generated
+        self.user_pincode = array('I')
+        self.user_lat = array('d')
+        self.user_lon = array('d')
+        self.pincode_users = [array('I') for _ in range(self.counts['pincodes'])]
+        self.service_pincode = array('I')
+        self.service_price = array('d')
+        self.service_hourly = bytearray()
+        self.room_users = array('I')  # user1, user2 index pairs
+        self.room_created = array('d')
+    
+    def make_id(self, kind, index):
+        return uuid.UUID(int=(self.run << 48) | (ID_KINDS[kind] << 40) | index)
+    
+    def past(self, days, recent_bias=1.0):
+        # recent_bias > 1 crowds timestamps towards now
+        return self.now - timedelta(days=days * self.rng.random() ** recent_bias)
+    
+    def pincode_code(self, index):
+        # 9xxxxx pincodes belong to the Army Postal Service, not to any locality
+        return f'9{index:05d}'
+    
+    def cell_center(self, index):
+        row, col = divmod(index, GRID_COLUMNS)
+        return (
+            ORIGIN[0] + (row + 0.5) * CELL_DEGREES,
+            ORIGIN[1] + (col + 0.5) * CELL_DEGREES,
+        )
+    
+    def point_in_cell(self, index):
+        # The cell octagon contains every point within 0.38 cells of the center
+        lat, lon = self.cell_center(index)
+        radius = 0.34 * CELL_DEGREES * math.sqrt(self.rng.random())
+        angle = self.rng.uniform(0, 2 * math.pi)
+        return lat + radius * math.sin(angle), lon + radius * math.cos(angle)
+    
+    def pincodes(self, existing=()):
+        for index in range(self.counts['pincodes']):
+            code = self.pincode_code(index)
+            if code in existing:
+                continue
+            lat, lon = self.cell_center(index)
+            ring = []
+            for vertex in range(8):
+                angle = vertex * math.pi / 4
+                radius = CELL_DEGREES * self.rng.uniform(0.42, 0.49)
+                ring.append(f'{lon + radius * math.cos(angle):.6f} {lat + radius * math.sin(angle):.6f}')
+            ring.append(ring[0])
+            yield (
+                code,
+                f"SRID=4326;POLYGON(({', '.join(ring)}))",
+                _point(lat, lon),
+                f'{self.rng.choice(ADJECTIVES[:3])} {self.rng.choice(AREAS)} {index}',
+                CITY, 'Delhi',
+                self.rng.randrange(5000, 80000),
+                True,
+                self.now,
+            )
+    
+    def users(self):
+        count = self.counts['pincodes']
+        weights = [1 / (rank + 1) ** 0.8 for rank in range(count)]
+        self.rng.shuffle(weights)
+        cumulative = list(accumulate(weights))
+        
+        password = make_password(PASSWORD)
+        for index in range(self.counts['users']):
+            pincode = bisect.bisect(cumulative, self.rng.random() * cumulative[-1])
+            pincode = min(pincode, count - 1)
+            lat, lon = self.point_in_cell(pincode)
+            self.user_pincode.append(pincode)
+            self.user_lat.append(lat)
+            self.user_lon.append(lon)
+            self.pincode_users[pincode].append(index)
+            
+            joined = self.past(720)
+            verified = self.rng.random() < 0.8
+            name = f'{USERNAME_PREFIX}{self.tag:05d}_{index}'
+            yield (
+                self.make_id('user', index),
+                password, False, name, '', '',
+                f'{name}@synthetic.local', False, True, joined,
+                f'+8{self.tag:05d}{index:08d}',
+                verified, 'verified' if verified else 'pending',
+                _point(lat, lon), self.pincode_code(pincode),
+                f'House {self.rng.randrange(1, 500)}, {self.pincode_code(pincode)}',
+                round(self.rng.uniform(3.0, 5.0), 1), self.rng.randrange(0, 40),
+                joined, joined,
+            )
+    
+    def services(self):
+        categories = list(ServiceCategory.objects.filter(name__in=CATALOG).values_list('id', 'name'))
+        providers = max(1, int(self.counts['users'] * PROVIDER_SHARE))
+        for index in range(self.counts['services']):
+            provider = self.rng.randrange(providers)
+            pincode = self.user_pincode[provider]
+            # Listed at or near the provider's home
+            lat = self.user_lat[provider] + self.rng.gauss(0, 0.001)
+            lon = self.user_lon[provider] + self.rng.gauss(0, 0.001)
+            
+            category_id, category = self.rng.choice(categories)
+            service_type, items = CATALOG[category]
+            item = self.rng.choice(items)
+            hourly = service_type == 'skill'
+            price = self.rng.randrange(100, 800, 50) if hourly else self.rng.randrange(50, 1500, 50)
+            self.service_pincode.append(pincode)
+            self.service_price.append(price)
+            self.service_hourly.append(hourly)
+            
+            created = self.past(365)
+            yield (
+                self.make_id('service', index),
+                self.make_id('user', provider),
+                f'{self.rng.choice(ADJECTIVES)} {item.lower()}' if self.rng.random() < 0.5 else item,
+                f'{item} available in {self.pincode_code(pincode)}. Message me to book.',
+                category_id, service_type,
+                price if hourly else None,
+                None if hourly else price,
+                None,
+                _point(lat, lon), self.pincode_code(pincode),
+                f'Near block {self.rng.randrange(1, 40)}, {self.pincode_code(pincode)}',
+                self.rng.random() < 0.9,
+                round(self.rng.uniform(0, 5), 1), self.rng.randrange(0, 50), '[]',
+                created, created,
+            )
+    
+    def neighbour(self, pincode, exclude=None):
+        members = self.pincode_users[pincode]
+        if not members:
+            return self.rng.randrange(len(self.user_pincode))
+        choice = members[self.rng.randrange(len(members))]
+        if choice == exclude and len(members) > 1:
+            return self.neighbour(pincode, exclude)
+        return choice
+    
+    def bookings(self):
+        for index in range(self.counts['bookings']):
+            service = self.rng.randrange(self.counts['services'])
+            user = self.neighbour(self.service_pincode[service])
+            hourly = self.service_hourly[service]
+            
+            start = self.now + timedelta(days=self.rng.uniform(-180, 30))
+            start = start.replace(minute=0, second=0, microsecond=0)
+            if hourly:
+                hours, days = self.rng.randrange(1, 5), None
+                end = start + timedelta(hours=hours)
+                amount = Decimal(self.service_price[service] * hours)
+            else:
+                hours, days = None, self.rng.randrange(1, 4)
+                end = start + timedelta(days=days)
+                amount = Decimal(self.service_price[service] * days)
+            
+            if end < self.now:
+                status = self.rng.choices(['completed', 'cancelled', 'rejected'], [85, 10, 5])[0]
+            else:
+                status = self.rng.choices(['pending', 'confirmed', 'in_progress'], [40, 50, 10])[0]
+            payment_status = {
+                'completed': 'paid', 'in_progress': 'paid', 'confirmed': 'paid',
+                'cancelled': 'refunded', 'rejected': 'pending', 'pending': 'pending',
+            }[status]
+            order_id = f'order_{self.make_id("booking", index).hex[-14:]}' if payment_status != 'pending' else None
+            created = min(start, self.now) - timedelta(days=self.rng.uniform(0, 7))
+            yield (
+                self.make_id('booking', index),
+                self.make_id('service', service),
+                self.make_id('user', user),
+                start, end, hours, days,
+                amount, (amount * Decimal('0.05')).quantize(Decimal('0.01')),
+                status, payment_status,
+                order_id, f'pay_{order_id[6:]}' if order_id else None,
+                self.rng.randrange(3, 6) if status == 'completed' and self.rng.random() < 0.6 else None,
+                created, created,
+            )
+    
+    def rooms(self):
+        seen = set()
+        users = len(self.user_pincode)
+        index = 0
+        attempts = 0
+        while index < self.counts['rooms'] and attempts < self.counts['rooms'] * 10:
+            attempts += 1
+            first = self.rng.randrange(users)
+            second = self.neighbour(self.user_pincode[first], exclude=first)
+            if first == second:
+                continue
+            # user1 is the lower ID, as in ChatViewSet.start_chat
+            first, second = min(first, second), max(first, second)
+            if (first, second) in seen:
+                continue
+            seen.add((first, second))
+            
+            created = self.past(180)
+            self.room_users.extend((first, second))
+            self.room_created.append(created.timestamp())
+            yield (
+                self.make_id('room', index),
+                self.make_id('user', first), self.make_id('user', second),
+                0, 0, created, created,
+            )
+            index += 1
+    
+    def messages(self):
+        rooms = len(self.room_created)
+        if not rooms:
+            return
+        # A few busy rooms and a long tail of quiet ones
+        weights = list(accumulate(self.rng.paretovariate(1.2) for _ in range(rooms)))
+        for index in range(self.counts['messages']):
+            room = min(bisect.bisect(weights, self.rng.random() * weights[-1]), rooms - 1)
+            sender_index = self.rng.randrange(2)
+            sender = self.room_users[room * 2 + sender_index]
+            receiver = self.room_users[room * 2 + 1 - sender_index]
+            
+            opened = self.room_created[room]
+            sent = opened + (self.now.timestamp() - opened) * self.rng.random() ** 0.5
+            created = datetime.fromtimestamp(sent, tz=dt_timezone.utc)
+            is_read = self.now - created > timedelta(hours=1) or self.rng.random() < 0.5
+            yield (
+                self.make_id('message', index),
+                self.make_id('room', room),
+                self.make_id('user', sender), self.make_id('user', receiver),
+                self.rng.choice(MESSAGES), 'text',
+                is_read, created if is_read else None,
+                created,
+            )
+    
+    def load(self, batch_size=50000, log=print):
+        """Generate and COPY every table; returns rows loaded per table"""
+        for name, (service_type, items) in CATALOG.items():
+            if not ServiceCategory.objects.filter(name=name).exists():
+                ServiceCategory.objects.create(name=name, description=f'{name} ({service_type})')
+        existing = set(PincodeBoundary.objects.filter(city=CITY).values_list('pincode', flat=True))
+        
+        tables = [
+            ('pincodes', 'core_pincodeboundary', (
+                'pincode', 'boundary', 'center_point', 'area_name', 'city', 'state',
+                'population', 'is_active', 'created_at',
+            ), lambda: self.pincodes(existing)),
+            ('users', 'core_user', (
+                'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name',
+                'email', 'is_staff', 'is_active', 'date_joined', 'phone_number',
+                'is_verified', 'verification_status', 'location', 'current_pincode',
+                'address', 'rating', 'total_transactions', 'created_at', 'updated_at',
+            ), self.users),
+            ('services', 'core_service', (
+                'id', 'provider_id', 'title', 'description', 'category_id', 'service_type',
+                'price_per_hour', 'price_per_day', 'price_per_unit', 'location', 'pincode',
+                'address', 'is_available', 'average_rating', 'total_bookings', 'images',
+                'created_at', 'updated_at',
+            ), self.services),
+            ('bookings', 'core_booking', (
+                'id', 'service_id', 'user_id', 'start_time', 'end_time', 'total_hours',
+                'total_days', 'total_amount', 'platform_fee', 'status', 'payment_status',
+                'razorpay_order_id', 'razorpay_payment_id', 'user_rating',
+                'created_at', 'updated_at',
+            ), self.bookings),
+            ('rooms', 'core_chatroom', (
+                'id', 'user1_id', 'user2_id', 'unread_count_user1', 'unread_count_user2',
+                'created_at', 'updated_at',
+            ), self.rooms),
+            ('messages', 'core_message', (
+                'id', 'room_id', 'sender_id', 'receiver_id', 'content', 'message_type',
+                'is_read', 'read_at', 'created_at',
+            ), self.messages),
+        ]
+        
+        partitioned = partitions.is_partitioned()
+        loaded = {}
+        with connection.cursor() as cursor:
+            for name, table, columns, rows in tables:
+                if name == 'messages' and partitioned and self.room_created:
+                    # Messages are never older than their room; give every month
+                    # its partition so none land in the default partition
+                    oldest = datetime.fromtimestamp(min(self.room_created), tz=dt_timezone.utc)
+                    partitions.ensure_partitions(since=oldest)
+                started = time.perf_counter()
+                loaded[name] = copy_rows(cursor, table, columns, rows(), batch_size)
+                log(f'{name}: {loaded[name]} rows in {time.perf_counter() - started:.1f}s')
+            
+            if partitioned and partitions.default_partition_rows():
+                raise RuntimeError(
+                    f'{partitions.DEFAULT_PARTITION} is not empty; benchmarks would not '
+                    'run against the production partition layout'
+                )
+            
+            # Denormalized room summaries, the way save_message leaves them
+            cursor.execute(
+                """
+                UPDATE core_chatroom r
+                SET last_message = m.content, last_message_time = m.created_at,
+                    updated_at = m.created_at,
+                    unread_count_user1 = m.unread_user1, unread_count_user2 = m.unread_user2
+                FROM (
+                    SELECT DISTINCT ON (room_id) room_id, content, created_at,
+                        count(*) FILTER (WHERE NOT is_read AND receiver_id = c.user1_id)
+                            OVER (PARTITION BY room_id) AS unread_user1,
+                        count(*) FILTER (WHERE NOT is_read AND receiver_id = c.user2_id)
+                            OVER (PARTITION BY room_id) AS unread_user2
+                    FROM core_message
+                    JOIN core_chatroom c ON c.id = room_id
+                    WHERE room_id BETWEEN %s AND %s
+                    ORDER BY room_id, created_at DESC
+                ) m
+                WHERE r.id = m.room_id
+                """,
+                # This run's room IDs are consecutive
+                [self.make_id('room', 0), self.make_id('room', max(loaded['rooms'] - 1, 0))],
+            )
+            cursor.execute(
+                'ANALYZE core_pincodeboundary, core_user, core_service, core_booking, '
+                'core_chatroom, core_message'
+            )
+        return loaded
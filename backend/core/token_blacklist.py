@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from django_redis import get_redis_connection
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt import tokens as jwt_tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """
+    Fixed-size in-process Bloom filter using double hashing over blake2b
+    """
+    
+    def __init__(self, capacity, error_rate):
+        # Standard sizing: m = -n ln(p) / (ln 2)^2, k = (m / n) ln 2
+        ln2 = math.log(2)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (ln2 * ln2)))
+        self.hash_count = max(1, int(round(self.size / capacity * ln2)))
+        self.bits = bytearray((self.size + 7) // 8)
+    
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+    
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+    
+    def __contains__(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+class RevokedTokenStore:
+    """
+    Revoked JWT IDs kept in Redis with a TTL equal to the token's remaining
+    lifetime, fronted by a per-process Bloom filter.
+    
+    Each revocation is also appended to a Redis stream. Processes replay the
+    stream into their local filter at most every SYNC_INTERVAL seconds, and
+    a filter miss is trusted without a round-trip. A revocation made by
+    another process is therefore missed for up to about SYNC_INTERVAL. Once
+    the last successful sync is older than `stale_after` intervals (Redis
+    unreachable, say), misses are checked in Redis too, and fail closed like
+    hits. The stream is trimmed to the refresh token lifetime, which is the
+    longest a revoked JTI can matter.
+    """
+    
+    key_prefix = 'jwt:revoked:'
+    log_key = 'jwt:revoked:log'
+    sync_batch_size = 10000  # Stream entries per XRANGE
+    stale_after = 3  # Sync intervals before the filter alone is not trusted
+    
+    def __init__(self, capacity, error_rate, sync_interval, rebuild_interval):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._sync_lock = threading.Lock()
+        self._filter_lock = threading.Lock()
+        self._filter = BloomFilter(capacity, error_rate)
+        self._last_id = '0-0'
+        self._last_sync = 0.0
+        self._built_at = time.monotonic()
+    
+    @property
+    def redis(self):
+        return get_redis_connection('default')
+    
+    def revoke(self, jti, exp):
+        """Revoke a JTI until its `exp` (epoch seconds)"""
+        ttl = int(exp - time.time())
+        if ttl <= 0:
+            return
+        
+        min_id = int((time.time() - api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()) * 1000)
+        pipe = self.redis.pipeline()
+        pipe.set(self.key_prefix + jti, 1, ex=ttl)
+        pipe.xadd(self.log_key, {'jti': jti}, minid=min_id, approximate=True)
+        pipe.execute()
+        
+        with self._filter_lock:
+            self._filter.add(jti)
+    
+    def is_revoked(self, jti):
+        self._sync()
+        # _last_sync only advances when a sync succeeds
+        fresh = time.monotonic() - self._last_sync < self.sync_interval * self.stale_after
+        if fresh and jti not in self._filter:
+            return False
+        
+        try:
+            return bool(self.redis.exists(self.key_prefix + jti))
+        except Exception:
+            # Bloom hit or stale filter, and Redis unavailable: fail closed
+            logger.exception('Could not confirm revocation of %s', jti)
+            return True
+    
+    def _read_log(self, bloom, last_id, lock=None):
+        """Add stream entries after `last_id` to `bloom` in batches; returns the last ID read"""
+        while True:
+            entries = self.redis.xrange(self.log_key, min=f'({last_id}', count=self.sync_batch_size)
+            if not entries:
+                return last_id
+            with lock or nullcontext():
+                for entry_id, fields in entries:
+                    bloom.add(fields[b'jti'].decode())
+            last_id = entries[-1][0].decode()
+    
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._last_sync < self.sync_interval:
+            return
+        # Another thread is already syncing; the current filter still answers
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        
+        try:
+            if now - self._last_sync < self.sync_interval:
+                return
+            if now - self._built_at >= self.rebuild_interval:
+                # Bloom filters cannot forget; rebuild to drop expired JTIs.
+                # The new filter is filled on the side and only replaces the
+                # old one once the whole log has been read. Local revocations
+                # made meanwhile are in the log past `last_id`, so the next
+                # sync adds them.
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                last_id = self._read_log(bloom, '0-0')
+                with self._filter_lock:
+                    self._filter, self._last_id, self._built_at = bloom, last_id, now
+            else:
+                self._last_id = self._read_log(self._filter, self._last_id, self._filter_lock)
+            self._last_sync = now
+        except Exception:
+            logger.exception('Could not sync revoked token filter')
+        finally:
+            self._sync_lock.release()
+
+_config = getattr(settings, 'JWT_BLACKLIST', {})
+
+revoked_tokens = RevokedTokenStore(
+    capacity=_config.get('BLOOM_CAPACITY', 100000),
+    error_rate=_config.get('BLOOM_ERROR_RATE', 0.001),
+    sync_interval=_config.get('SYNC_INTERVAL', 1.0),
+    rebuild_interval=_config.get('REBUILD_INTERVAL', 3600),
+)
+
+class RedisBlacklistMixin:
+    """
+    Drop-in replacement for simplejwt's `BlacklistMixin` that keeps the
+    blacklist in Redis instead of the token_blacklist tables
+    """
+    
+    def verify(self, *args, **kwargs):
+        self.check_blacklist()
+        super().verify(*args, **kwargs)
+    
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if revoked_tokens.is_revoked(jti):
+            raise TokenError(_('Token is blacklisted'))
+    
+    def blacklist(self):
+        revoked_tokens.revoke(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+
+class RefreshToken(RedisBlacklistMixin, jwt_tokens.RefreshToken):
+    pass
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
@@ -0,0 +1,53 @@
+import hashlib
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams an upload straight to a temporary file (never into memory) and
+    computes its SHA-256 on the way through, exposed as `file.sha256`. Set
+    per view via `request.upload_handlers` (VerificationViewSet).
+    """
+    
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+    
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+    
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+# Extensions for the formats Pillow may detect; anything else is stored as .bin
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif', 'HEIF': 'heic', 'TIFF': 'tiff'}
+
+def file_sha256(uploaded_file):
+    """The upload's SHA-256; computed by HashingTemporaryFileUploadHandler or read here"""
+    digest = getattr(uploaded_file, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in uploaded_file.chunks():
+            hasher.update(chunk)
+        uploaded_file.seek(0)
+        digest = uploaded_file.sha256 = hasher.hexdigest()
+    return digest
+
+def image_extension(uploaded_file):
+    """Extension of the detected image format; the client's filename is not trusted"""
+    try:
+        image_format = Image.open(uploaded_file).format
+    except (OSError, Image.DecompressionBombError):
+        image_format = None
+    finally:
+        uploaded_file.seek(0)
+    return IMAGE_EXTENSIONS.get(image_format, 'bin')
+
+def content_name(uploaded_file, prefix):
+    """Storage path addressed by content hash, e.g. prefix/ab/cdef....jpg"""
+    digest = file_sha256(uploaded_file)
+    return f'{prefix}/{digest[:2]}/{digest}.{image_extension(uploaded_file)}'
@@ -0,0 +1,9 @@
+from django.urls import path
+from core.async_views import service_detail, service_list, service_nearby
+
+# Shadows the GET routes of core.urls.services when ASYNC_SERVICE_VIEWS is on
+urlpatterns = [
+    path('', service_list, name='service-list-async'),
+    path('nearby/', service_nearby, name='service-nearby-async'),
+    path('<uuid:pk>/', service_detail, name='service-detail-async'),
+]
@@ -0,0 +1,7 @@
+from rest_framework.routers import DefaultRouter
+from core.views import VerificationViewSet
+
+router = DefaultRouter()
+router.register('verification', VerificationViewSet, basename='verification')
+
+urlpatterns = router.urls
@@ -0,0 +1,190 @@
+import io
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from PIL import Image, ImageFilter, ImageOps, ImageStat
+
+from .models import IdentityDocument, User, VerificationJob
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = 'verification:queue'
+DOCUMENT_KINDS = [kind for kind, _ in IdentityDocument.KIND_CHOICES]
+
+@dataclass
+class CheckResult:
+    passed: bool
+    reason: str = ''
+
+def enqueue_verification(user):
+    """Create a job for the user's current documents and hand it to the worker"""
+    job = VerificationJob.objects.create(user=user)
+    get_redis_connection('default').lpush(QUEUE_KEY, str(job.id))
+    return job
+
+def normalize_document(name):
+    """
+    Decode, orient, downscale and re-encode one stored document.
+    
+    Runs in a worker process, so it only takes and returns plain values.
+    """
+    max_side = settings.VERIFICATION_MAX_SIDE
+    
+    with default_storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        original_size = image.size
+        # Let the decoder skip detail we are about to throw away
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    
+    image.thumbnail((max_side, max_side))
+    
+    gray = image.convert('L')
+    edges = gray.filter(ImageFilter.FIND_EDGES)
+    
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85, optimize=True)
+    
+    return {
+        'content': buffer.getvalue(),
+        'width': original_size[0],
+        'height': original_size[1],
+        'brightness': ImageStat.Stat(gray).mean[0],
+        'sharpness': ImageStat.Stat(edges).var[0],
+    }
+
+# Checks: callables taking (document, info) and returning a CheckResult.
+# `info` is the dict produced by normalize_document.
+
+def image_quality(document, info):
+    min_side = settings.VERIFICATION_MIN_SIDE
+    if min(info['width'], info['height']) < min_side:
+        return CheckResult(False, f'Image is smaller than {min_side}px')
+    if not 40 <= info['brightness'] <= 220:
+        return CheckResult(False, 'Image is too dark or too bright')
+    if info['sharpness'] < settings.VERIFICATION_MIN_SHARPNESS:
+        return CheckResult(False, 'Image is too blurry')
+    return CheckResult(True)
+
+def duplicate_hash(document, info):
+    reused = IdentityDocument.objects.filter(
+        sha256=document.sha256
+    ).exclude(user_id=document.user_id).exists()
+    if reused:
+        return CheckResult(False, 'Document already used by another account')
+    return CheckResult(True)
+
+class VerificationPipeline:
+    """
+    Normalizes a job's documents in a process pool, runs the configured
+    checks and records the outcome on the user.
+    """
+    
+    def __init__(self, executor=None):
+        self.executor = executor or ProcessPoolExecutor(
+            max_workers=settings.VERIFICATION_WORKER_PROCESSES
+        )
+        self.checks = [
+            (path.rsplit('.', 1)[-1], import_string(path))
+            for path in settings.VERIFICATION_CHECKS
+        ]
+    
+    @contextmanager
+    def stage(self, job, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            job.timings[name] = round((time.perf_counter() - started) * 1000, 2)
+    
+    def run(self, job_id):
+        """Process one job; returns it, or None if the job no longer exists"""
+        try:
+            job = VerificationJob.objects.select_related('user').get(id=job_id)
+        except (VerificationJob.DoesNotExist, ValidationError):
+            logger.warning('Verification job %s not found, skipping', job_id)
+            return None
+        job.status = 'running'
+        job.save(update_fields=['status'])
+        job.timings['queued'] = round((timezone.now() - job.created_at).total_seconds() * 1000, 2)
+        started = time.perf_counter()
+        
+        try:
+            with self.stage(job, 'load'):
+                documents = list(IdentityDocument.objects.filter(user=job.user))
+                missing = set(DOCUMENT_KINDS) - {d.kind for d in documents}
+            
+            if missing:
+                job.results['documents'] = {
+                    'passed': False,
+                    'reason': f"Missing {', '.join(sorted(missing))}",
+                }
+            else:
+                with self.stage(job, 'normalize'):
+                    futures = [
+                        self.executor.submit(normalize_document, getattr(job.user, d.kind).name)
+                        for d in documents
+                    ]
+                    infos = []
+                    for document, future in zip(documents, futures):
+                        try:
+                            infos.append(future.result())
+                        except (OSError, Image.DecompressionBombError):
+                            # Not an image, truncated, or too large to decode
+                            job.results[f'{document.kind}.readable'] = {
+                                'passed': False,
+                                'reason': 'File is not a readable image',
+                            }
+            
+            if not job.results:
+                with self.stage(job, 'store'):
+                    for document, info in zip(documents, infos):
+                        document.normalized.save(
+                            f'{document.sha256}.jpg',
+                            ContentFile(info.pop('content')),
+                            save=False,
+                        )
+                        document.width = info['width']
+                        document.height = info['height']
+                        document.save(update_fields=['normalized', 'width', 'height'])
+                
+                with self.stage(job, 'checks'):
+                    for document, info in zip(documents, infos):
+                        for check_name, check in self.checks:
+                            result = check(document, info)
+                            if not result.passed:
+                                job.results[f'{document.kind}.{check_name}'] = {
+                                    'passed': False,
+                                    'reason': result.reason,
+                                }
+            
+            passed = not job.results
+            # Documents removed since the job was queued leave the user pending
+            with self.stage(job, 'update_user'):
+                if not missing:
+                    fields = {'verification_status': 'verified' if passed else 'rejected'}
+                    # A rejection leaves any earlier (e.g. pincode) verification in place
+                    if passed:
+                        fields['is_verified'] = True
+                    User.objects.filter(id=job.user_id).update(**fields, updated_at=timezone.now())
+            job.status = 'completed'
+        except Exception:
+            logger.exception('Verification job %s failed', job.id)
+            job.status = 'failed'
+        
+        job.timings['total'] = round((time.perf_counter() - started) * 1000, 2)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'results', 'timings', 'finished_at'])
+        logger.info('Verification job %s %s in %sms %s', job.id, job.status,
+                    job.timings['total'], job.timings)
+        return job
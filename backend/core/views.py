@@ -3,21 +3,34 @@ from django.contrib.gis.db.models.functions import Distance
 from django.contrib.gis.measure import D
 from django.db.models import Q, Count, Avg
 from rest_framework import viewsets, status, permissions
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
 from .models import (
     User, PincodeBoundary, Service, Booking, 
-    Review, ChatRoom, Message
+    Review, ChatRoom, Message, IdentityDocument, VerificationJob
 )
 from .serializers import (
     UserSerializer, UserRegistrationSerializer, LoginSerializer,
     ServiceSerializer, BookingSerializer, ReviewSerializer,
     ChatRoomSerializer, MessageSerializer
 )
+from .conditional import conditional, detail_scope
 from .geospatial import is_within_pincode_boundary
+from .token_blacklist import RefreshToken
+from .uploads import HashingTemporaryFileUploadHandler, content_name, file_sha256
+from .verification import DOCUMENT_KINDS, enqueue_verification
+from .images import store_image
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django_redis import get_redis_connection
+from chat import announcements, inbox
+from chat.history import get_page
+from chat.presence import MAX_LOOKUP, get_presence
 import json
 
 class AuthViewSet(viewsets.ViewSet):
@@ -81,60 +94,191 @@ class AuthViewSet(viewsets.ViewSet):
         except Exception as e:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-class ServiceViewSet(viewsets.ModelViewSet):
-    serializer_class = ServiceSerializer
+class VerificationViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
     
-    def get_queryset(self):
-        queryset = Service.objects.filter(is_available=True)
+    def initialize_request(self, request, *args, **kwargs):
+        # Identity documents can be large scans: stream them to disk, hashing
+        # on the way, instead of buffering them in memory
+        request.upload_handlers = [HashingTemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+    
+    @action(detail=False, methods=['post'])
+    def documents(self, request):
+        """Upload identity documents and queue them for automated verification"""
+        user = request.user
+        files = {kind: request.FILES[kind] for kind in DOCUMENT_KINDS if kind in request.FILES}
+        if not files:
+            return Response(
+                {'error': f"Upload at least one of: {', '.join(DOCUMENT_KINDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Get user's location
-        user = self.request.user
-        if user.location:
-            # Filter by distance (1.5 km radius)
-            queryset = queryset.filter(
-                location__distance_lte=(user.location, D(km=1.5))
-            ).annotate(
-                distance=Distance('location', user.location)
-            ).order_by('distance')
-        
-        # Filter by pincode
-        pincode = self.request.query_params.get('pincode')
-        if pincode:
-            queryset = queryset.filter(pincode=pincode)
-        
-        # Filter by category
-        category = self.request.query_params.get('category')
-        if category:
-            queryset = queryset.filter(category_id=category)
-        
-        # Filter by service type
-        service_type = self.request.query_params.get('service_type')
-        if service_type:
-            queryset = queryset.filter(service_type=service_type)
-        
-        # Filter by price range
-        min_price = self.request.query_params.get('min_price')
-        max_price = self.request.query_params.get('max_price')
-        if min_price:
-            queryset = queryset.filter(price_per_hour__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price_per_hour__lte=max_price)
-        
-        # Search
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search)
+        for kind, uploaded in files.items():
+            # Content-addressed, so re-uploading the same file is a no-op
+            name = content_name(uploaded, 'verification')
+            if not default_storage.exists(name):
+                name = default_storage.save(name, uploaded)
+            setattr(user, kind, name)
+            IdentityDocument.objects.update_or_create(
+                user=user, kind=kind,
+                defaults={'sha256': file_sha256(uploaded), 'normalized': None}
             )
         
-        return queryset
+        on_file = set(IdentityDocument.objects.filter(user=user).values_list('kind', flat=True))
+        missing = [kind for kind in DOCUMENT_KINDS if kind not in on_file]
+        if missing:
+            # Documents may arrive one at a time; verify once the set is complete
+            user.save(update_fields=list(files))
+            return Response(
+                {'status': 'incomplete', 'missing': missing},
+                status=status.HTTP_202_ACCEPTED
+            )
+        
+        fields = list(files)
+        # A verified user stays verified until the new job decides otherwise
+        if user.verification_status != 'verified':
+            user.verification_status = 'pending'
+            fields.append('verification_status')
+        user.save(update_fields=fields)
+        
+        job = enqueue_verification(user)
+        return Response(
+            {'job_id': str(job.id), 'status': job.status},
+            status=status.HTTP_202_ACCEPTED
+        )
+    
+    @action(detail=False, methods=['get'])
+    def latest(self, request):
+        """Status of the user's most recent verification job"""
+        job = VerificationJob.objects.filter(user=request.user).order_by('-created_at').first()
+        if job is None:
+            return Response({'error': 'No verification submitted'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({
+            'job_id': str(job.id),
+            'status': job.status,
+            'verification_status': request.user.verification_status,
+            'results': job.results,
+            'timings': job.timings,
+        })
+
+def service_queryset(user, params):
+    """
+    Available services visible to `user`, filtered by query params. Shared
+    by ServiceViewSet and the async read paths in core/async_views.py.
+    """
+    queryset = Service.objects.filter(is_available=True)
+    
+    # Get user's location
+    if user.location:
+        # Filter by distance (1.5 km radius)
+        queryset = queryset.filter(
+            location__distance_lte=(user.location, D(km=1.5))
+        ).annotate(
+            distance=Distance('location', user.location)
+        ).order_by('distance')
+    
+    # Filter by pincode
+    pincode = params.get('pincode')
+    if pincode:
+        queryset = queryset.filter(pincode=pincode)
+    
+    # Filter by category
+    category = params.get('category')
+    if category:
+        queryset = queryset.filter(category_id=category)
+    
+    # Filter by service type
+    service_type = params.get('service_type')
+    if service_type:
+        queryset = queryset.filter(service_type=service_type)
+    
+    # Filter by price range
+    min_price = params.get('min_price')
+    max_price = params.get('max_price')
+    if min_price:
+        queryset = queryset.filter(price_per_hour__gte=min_price)
+    if max_price:
+        queryset = queryset.filter(price_per_hour__lte=max_price)
+    
+    # Search
+    search = params.get('search')
+    if search:
+        queryset = queryset.filter(
+            Q(title__icontains=search) |
+            Q(description__icontains=search)
+        )
+    
+    return queryset
+
+def nearby_queryset(location):
+    """Available services within 1.5 km of `location`, closest first"""
+    return Service.objects.filter(
+        location__distance_lte=(location, D(km=1.5)),
+        is_available=True
+    ).annotate(
+        distance=Distance('location', location)
+    ).order_by('distance')
+
+def user_rooms(user):
+    return ChatRoom.objects.filter(Q(user1=user) | Q(user2=user))
+
+class ServiceViewSet(viewsets.ModelViewSet):
+    serializer_class = ServiceSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return service_queryset(self.request.user, self.request.query_params)
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['image_variant'] = 'full' if self.action == 'retrieve' else 'card'
+        return context
+    
+    @conditional(related=['provider'])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @conditional(scope=detail_scope, related=['provider'])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
     
     def perform_create(self, serializer):
         serializer.save(provider=self.request.user)
     
+    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser])
+    def images(self, request, pk=None):
+        """Upload listing photos; derivatives are generated in the background"""
+        service = self.get_object()
+        
+        if service.provider != request.user:
+            return Response(
+                {'error': 'Only service provider can add images'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        uploads = request.FILES.getlist('images')
+        if not uploads:
+            return Response(
+                {'error': 'No images uploaded'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        for uploaded in uploads:
+            asset = store_image(uploaded)
+            if asset.sha256 not in service.images:
+                service.images.append(asset.sha256)
+        service.save(update_fields=['images', 'updated_at'])
+        
+        return Response(self.get_serializer(service).data, status=status.HTTP_201_CREATED)
+    
     @action(detail=False, methods=['get'])
+    @conditional(
+        scope=lambda view: nearby_queryset(view.request.user.location) if view.request.user.location else None,
+        related=['provider'],
+    )
     def nearby(self, request):
         """Get services within 1.5 km radius"""
         if not request.user.location:
@@ -143,12 +287,7 @@ class ServiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        queryset = Service.objects.filter(
-            location__distance_lte=(request.user.location, D(km=1.5)),
-            is_available=True
-        ).annotate(
-            distance=Distance('location', request.user.location)
-        ).order_by('distance')
+        queryset = nearby_queryset(request.user.location)
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -211,6 +350,11 @@ class BookingViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['image_variant'] = 'thumbnail'
+        return context
+    
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
         """Confirm a booking"""
@@ -294,15 +438,102 @@ class ChatViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     
     @action(detail=False, methods=['get'])
+    @conditional(scope=lambda view: user_rooms(view.request.user), related=['user1', 'user2'])
     def rooms(self, request):
         """Get all chat rooms for user"""
-        rooms = ChatRoom.objects.filter(
-            Q(user1=request.user) | Q(user2=request.user)
-        ).select_related('user1', 'user2').order_by('-last_message_time')
+        rooms = user_rooms(request.user).select_related('user1', 'user2').order_by('-last_message_time')
         
         serializer = ChatRoomSerializer(rooms, many=True, context={'request': request})
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def inbox(self, request):
+        """Compact room list by latest activity, paged with ?cursor="""
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+            entries, next_cursor = inbox.get_page(
+                get_redis_connection('default'), request.user,
+                request.query_params.get('cursor'), limit
+            )
+        except ValueError:
+            return Response(
+                {'error': 'Invalid cursor or limit'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({'results': entries, 'next_cursor': next_cursor})
+    
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """Message history, newest first, paged backwards with ?cursor="""
+        try:
+            is_participant = ChatRoom.objects.filter(
+                Q(user1=request.user) | Q(user2=request.user), id=pk
+            ).exists()
+        except DjangoValidationError:
+            is_participant = False
+        
+        if not is_participant:
+            return Response(
+                {'error': 'Chat room not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+            messages, next_cursor = get_page(pk, request.query_params.get('cursor'), limit)
+        except (ValueError, DjangoValidationError):
+            return Response(
+                {'error': 'Invalid cursor or limit'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({'results': messages, 'next_cursor': next_cursor})
+    
+    @action(detail=False, methods=['get'])
+    def presence(self, request):
+        """Online status for ?user_ids=<id>,<id>,... in one Redis round-trip"""
+        user_ids = [u for u in request.query_params.get('user_ids', '').split(',') if u][:MAX_LOOKUP]
+        return Response(get_presence(get_redis_connection('default'), user_ids))
+    
+    @action(detail=False, methods=['get', 'post'])
+    def announcements(self, request):
+        """Announcements for the user's pincode: GET the backlog (?since=<id>), POST a new one"""
+        pincode = request.user.current_pincode
+        if not pincode:
+            return Response(
+                {'error': 'Set your pincode to use announcements'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        redis = get_redis_connection('default')
+        if request.method == 'GET':
+            return Response(announcements.backlog(redis, pincode, request.query_params.get('since')))
+        
+        kind = request.data.get('kind', 'notice')
+        text = (request.data.get('text') or '').strip()
+        if kind not in announcements.KINDS or not text:
+            return Response(
+                {'error': f"text is required and kind must be one of {', '.join(announcements.KINDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        announcement = announcements.publish(
+            redis, request.user, pincode,
+            announcements.build(request.user, kind, text, request.data.get('service_id'))
+        )
+        if announcement is None:
+            return Response(
+                {'error': 'Too many announcements, try again later'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        
+        async_to_sync(get_channel_layer().group_send)(
+            announcements.group_name(pincode),
+            {'type': 'pincode_announcement', 'announcement': announcement}
+        )
+        return Response(announcement, status=status.HTTP_201_CREATED)
+    
     @action(detail=False, methods=['post'])
     def start_chat(self, request):
         """Start a new chat with another user"""
@@ -330,5 +561,17 @@ class ChatViewSet(viewsets.ViewSet):
             user2=max(request.user, other_user, key=lambda u: u.id)
         )
         
+        if created:
+            # The room has no messages yet, so no pushed update would add it
+            inbox.invalidate(get_redis_connection('default'), request.user.id, other_user.id)
+            
+            # Let both users' multiplexed sockets subscribe to the new room
+            channel_layer = get_channel_layer()
+            for user in (request.user, other_user):
+                async_to_sync(channel_layer.group_send)(
+                    f'user_{user.id}',
+                    {'type': 'room_added', 'room_id': str(room.id)}
+                )
+        
         serializer = ChatRoomSerializer(room, context={'request': request})
         return Response(serializer.data)
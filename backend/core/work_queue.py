@@ -0,0 +1,99 @@
+import os
+import socket
+import threading
+import uuid
+
+class WorkQueue:
+    """
+    Consumer side of a Redis list queue for background workers.
+    
+    Each worker moves the items it takes into its own processing list and
+    keeps a heartbeat key alive from a background thread. A worker whose
+    heartbeat has expired is dead; any worker may then push that worker's
+    processing list back onto the queue. Live workers' items are never
+    touched, so running several workers does not process anything twice.
+    """
+    
+    heartbeat_ttl = 30  # Seconds without a heartbeat before a worker counts as dead
+    
+    def __init__(self, redis, queue_key, prefix):
+        self.redis = redis
+        self.queue_key = queue_key
+        self.prefix = prefix
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.workers_key = f'{prefix}:workers'
+        self.processing_key = self.processing_key_for(self.worker_id)
+        self.attempts_key = f'{prefix}:attempts'
+        self.dead_key = f'{prefix}:dead'
+        self._stopped = threading.Event()
+    
+    def processing_key_for(self, worker_id):
+        return f'{self.prefix}:processing:{worker_id}'
+    
+    def heartbeat_key_for(self, worker_id):
+        return f'{self.prefix}:heartbeat:{worker_id}'
+    
+    def start(self):
+        """Register this worker, start its heartbeat and recover items of dead workers"""
+        self.beat()
+        self.redis.sadd(self.workers_key, self.worker_id)
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+        return self.reclaim()
+    
+    def stop(self):
+        self._stopped.set()
+        self.redis.delete(self.heartbeat_key_for(self.worker_id))
+        self.redis.srem(self.workers_key, self.worker_id)
+    
+    def beat(self):
+        self.redis.set(self.heartbeat_key_for(self.worker_id), 1, ex=self.heartbeat_ttl)
+    
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self.heartbeat_ttl / 3):
+            try:
+                self.beat()
+            except Exception:
+                # The next beat retries; a long outage just makes this worker look dead
+                pass
+    
+    def reclaim(self):
+        """Requeue the processing lists of dead workers; returns how many items moved"""
+        moved = 0
+        for member in self.redis.smembers(self.workers_key):
+            worker_id = member.decode()
+            if worker_id == self.worker_id or self.redis.exists(self.heartbeat_key_for(worker_id)):
+                continue
+            while self.redis.rpoplpush(self.processing_key_for(worker_id), self.queue_key):
+                moved += 1
+            self.redis.srem(self.workers_key, worker_id)
+        return moved
+    
+    def pop(self, timeout):
+        """Block for the next item, or None after `timeout` seconds"""
+        return self.redis.brpoplpush(self.queue_key, self.processing_key, timeout=timeout)
+    
+    def pop_nowait(self):
+        return self.redis.rpoplpush(self.queue_key, self.processing_key)
+    
+    def ack(self, item):
+        pipe = self.redis.pipeline()
+        pipe.lrem(self.processing_key, 1, item)
+        pipe.hdel(self.attempts_key, item)
+        pipe.execute()
+    
+    def retry(self, item, max_attempts):
+        """
+        Put a failed item back on the queue, or on the dead-letter list once
+        it has failed `max_attempts` times. Returns True if dead-lettered.
+        """
+        attempts = self.redis.hincrby(self.attempts_key, item, 1)
+        dead = attempts >= max_attempts
+        pipe = self.redis.pipeline()
+        pipe.lrem(self.processing_key, 1, item)
+        if dead:
+            pipe.hdel(self.attempts_key, item)
+            pipe.lpush(self.dead_key, item)
+        else:
+            pipe.lpush(self.queue_key, item)
+        pipe.execute()
+        return dead
@@ -0,0 +1,277 @@
+import asyncio
+import functools
+import hashlib
+import hmac
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+from django.conf import settings
+
+class GatewayError(Exception):
+    pass
+
+class GatewayUnavailable(GatewayError):
+    """Timeouts, 5xx after retries, or the circuit breaker is open"""
+
+class GatewayRequestError(GatewayError):
+    """The gateway rejected the request (4xx); retrying will not help"""
+    
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+        error = payload.get('error', {}) if isinstance(payload, dict) else {}
+        super().__init__(error.get('description') or f'Gateway returned {status_code}')
+
+class CircuitBreaker:
+    """
+    Fails fast after `threshold` consecutive gateway failures. After
+    `reset_timeout` seconds one trial call is let through (half-open); its
+    outcome closes the circuit again or restarts the timeout.
+    """
+    
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """False while open; 'trial' for the one half-open call, which must release_trial()"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return 'trial'
+    
+    def release_trial(self):
+        # For trials ending without an outcome, e.g. cancelled
+        with self._lock:
+            self._trial_running = False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+    
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+# 429 and 503 mean the request was not processed, so even POSTs may retry
+NOT_PROCESSED = {429, 503}
+
+class BaseGateway:
+    """
+    Request policy shared by the sync and async Razorpay clients.
+    
+    GETs are retried on timeouts and 5xx. POSTs (orders, refunds) are only
+    retried when the gateway certainly did not act on them: connection
+    failures before the request was sent, 429 and 503. Delays use full
+    jitter exponential backoff.
+    """
+    
+    def __init__(self, base_url=None, key_id=None, key_secret=None, breaker=None):
+        self.base_url = (base_url or settings.RAZORPAY_API_URL).rstrip('/')
+        self.key_id = key_id if key_id is not None else settings.RAZORPAY_KEY_ID
+        self.key_secret = key_secret if key_secret is not None else settings.RAZORPAY_KEY_SECRET
+        self.max_retries = settings.RAZORPAY_MAX_RETRIES
+        self.breaker = breaker or CircuitBreaker(
+            settings.RAZORPAY_BREAKER_THRESHOLD, settings.RAZORPAY_BREAKER_RESET
+        )
+    
+    def _client_options(self):
+        return {
+            'base_url': self.base_url,
+            'auth': (self.key_id, self.key_secret),
+            'timeout': httpx.Timeout(
+                settings.RAZORPAY_READ_TIMEOUT, connect=settings.RAZORPAY_CONNECT_TIMEOUT
+            ),
+            'limits': httpx.Limits(
+                max_connections=settings.RAZORPAY_POOL_SIZE,
+                max_keepalive_connections=settings.RAZORPAY_POOL_SIZE,
+            ),
+        }
+    
+    def _delay(self, attempt):
+        return random.uniform(0, min(settings.RAZORPAY_BACKOFF_MAX, settings.RAZORPAY_BACKOFF_BASE * 2 ** attempt))
+    
+    def _retryable_error(self, method, error):
+        if isinstance(error, httpx.ConnectError):
+            return True
+        return method == 'GET' and isinstance(error, httpx.TransportError)
+    
+    def _retryable_status(self, method, status_code):
+        return status_code in NOT_PROCESSED or (method == 'GET' and status_code >= 500)
+    
+    def _result(self, response):
+        """Parsed body, or None if the response should be treated as a failure"""
+        if response.status_code >= 500 or response.status_code == 429:
+            return None
+        if response.status_code >= 400:
+            # The gateway is healthy, the request was bad
+            self.breaker.record_success()
+            try:
+                payload = response.json()
+            except ValueError:
+                payload = {}
+            raise GatewayRequestError(response.status_code, payload)
+        payload = response.json()
+        self.breaker.record_success()
+        return payload
+    
+    @contextmanager
+    def _guarded(self):
+        """
+        Breaker bookkeeping around one request(): fails fast while open,
+        counts any unexpected exception as a failure, and always ends a
+        half-open trial, even when the call is cancelled.
+        """
+        allowed = self.breaker.allow()
+        if not allowed:
+            raise GatewayUnavailable('Payment gateway circuit is open')
+        try:
+            yield
+        except GatewayError:
+            raise  # Already recorded
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            if allowed == 'trial':
+                self.breaker.release_trial()
+    
+    def verify_signature(self, message, signature, secret=None):
+        """HMAC-SHA256 check of `message`, str or the exact bytes that were signed"""
+        if isinstance(message, str):
+            message = message.encode()
+        expected = hmac.new(
+            (secret or self.key_secret).encode(), message, hashlib.sha256
+        ).hexdigest()
+        return hmac.compare_digest(expected, signature or '')
+    
+    def verify_payment_signature(self, order_id, payment_id, signature):
+        return self.verify_signature(f'{order_id}|{payment_id}', signature)
+
+class RazorpayGateway(BaseGateway):
+    """Blocking client over one pooled keep-alive httpx.Client"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = httpx.Client(**self._client_options())
+    
+    def request(self, method, path, **kwargs):
+        with self._guarded():
+            for attempt in range(self.max_retries + 1):
+                last = attempt == self.max_retries
+                try:
+                    response = self.client.request(method, path, **kwargs)
+                except httpx.TransportError as e:
+                    if last or not self._retryable_error(method, e):
+                        self.breaker.record_failure()
+                        raise GatewayUnavailable(f'Payment gateway unreachable: {e}') from e
+                else:
+                    result = self._result(response)
+                    if result is not None:
+                        return result
+                    if last or not self._retryable_status(method, response.status_code):
+                        self.breaker.record_failure()
+                        raise GatewayUnavailable(f'Payment gateway returned {response.status_code}')
+                time.sleep(self._delay(attempt))
+    
+    def create_order(self, data):
+        return self.request('POST', '/orders', json=data)
+    
+    def fetch_order(self, order_id):
+        return self.request('GET', f'/orders/{order_id}')
+    
+    def refund(self, payment_id, data):
+        return self.request('POST', f'/payments/{payment_id}/refund', json=data)
+    
+    def fetch_payment(self, payment_id):
+        return self.request('GET', f'/payments/{payment_id}')
+    
+    def list_payments(self, **params):
+        return self.request('GET', '/payments', params=params)
+    
+    def close(self):
+        self.client.close()
+
+class AsyncRazorpayGateway(BaseGateway):
+    """Same API for ASGI code paths; must be used from a single event loop"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = httpx.AsyncClient(**self._client_options())
+    
+    async def request(self, method, path, **kwargs):
+        with self._guarded():
+            for attempt in range(self.max_retries + 1):
+                last = attempt == self.max_retries
+                try:
+                    response = await self.client.request(method, path, **kwargs)
+                except httpx.TransportError as e:
+                    if last or not self._retryable_error(method, e):
+                        self.breaker.record_failure()
+                        raise GatewayUnavailable(f'Payment gateway unreachable: {e}') from e
+                else:
+                    result = self._result(response)
+                    if result is not None:
+                        return result
+                    if last or not self._retryable_status(method, response.status_code):
+                        self.breaker.record_failure()
+                        raise GatewayUnavailable(f'Payment gateway returned {response.status_code}')
+                await asyncio.sleep(self._delay(attempt))
+    
+    async def create_order(self, data):
+        return await self.request('POST', '/orders', json=data)
+    
+    async def fetch_order(self, order_id):
+        return await self.request('GET', f'/orders/{order_id}')
+    
+    async def refund(self, payment_id, data):
+        return await self.request('POST', f'/payments/{payment_id}/refund', json=data)
+    
+    async def fetch_payment(self, payment_id):
+        return await self.request('GET', f'/payments/{payment_id}')
+    
+    async def list_payments(self, **params):
+        return await self.request('GET', '/payments', params=params)
+    
+    async def close(self):
+        await self.client.aclose()
+
+@functools.lru_cache(maxsize=None)
+def get_gateway():
+    """Process-wide client, so keep-alive connections are reused across requests"""
+    return RazorpayGateway()
+
+_async_gateways = {}
+
+def get_async_gateway():
+    """
+    One async client per event loop (httpx.AsyncClient is loop-bound); all
+    of them share the process's circuit breaker.
+    """
+    loop = asyncio.get_running_loop()
+    gateway = _async_gateways.get(loop)
+    if gateway is None:
+        gateway = AsyncRazorpayGateway(breaker=get_gateway().breaker)
+        _async_gateways[loop] = gateway
+    return gateway
@@ -0,0 +1,86 @@
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+from rest_framework.response import Response
+
+RESPONSE_KEY = 'payments:idempotency:{user_id}:{key}'
+LOCK_KEY = 'payments:lock:booking:{booking_id}'
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    raw = f'{request.method}|{request.path}|{body}'
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _replay(cached, current_fingerprint):
+    if cached['fingerprint'] != current_fingerprint:
+        return Response(
+            {'error': 'Idempotency-Key was already used for a different request'},
+            status=422
+        )
+    return Response(cached['body'], status=cached['status'], headers={'Idempotent-Replayed': 'true'})
+
+def idempotent(view):
+    """
+    Idempotency-Key support and per-booking serialization for payment views.
+    
+    Requests for the same booking run one at a time under a Redis lock, so
+    a retry racing the original cannot reach the gateway twice. When the
+    client sends an Idempotency-Key, the first non-5xx response is stored
+    with a fingerprint of the request for PAYMENT_IDEMPOTENCY_TTL seconds,
+    and retries with the same key get it back without running the view.
+    5xx responses are not stored, so those retries go through.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        redis = get_redis_connection('default')
+        key = request.headers.get('Idempotency-Key')
+        if key is not None and not 0 < len(key) <= 255:
+            return Response({'error': 'Invalid Idempotency-Key'}, status=400)
+        booking_id = request.data.get('booking_id')
+        if booking_id in (None, ''):
+            # Would otherwise share one lock across every request without a booking
+            return Response({'error': 'booking_id is required'}, status=400)
+        
+        response_key = RESPONSE_KEY.format(user_id=request.user.id, key=key) if key else None
+        current = fingerprint(request) if key else None
+        if response_key:
+            cached = redis.get(response_key)
+            if cached:
+                return _replay(json.loads(cached), current)
+        
+        lock = redis.lock(
+            LOCK_KEY.format(booking_id=booking_id),
+            timeout=settings.PAYMENT_LOCK_TIMEOUT,
+            blocking_timeout=settings.PAYMENT_LOCK_WAIT,
+        )
+        if not lock.acquire():
+            return Response(
+                {'error': 'Another payment request for this booking is in progress'},
+                status=409
+            )
+        try:
+            if response_key:
+                # The request we waited on may have been the same retry
+                cached = redis.get(response_key)
+                if cached:
+                    return _replay(json.loads(cached), current)
+            
+            response = view(request, *args, **kwargs)
+            if response_key and response.status_code < 500:
+                redis.set(response_key, json.dumps({
+                    'fingerprint': current,
+                    'status': response.status_code,
+                    'body': response.data,
+                }, default=str), ex=settings.PAYMENT_IDEMPOTENCY_TTL)
+            return response
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # Expired during a very slow request; nothing left to release
+                pass
+    return wrapper
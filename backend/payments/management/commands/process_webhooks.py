@@ -0,0 +1,31 @@
+import os
+import socket
+
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from payments.webhooks import WebhookProcessor
+
+class Command(BaseCommand):
+    help = 'Apply queued Razorpay webhook events to bookings in batches'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--name', default=f'{socket.gethostname()}-{os.getpid()}',
+                            help='Consumer name; reuse it across restarts to resume pending work')
+    
+    def handle(self, *args, **options):
+        processor = WebhookProcessor(
+            get_redis_connection('default'),
+            consumer_name=options['name'],
+            batch_size=options['batch_size'],
+        )
+        processor.ensure_group()
+        
+        recovered = processor.recover()
+        self.stdout.write(f'Recovered pending events, {recovered} bookings updated')
+        
+        while True:
+            changed = processor.poll()
+            if changed:
+                self.stdout.write(f'Updated {changed} bookings')
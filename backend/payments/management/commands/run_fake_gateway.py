@@ -0,0 +1,161 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+
+class FakeRazorpay:
+    """In-memory subset of the Razorpay v1 API: orders, payments and refunds"""
+    
+    def __init__(self):
+        self.orders = {}
+        self.payments = {}
+        self.lock = threading.Lock()
+    
+    def _id(self, prefix):
+        return f'{prefix}_{uuid.uuid4().hex[:14]}'
+    
+    def create_order(self, body):
+        order = {
+            'id': self._id('order'),
+            'entity': 'order',
+            'amount': body['amount'],
+            'currency': body.get('currency', 'INR'),
+            'receipt': body.get('receipt'),
+            'notes': body.get('notes', {}),
+            'status': 'created',
+            'created_at': int(time.time()),
+        }
+        with self.lock:
+            self.orders[order['id']] = order
+        return 200, order
+    
+    def pay(self, body):
+        """Test hook: capture (or fail) a payment for an order"""
+        with self.lock:
+            order = self.orders.get(body.get('order_id'))
+            if order is None:
+                return 404, {'error': {'description': 'Order not found'}}
+            payment = {
+                'id': self._id('pay'),
+                'entity': 'payment',
+                'order_id': order['id'],
+                'amount': order['amount'],
+                'amount_refunded': 0,
+                'currency': order['currency'],
+                'status': body.get('status', 'captured'),
+                'notes': order['notes'],
+                'created_at': int(time.time()),
+            }
+            order['status'] = 'paid' if payment['status'] == 'captured' else 'attempted'
+            self.payments[payment['id']] = payment
+        return 200, payment
+    
+    def refund(self, payment_id, body):
+        with self.lock:
+            payment = self.payments.get(payment_id)
+            if payment is None:
+                return 400, {'error': {'description': 'The id provided does not exist'}}
+            amount = body.get('amount', payment['amount'] - payment['amount_refunded'])
+            if payment['amount_refunded'] + amount > payment['amount']:
+                return 400, {'error': {'description': 'The refund amount exceeds the captured amount'}}
+            payment['amount_refunded'] += amount
+            payment['status'] = 'refunded'
+        return 200, {
+            'id': self._id('rfnd'),
+            'entity': 'refund',
+            'payment_id': payment_id,
+            'amount': amount,
+            'notes': body.get('notes', {}),
+            'created_at': int(time.time()),
+        }
+    
+    def list_payments(self, query):
+        start = int(query.get('from', [0])[0])
+        end = int(query.get('to', [2 ** 31])[0])
+        count = min(int(query.get('count', [10])[0]), 100)
+        skip = int(query.get('skip', [0])[0])
+        with self.lock:
+            # Newest first, like the real API
+            items = sorted(
+                (p for p in self.payments.values() if start <= p['created_at'] <= end),
+                key=lambda p: p['created_at'], reverse=True
+            )[skip:skip + count]
+        return 200, {'entity': 'collection', 'count': len(items), 'items': items}
+
+class Command(BaseCommand):
+    help = (
+        'Run a local fake Razorpay API for tests and load runs. Point '
+        'RAZORPAY_API_URL at http://<host>:<port>/v1'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=9010)
+        parser.add_argument('--latency-ms', type=float, default=50.0,
+                            help='Mean added latency per request')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of requests answered with 503')
+    
+    def handle(self, *args, **options):
+        gateway = FakeRazorpay()
+        latency = options['latency_ms'] / 1000
+        error_rate = options['error_rate']
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real gateway
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def respond(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def dispatch(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                
+                time.sleep(random.expovariate(1 / latency) if latency else 0)
+                if random.random() < error_rate:
+                    return self.respond(503, {'error': {'description': 'Service unavailable'}})
+                
+                url = urlparse(self.path)
+                if method == 'POST' and url.path == '/v1/orders':
+                    return self.respond(*gateway.create_order(body))
+                if method == 'POST' and url.path == '/v1/_fake/pay':
+                    return self.respond(*gateway.pay(body))
+                refund = re.fullmatch(r'/v1/payments/([^/]+)/refund', url.path)
+                if method == 'POST' and refund:
+                    return self.respond(*gateway.refund(refund.group(1), body))
+                if method == 'GET' and url.path == '/v1/payments':
+                    return self.respond(*gateway.list_payments(parse_qs(url.query)))
+                order = re.fullmatch(r'/v1/orders/([^/]+)', url.path)
+                if method == 'GET' and order and order.group(1) in gateway.orders:
+                    return self.respond(200, gateway.orders[order.group(1)])
+                payment = re.fullmatch(r'/v1/payments/([^/]+)', url.path)
+                if method == 'GET' and payment and payment.group(1) in gateway.payments:
+                    return self.respond(200, gateway.payments[payment.group(1)])
+                self.respond(404, {'error': {'description': 'Not found'}})
+            
+            def do_GET(self):
+                self.dispatch('GET')
+            
+            def do_POST(self):
+                self.dispatch('POST')
+        
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        self.stdout.write(f"Fake gateway on http://{options['host']}:{options['port']}/v1")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -1,19 +1,25 @@
-import razorpay
 from django.conf import settings
-from django.http import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from core.models import Booking
-import uuid
+from .gateway import GatewayRequestError, GatewayUnavailable, get_gateway
+from .idempotency import idempotent
 
-# Initialize Razorpay client
-client = razorpay.Client(
-    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-)
+def gateway_error_response(error):
+    if isinstance(error, GatewayUnavailable):
+        return Response(
+            {'error': 'Payment gateway is unavailable, please retry shortly'},
+            status=503
+        )
+    return Response(
+        {'error': str(error)},
+        status=502
+    )
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_order(request):
     """
     Create a Razorpay order for booking payment
@@ -24,9 +30,32 @@ def create_order(request):
     try:
         booking = Booking.objects.get(id=booking_id, user=request.user)
         
+        if booking.payment_status in ('paid', 'refunded'):
+            return Response(
+                {'error': 'Booking is already paid'},
+                status=400
+            )
+        
+        amount_paise = int(float(amount) * 100)  # Convert to paise
+        if booking.razorpay_order_id:
+            # Reuse the booking's open order instead of creating another one
+            try:
+                order = get_gateway().fetch_order(booking.razorpay_order_id)
+            except GatewayRequestError as e:
+                if e.status_code != 404:
+                    raise
+                order = None  # Unknown to the gateway; create a new one below
+            if order and order['amount'] == amount_paise and order['status'] != 'paid':
+                return Response({
+                    'order_id': order['id'],
+                    'amount': order['amount'],
+                    'currency': order['currency'],
+                    'key': settings.RAZORPAY_KEY_ID,
+                })
+        
         # Create order data
         order_data = {
-            'amount': int(float(amount) * 100),  # Convert to paise
+            'amount': amount_paise,
             'currency': 'INR',
             'receipt': f'booking_{booking_id}',
             'payment_capture': 1,
@@ -37,7 +66,7 @@ def create_order(request):
         }
         
         # Create Razorpay order
-        order = client.order.create(data=order_data)
+        order = get_gateway().create_order(order_data)
         
         # Update booking with order ID
         booking.razorpay_order_id = order['id']
@@ -55,6 +84,8 @@ def create_order(request):
             {'error': 'Booking not found'},
             status=404
         )
+    except (GatewayUnavailable, GatewayRequestError) as e:
+        return gateway_error_response(e)
     except Exception as e:
         return Response(
             {'error': str(e)},
@@ -77,14 +108,14 @@ def verify_payment(request):
             user=request.user
         )
         
-        # Verify signature
-        params_dict = {
-            'razorpay_order_id': razorpay_order_id,
-            'razorpay_payment_id': razorpay_payment_id,
-            'razorpay_signature': razorpay_signature
-        }
-        
-        client.utility.verify_payment_signature(params_dict)
+        # Verify signature (local HMAC check, no gateway round-trip)
+        if not get_gateway().verify_payment_signature(
+            razorpay_order_id, razorpay_payment_id, razorpay_signature
+        ):
+            return Response(
+                {'error': 'Invalid payment signature'},
+                status=400
+            )
         
         # Update booking payment status
         booking.razorpay_payment_id = razorpay_payment_id
@@ -101,11 +132,6 @@ def verify_payment(request):
             {'error': 'Booking not found'},
             status=404
         )
-    except razorpay.errors.SignatureVerificationError:
-        return Response(
-            {'error': 'Invalid payment signature'},
-            status=400
-        )
     except Exception as e:
         return Response(
             {'error': str(e)},
@@ -114,6 +140,7 @@ def verify_payment(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def initiate_refund(request):
     """
     Initiate refund for a booking
@@ -138,6 +165,12 @@ def initiate_refund(request):
                 status=400
             )
         
+        if booking.payment_status == 'refunded':
+            return Response(
+                {'error': 'Booking is already refunded'},
+                status=400
+            )
+        
         # Create refund data
         refund_data = {
             'payment_id': booking.razorpay_payment_id,
@@ -149,7 +182,7 @@ def initiate_refund(request):
         }
         
         # Create refund
-        refund = client.payment.refund(**refund_data)
+        refund = get_gateway().refund(refund_data.pop('payment_id'), refund_data)
         
         # Update booking
         booking.payment_status = 'refunded'
@@ -167,6 +200,8 @@ def initiate_refund(request):
             {'error': 'Booking not found'},
             status=404
         )
+    except (GatewayUnavailable, GatewayRequestError) as e:
+        return gateway_error_response(e)
     except Exception as e:
         return Response(
             {'error': str(e)},
@@ -0,0 +1,182 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Booking
+from .webhooks import STATUS_RANK
+
+# Session-local table holding the corrections a dry run would have written
+DRY_RUN_TABLE = 'reconcile_dry_run'
+
+# Gateway payment status -> the booking payment_status it implies
+PAYMENT_STATUS = {
+    'captured': 'paid',
+    'failed': 'failed',
+    'refunded': 'refunded',
+}
+
+def iter_payments(gateway, start, end, page_size=100):
+    """
+    Gateway payments created in [start, end], one page at a time. Only the
+    current page is held in memory.
+    """
+    skip = 0
+    while True:
+        page = gateway.list_payments(
+            **{'from': int(start.timestamp()), 'to': int(end.timestamp()), 'count': page_size, 'skip': skip}
+        )['items']
+        yield page
+        if len(page) < page_size:
+            return
+        skip += page_size
+
+def iter_chunks(pages, chunk_size):
+    chunk = []
+    for page in pages:
+        chunk.extend(page)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class Reconciler:
+    """
+    Matches gateway payments to bookings chunk by chunk and corrects
+    bookings whose payment_status lags the gateway.
+    
+    Each chunk costs one query on the razorpay_order_id index and at most
+    one bulk UPDATE. Corrections only move a status forward (the same rule
+    webhooks follow); a booking that is ahead of the gateway is reported,
+    never downgraded. Discrepancies go to `report(kind, **details)` as they
+    are found, so nothing accumulates across chunks. A dry run leaves
+    bookings alone and writes the corrections it would have made to a
+    temporary table instead, which later chunks read bookings through.
+    """
+    
+    def __init__(self, report, dry_run=False):
+        self.report = report
+        self.dry_run = dry_run
+        self.stats = Counter()
+    
+    def run(self, payments, chunk_size=1000):
+        if not self.dry_run:
+            for chunk in iter_chunks(payments, chunk_size):
+                self.reconcile(chunk)
+            return self.stats
+        
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {DRY_RUN_TABLE} ('
+                'booking_id uuid PRIMARY KEY, payment_status varchar(20), razorpay_payment_id varchar(100))'
+            )
+        try:
+            for chunk in iter_chunks(payments, chunk_size):
+                self.reconcile(chunk)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {DRY_RUN_TABLE}')
+        return self.stats
+    
+    def _apply_dry_run(self, bookings):
+        """Overlay corrections earlier dry-run chunks would have written"""
+        by_id = {b.id: b for b in bookings}
+        if not by_id:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT booking_id, payment_status, razorpay_payment_id FROM {DRY_RUN_TABLE} '
+                'WHERE booking_id = ANY(%s)',
+                [list(by_id)]
+            )
+            for booking_id, payment_status, payment_id in cursor.fetchall():
+                booking = by_id[booking_id]
+                booking.payment_status, booking.razorpay_payment_id = payment_status, payment_id
+    
+    def _record_dry_run(self, changed):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {DRY_RUN_TABLE} VALUES (%s, %s, %s) ON CONFLICT (booking_id) '
+                'DO UPDATE SET payment_status = EXCLUDED.payment_status, '
+                'razorpay_payment_id = EXCLUDED.razorpay_payment_id',
+                [(b.id, b.payment_status, b.razorpay_payment_id) for b in changed]
+            )
+    
+    def reconcile(self, payments):
+        self.stats['payments'] += len(payments)
+        order_ids = {p['order_id'] for p in payments if p.get('order_id')}
+        
+        with transaction.atomic():
+            queryset = Booking.objects.filter(razorpay_order_id__in=order_ids).only(
+                'id', 'payment_status', 'razorpay_order_id', 'razorpay_payment_id', 'total_amount'
+            )
+            if not self.dry_run:
+                queryset = queryset.select_for_update()
+            bookings = {b.razorpay_order_id: b for b in queryset}
+            if self.dry_run:
+                self._apply_dry_run(bookings.values())
+            
+            changed = {}
+            for payment in payments:
+                booking = bookings.get(payment.get('order_id'))
+                if booking is None:
+                    self.stats['unmatched'] += 1
+                    self.report(
+                        'unknown_order', payment_id=payment['id'], order_id=payment.get('order_id'),
+                        gateway_status=payment['status']
+                    )
+                    continue
+                self.stats['matched'] += 1
+                
+                expected = PAYMENT_STATUS.get(payment['status'])
+                if expected == 'paid' and payment.get('amount_refunded'):
+                    expected = 'refunded'
+                if payment['status'] == 'captured' and payment['amount'] != int(booking.total_amount * 100):
+                    self.report(
+                        'amount_mismatch', booking_id=booking.id, payment_id=payment['id'],
+                        gateway_amount=payment['amount'], booking_amount=int(booking.total_amount * 100)
+                    )
+                if (
+                    expected == 'paid' and booking.payment_status in ('paid', 'refunded')
+                    and booking.razorpay_payment_id and booking.razorpay_payment_id != payment['id']
+                ):
+                    # A second capture for an order that is already paid
+                    self.stats['double_captured'] += 1
+                    self.report(
+                        'double_capture', booking_id=booking.id, payment_id=payment['id'],
+                        order_id=payment['order_id'], booking_status=booking.payment_status,
+                        gateway_status=payment['status'], gateway_amount=payment['amount']
+                    )
+                    continue
+                if expected is None or expected == booking.payment_status:
+                    continue
+                
+                current = booking.payment_status
+                if STATUS_RANK[expected] < STATUS_RANK.get(current, 0):
+                    # A failed attempt before a later capture is normal
+                    if not (expected == 'failed' and current in ('paid', 'refunded')):
+                        self.report(
+                            'booking_ahead_of_gateway', booking_id=booking.id, payment_id=payment['id'],
+                            booking_status=current, gateway_status=payment['status']
+                        )
+                    continue
+                
+                self.report(
+                    'status_corrected', booking_id=booking.id, payment_id=payment['id'],
+                    booking_status=current, gateway_status=payment['status'], new_status=expected
+                )
+                booking.payment_status = expected
+                if expected in ('paid', 'refunded') and booking.razorpay_payment_id != payment['id']:
+                    booking.razorpay_payment_id = payment['id']
+                booking.updated_at = timezone.now()
+                changed[booking.id] = booking
+            
+            self.stats['corrected'] += len(changed)
+            if self.dry_run:
+                if changed:
+                    self._record_dry_run(changed.values())
+            elif changed:
+                Booking.objects.bulk_update(
+                    changed.values(), ['payment_status', 'razorpay_payment_id', 'updated_at']
+                )
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import razorpay_integration, webhooks
+
+urlpatterns = [
+    path('create-order/', razorpay_integration.create_order, name='payment-create-order'),
+    path('verify/', razorpay_integration.verify_payment, name='payment-verify'),
+    path('refund/', razorpay_integration.initiate_refund, name='payment-refund'),
+    path('webhook/', webhooks.razorpay_webhook, name='payment-webhook'),
+]
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django_redis import get_redis_connection
+
+from core.models import Booking
+from .gateway import get_gateway
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'payments:webhooks'
+GROUP = 'webhook-processors'
+SEEN_KEY = 'payments:webhooks:seen:{event_id}'
+
+EVENT_STATUS = {
+    'payment.captured': 'paid',
+    'payment.failed': 'failed',
+    'refund.processed': 'refunded',
+}
+
+# A booking's payment_status only moves forward: a late payment.failed for
+# an earlier attempt must not undo a capture, nothing undoes a refund
+STATUS_RANK = {'pending': 0, 'failed': 1, 'paid': 2, 'refunded': 3}
+
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    """
+    Verify the signature and append the raw event to a Redis stream.
+    All parsing and database work happens in `manage.py process_webhooks`.
+    """
+    body = request.body
+    signature = request.headers.get('X-Razorpay-Signature', '')
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    # Signed over the raw bytes; decoding first would alter invalid UTF-8
+    if not secret or not get_gateway().verify_signature(body, signature, secret):
+        return HttpResponse(status=400)
+    
+    event_id = request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(body).hexdigest()
+    get_redis_connection('default').xadd(STREAM_KEY, {'event_id': event_id, 'body': body})
+    return HttpResponse(status=200)
+
+def _target(event):
+    """(order_id, payment_id, new_status) for an event we act on, else None"""
+    status = EVENT_STATUS.get(event.get('event'))
+    if status is None:
+        return None
+    payload = event.get('payload', {})
+    payment = payload.get('payment', {}).get('entity', {})
+    refund = payload.get('refund', {}).get('entity', {})
+    return payment.get('order_id'), payment.get('id') or refund.get('payment_id'), status
+
+class WebhookProcessor:
+    """
+    Applies queued webhook events to bookings in batches.
+    
+    Gateways deliver at least once and may retry long after the fact, so
+    events are deduplicated by event id, both within a batch and against
+    ids applied in the last RAZORPAY_WEBHOOK_DEDUPE_TTL seconds. Entries are
+    acknowledged only after their batch commits; pending entries of a dead
+    processor are claimed again on start. Applying an event twice is
+    harmless anyway since statuses only move forward.
+    """
+    
+    def __init__(self, redis, consumer_name, batch_size=500, block_ms=1000):
+        self.redis = redis
+        self.consumer_name = consumer_name
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+    
+    def ensure_group(self):
+        try:
+            self.redis.xgroup_create(STREAM_KEY, GROUP, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+    
+    def recover(self, min_idle_ms=30000):
+        """Process entries left pending by this or any dead processor"""
+        applied = 0
+        while True:
+            entries = self._read('0')
+            if not entries:
+                break
+            applied += self.process(entries)
+        
+        start = '0-0'
+        while True:
+            start, entries, *_ = self.redis.xautoclaim(
+                STREAM_KEY, GROUP, self.consumer_name,
+                min_idle_time=min_idle_ms, start_id=start, count=self.batch_size
+            )
+            if entries:
+                applied += self.process(entries)
+            if start in (b'0-0', '0-0'):
+                break
+        return applied
+    
+    def poll(self):
+        entries = self._read('>', block=self.block_ms)
+        return self.process(entries) if entries else 0
+    
+    def _read(self, entry_id, block=None):
+        response = self.redis.xreadgroup(
+            GROUP, self.consumer_name, {STREAM_KEY: entry_id},
+            count=self.batch_size, block=block
+        )
+        return response[0][1] if response else []
+    
+    def process(self, entries):
+        events = {}
+        for entry_id, fields in entries:
+            if fields:
+                events.setdefault(fields[b'event_id'].decode(), fields[b'body'])
+        
+        event_ids = list(events)
+        pipe = self.redis.pipeline(transaction=False)
+        for event_id in event_ids:
+            pipe.exists(SEEN_KEY.format(event_id=event_id))
+        fresh = [e for e, seen in zip(event_ids, pipe.execute()) if not seen]
+        
+        targets = []
+        for event_id in fresh:
+            try:
+                target = _target(json.loads(events[event_id]))
+            except (ValueError, AttributeError):
+                logger.warning('Skipping malformed webhook event %s', event_id)
+                continue
+            if target is not None:
+                targets.append(target)
+        
+        changed = self.apply(targets) if targets else 0
+        
+        pipe = self.redis.pipeline(transaction=False)
+        for event_id in fresh:
+            pipe.set(SEEN_KEY.format(event_id=event_id), 1, ex=settings.RAZORPAY_WEBHOOK_DEDUPE_TTL)
+        entry_ids = [entry_id for entry_id, _ in entries]
+        if entry_ids:
+            pipe.xack(STREAM_KEY, GROUP, *entry_ids)
+            pipe.xdel(STREAM_KEY, *entry_ids)
+        pipe.execute()
+        return changed
+    
+    def apply(self, targets):
+        """One locking read and one bulk UPDATE for the whole batch"""
+        order_ids = {order_id for order_id, _, _ in targets if order_id}
+        payment_ids = {payment_id for _, payment_id, _ in targets if payment_id}
+        now = timezone.now()
+        
+        with transaction.atomic():
+            bookings = list(Booking.objects.select_for_update().filter(
+                Q(razorpay_order_id__in=order_ids) | Q(razorpay_payment_id__in=payment_ids)
+            ).only('id', 'payment_status', 'razorpay_order_id', 'razorpay_payment_id'))
+            by_order = {b.razorpay_order_id: b for b in bookings if b.razorpay_order_id}
+            by_payment = {b.razorpay_payment_id: b for b in bookings if b.razorpay_payment_id}
+            
+            changed = {}
+            for order_id, payment_id, status in targets:
+                booking = by_order.get(order_id) or by_payment.get(payment_id)
+                if booking is None:
+                    logger.warning('Webhook for unknown order %s / payment %s', order_id, payment_id)
+                    continue
+                if STATUS_RANK[status] <= STATUS_RANK.get(booking.payment_status, 0):
+                    continue
+                booking.payment_status = status
+                if status == 'paid' and payment_id:
+                    booking.razorpay_payment_id = payment_id
+                booking.updated_at = now
+                changed[booking.id] = booking
+            
+            Booking.objects.bulk_update(
+                changed.values(), ['payment_status', 'razorpay_payment_id', 'updated_at'],
+                batch_size=500
+            )
+        return len(changed)
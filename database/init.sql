@@ -26,7 +26,9 @@ CREATE TABLE IF NOT EXISTS core_user (
     total_transactions INTEGER NOT NULL DEFAULT 0,
     id_proof_front VARCHAR(100),
     id_proof_back VARCHAR(100),
-    address_proof VARCHAR(100)
+    address_proof VARCHAR(100),
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS core_pincodeboundary (
@@ -103,13 +105,17 @@ CREATE TABLE IF NOT EXISTS core_chatroom (
     last_message_time TIMESTAMP WITH TIME ZONE,
     unread_count_user1 INTEGER NOT NULL DEFAULT 0,
     unread_count_user2 INTEGER NOT NULL DEFAULT 0,
+    last_read_at_user1 TIMESTAMP WITH TIME ZONE,
+    last_read_at_user2 TIMESTAMP WITH TIME ZONE,
     created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(user1_id, user2_id)
 );
 
+-- Range-partitioned by month; `manage.py partition_messages` creates
+-- upcoming months and `manage.py archive_messages` archives old ones
 CREATE TABLE IF NOT EXISTS core_message (
-    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
     room_id UUID NOT NULL REFERENCES core_chatroom(id) ON DELETE CASCADE,
     sender_id UUID NOT NULL REFERENCES core_user(id) ON DELETE CASCADE,
     receiver_id UUID NOT NULL REFERENCES core_user(id) ON DELETE CASCADE,
@@ -117,6 +123,66 @@ CREATE TABLE IF NOT EXISTS core_message (
     message_type VARCHAR(20) NOT NULL DEFAULT 'text',
     is_read BOOLEAN NOT NULL DEFAULT false,
     read_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS core_message_default PARTITION OF core_message DEFAULT;
+
+DO $$
+DECLARE
+    month DATE := date_trunc('month', now() AT TIME ZONE 'UTC');
+BEGIN
+    FOR i IN 0..3 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF core_message FOR VALUES FROM (%L) TO (%L)',
+            'core_message_p' || to_char(month, 'YYYYMM'),
+            month::text || ' 00:00:00+00',
+            (month + interval '1 month')::date::text || ' 00:00:00+00'
+        );
+        month := month + interval '1 month';
+    END LOOP;
+END $$;
+
+CREATE TABLE IF NOT EXISTS core_messagearchive (
+    id BIGSERIAL PRIMARY KEY,
+    room_id UUID NOT NULL REFERENCES core_chatroom(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    path VARCHAR(255) NOT NULL,
+    message_count INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(room_id, month)
+);
+
+CREATE TABLE IF NOT EXISTS core_identitydocument (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES core_user(id) ON DELETE CASCADE,
+    kind VARCHAR(20) NOT NULL,
+    sha256 VARCHAR(64) NOT NULL,
+    normalized VARCHAR(100),
+    width INTEGER,
+    height INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, kind)
+);
+
+CREATE TABLE IF NOT EXISTS core_verificationjob (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES core_user(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    results JSONB NOT NULL DEFAULT '{}'::jsonb,
+    timings JSONB NOT NULL DEFAULT '{}'::jsonb,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS core_imageasset (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    original VARCHAR(255) NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    derivatives JSONB NOT NULL DEFAULT '{}'::jsonb,
+    is_processed BOOLEAN NOT NULL DEFAULT false,
     created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -134,21 +200,26 @@ CREATE INDEX IF NOT EXISTS idx_service_pincode ON core_service(pincode);
 CREATE INDEX IF NOT EXISTS idx_service_provider ON core_service(provider_id);
 CREATE INDEX IF NOT EXISTS idx_service_available ON core_service(is_available);
 CREATE INDEX IF NOT EXISTS idx_service_category ON core_service(category_id);
+CREATE INDEX IF NOT EXISTS idx_service_images ON core_service USING GIN(images jsonb_path_ops);
 
 CREATE INDEX IF NOT EXISTS idx_booking_service ON core_booking(service_id);
 CREATE INDEX IF NOT EXISTS idx_booking_user ON core_booking(user_id);
 CREATE INDEX IF NOT EXISTS idx_booking_status ON core_booking(status);
 CREATE INDEX IF NOT EXISTS idx_booking_created ON core_booking(created_at);
+CREATE INDEX IF NOT EXISTS idx_booking_razorpay_order ON core_booking(razorpay_order_id);
 
 CREATE INDEX IF NOT EXISTS idx_chatroom_user1 ON core_chatroom(user1_id);
 CREATE INDEX IF NOT EXISTS idx_chatroom_user2 ON core_chatroom(user2_id);
 CREATE INDEX IF NOT EXISTS idx_chatroom_updated ON core_chatroom(updated_at);
 
-CREATE INDEX IF NOT EXISTS idx_message_room ON core_message(room_id);
+CREATE INDEX IF NOT EXISTS idx_message_room ON core_message(room_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_message_sender ON core_message(sender_id);
 CREATE INDEX IF NOT EXISTS idx_message_receiver ON core_message(receiver_id);
 CREATE INDEX IF NOT EXISTS idx_message_created ON core_message(created_at);
 
+CREATE INDEX IF NOT EXISTS idx_identitydocument_sha256 ON core_identitydocument(sha256);
+CREATE INDEX IF NOT EXISTS idx_verificationjob_user ON core_verificationjob(user_id, created_at);
+
 -- Insert sample categories
 INSERT INTO core_servicecategory (name, description, icon) VALUES
 ('Tools & Equipment', 'Power tools, hand tools, gardening equipment', 'build'),
@@ -200,7 +271,9 @@ BEGIN
             FROM core_booking
             WHERE service_id = NEW.service_id
             AND user_rating IS NOT NULL
-        )
+        ),
+        -- Service responses carry the rating and are validated by updated_at
+        updated_at = now()
         WHERE id = NEW.service_id;
     END IF;
     RETURN NEW;
@@ -224,7 +297,8 @@ BEGIN
             FROM core_booking
             WHERE user_id = NEW.user_id
             AND user_rating IS NOT NULL
-        )
+        ),
+        updated_at = now()
         WHERE id = NEW.user_id;
         
         -- Update provider rating
@@ -235,7 +309,8 @@ BEGIN
             JOIN core_service s ON b.service_id = s.id
             WHERE s.provider_id = u.id
             AND provider_rating IS NOT NULL
-        )
+        ),
+        updated_at = now()
         FROM core_service s
         WHERE s.id = NEW.service_id
         AND u.id = s.provider_id;